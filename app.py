@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-from hpb_menu_scraper import scrape_hpb_menu
-import io
+from arrow_export import write_parquet
+from excel_export import ColumnWidthTracker, write_excel
+from hpb_jobs import JobManager
+from hpb_metrics import get_metrics
+from hpb_store import default_store
 
 st.set_page_config(page_title="HPB Menu Scraper", layout="wide")
 
@@ -16,8 +19,63 @@ st.markdown("""
 url_input = st.text_area("対象のURLを入力してください（1行に1つ）", height=150,
                         placeholder="https://beauty.hotpepper.jp/slnH000306271/\nhttps://beauty.hotpepper.jp/slnH000xxxxxx/")
 
-if 'all_data' not in st.session_state:
-    st.session_state.all_data = []
+# Change tracking: compare with the rows saved by the previous run
+changes_only = st.checkbox("前回取得時からの変更分のみ（追加・変更・削除）",
+                           help="前回の取得結果と比較し、変更のあった行だけを表示・出力します。変更のないページは再解析しません。")
+
+# Export column order
+COLUMNS = ['salon_name', 'category', 'name', 'price', 'description']
+
+# Scrapes run as background jobs shared by every session (with a per-URL
+# result cache); the session only remembers its job and which run to show.
+@st.cache_resource
+def get_jobs():
+    # Results live in the SQLite store
+    return JobManager(default_store())
+
+jobs = get_jobs()
+store = jobs.store
+
+# Runs never change once saved, so the run id in filters is the result
+# version: frames and exports are only rebuilt when the run or filters change.
+@st.cache_data(max_entries=16, show_spinner=False)
+def run_frame(cols, filters):
+    return store.frame('menu', list(cols), **filters)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def excel_file(cols, filters):
+    # Streamed from the store through a write-only sheet. Column widths come
+    # from SQLite (MAX(LENGTH())) instead of a pass over the cells.
+    widths = ColumnWidthTracker(list(cols))
+    widths.update_lengths(store.max_lengths('menu', list(cols), **filters))
+    return write_excel(store.iter_rows('menu', list(cols), **filters), list(cols), 'Menu List', widths=widths)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def parquet_file(cols, filters):
+    # Typed columns for analytics: integer prices, categorical labels (see arrow_export)
+    return write_parquet(run_frame(cols, filters), 'menu')
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def wp_csv(cols, filters, cpt_mapping):
+    from wp_export import convert_to_wp_csv
+
+    # Removed menus have nothing to import
+    df = run_frame(cols, filters)
+    wp_df = convert_to_wp_csv([d for d in df.to_dict('records') if d.get('change') != 'removed'], cpt_mapping)
+    with get_metrics().timer("csv_export"):
+        return wp_df.to_csv(index=False, encoding='utf-8-sig')
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id):
+    # Polls the running job without rerunning the whole page
+    job = jobs.get(job_id)
+    if job is None or not job.running:
+        st.rerun()
+    st.progress(job.processed / job.total, text=f"Processing ({job.processed}/{job.total})" + (f": {job.current_url}" if job.current_url else "..."))
+    frame = job.frame()
+    if len(frame):
+        # Partial results while the batch is running
+        st.dataframe(frame, use_container_width=True)
 
 if st.button("メニュー情報を取得"):
     urls = [url.strip() for url in url_input.split('\n') if url.strip()]
@@ -25,57 +83,80 @@ if st.button("メニュー情報を取得"):
     if not urls:
         st.warning("URLを入力してください。")
     else:
-        all_data = []
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        for i, url in enumerate(urls):
-            status_text.text(f"Processing ({i+1}/{len(urls)}): {url}")
-            data = scrape_hpb_menu(url)
-            if data:
-                all_data.extend(data)
-            progress_bar.progress((i + 1) / len(urls))
-            
-        status_text.text("完了しました！")
-        progress_bar.progress(100)
-        st.session_state.all_data = all_data
-
-if st.session_state.all_data:
-    all_data = st.session_state.all_data
-    df = pd.DataFrame(all_data)
-    
-    # Reorder columns
-    cols = ['salon_name', 'category', 'name', 'price', 'description']
-    # Ensure columns exist even if data is empty or missing keys
-    for col in cols:
-        if col not in df.columns:
-            df[col] = ""
-    df = df[cols]
-    
+        st.session_state.menu_job_id = jobs.submit('menu', urls, changes_only=changes_only).id
+
+job = jobs.get(st.session_state.get('menu_job_id'))
+if job is not None:
+    if job.running:
+        job_progress(job.id)
+    elif job.status == 'failed':
+        st.error(f"取得に失敗しました: {job.error}")
+    else:
+        st.text("完了しました！")
+    if not job.running and job.failures:
+        # Failed salons are not in the saved run
+        st.warning(f"{len(job.failures)}件のサロンの取得に失敗しました（結果に含まれていません）:\n\n"
+                   + "\n".join(f"- {url}: {error}" for url, error in job.failures.items()))
+    if job.status == 'done':
+        if job.changes_only and not job.found:
+            st.info("前回の取得時から変更はありません。")
+        # Show the finished run once; the history selectbox is free afterwards
+        if st.session_state.get('menu_shown_job') != job.id:
+            st.session_state.menu_shown_job = job.id
+            st.session_state.menu_run_id = job.run_id
+
+runs = {run['id']: run for run in store.runs('menu')}
+if runs:
+    st.write("---")
+    # Latest run by default, or the one just scraped; earlier runs stay queryable
+    run_ids = list(runs)
+    run_id = st.selectbox(
+        "取得履歴", run_ids,
+        index=run_ids.index(st.session_state.menu_run_id) if st.session_state.get('menu_run_id') in runs else 0,
+        format_func=lambda r: f"{runs[r]['started_at']}（{runs[r]['salons']}店舗・{runs[r]['rows']}件）" + ("・変更分" if runs[r]['changes_only'] else "")
+    )
+
+    # Filters run as indexed queries on the store
+    salons = store.salons('menu', run_id)
+    filter_cols = st.columns(3)
+    salon_ids = filter_cols[0].multiselect("店舗", list(salons), format_func=lambda sid: f"{salons[sid]} ({sid})")
+    categories = filter_cols[1].multiselect("カテゴリ", store.distinct('menu', 'category', run_id))
+    min_price, max_price = filter_cols[2].slider("価格（円）", 0, 100000, (0, 100000), step=1000)
+    filters = dict(run_id=run_id, salon_ids=salon_ids, categories=categories,
+                   min_price=min_price or None, max_price=max_price if max_price < 100000 else None)
+
+    cols = tuple(COLUMNS + ['change'] if runs[run_id]['changes_only'] else COLUMNS)
+    df = run_frame(cols, filters)
+
+if runs and len(df):
     st.success(f"{len(df)} 件のメニューを取得しました。")
     
     # Display Data
     st.dataframe(df, use_container_width=True)
     
-    # Excel Export
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Menu List')
-    
+    # Excel Export: the workbook is only built when the download is requested
     st.download_button(
         label="Excelをダウンロード",
-        data=buffer.getvalue(),
+        data=lambda: excel_file(cols, filters),
         file_name="hpb_menu_list.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore"
+    )
+    st.download_button(
+        label="Parquetをダウンロード",
+        data=lambda: parquet_file(cols, filters),
+        file_name="hpb_menu_list.parquet",
+        mime="application/vnd.apache.parquet",
+        on_click="ignore"
     )
 
     st.write("---")
     st.subheader("WordPress CSV出力設定")
     
     # WP Export Section
-    if 'all_data' in locals() and all_data:
+    if len(df):
         # Identify unique salons
-        unique_salons = sorted(list(set(d['salon_name'] for d in all_data)))
+        unique_salons = sorted(df['salon_name'].unique())
         
         st.write("各店舗のカスタム投稿タイプ（スラッグ）を入力してください。")
         cpt_mapping = {}
@@ -87,16 +168,30 @@ if st.session_state.all_data:
             cpt_mapping[salon] = st.text_input(f"{salon}", value=default_slug, key=f"cpt_{salon}", placeholder="例: zeal-menu_list")
 
         if st.button("WP用CSVを作成"):
-            from wp_export import convert_to_wp_csv
-            
-            wp_df = convert_to_wp_csv(all_data, cpt_mapping)
-            
-            # Convert to CSV
-            csv_buffer = wp_df.to_csv(index=False, encoding='utf-8-sig')
-            
+            st.session_state.menu_wp_csv = True
+
+        if st.session_state.get('menu_wp_csv'):
             st.download_button(
                 label="WP用CSVをダウンロード",
-                data=csv_buffer,
+                data=wp_csv(cols, filters, cpt_mapping),
                 file_name="wp_menu_import.csv",
                 mime="text/csv"
             )
+
+# Timings and counters of this server process (see hpb_metrics)
+with st.expander("計測（処理時間・通信量）"):
+    metrics = get_metrics()
+    stage_rows = metrics.stage_rows()
+    if stage_rows:
+        st.dataframe(pd.DataFrame(stage_rows), use_container_width=True, hide_index=True)
+        st.dataframe(pd.DataFrame(metrics.counter_rows()), use_container_width=True, hide_index=True)
+    else:
+        st.write("まだ計測データはありません。")
+    metric_cols = st.columns(3)
+    metric_cols[0].download_button("JSON", data=metrics.to_json(), file_name="hpb_metrics.json",
+                                   mime="application/json", on_click="ignore")
+    metric_cols[1].download_button("Prometheus", data=metrics.to_prometheus(), file_name="hpb_metrics.prom",
+                                   mime="text/plain", on_click="ignore")
+    if metric_cols[2].button("リセット"):
+        metrics.reset()
+        st.rerun()
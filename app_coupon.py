@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-from hpb_coupon_scraper import scrape_hpb_coupon
-import io
+from arrow_export import write_parquet
+from excel_export import ColumnWidthTracker, write_excel
+from hpb_jobs import JobManager
+from hpb_metrics import get_metrics
+from hpb_store import default_store
 
 st.set_page_config(page_title="HPB Coupon Scraper", layout="wide")
 
@@ -17,8 +20,53 @@ st.markdown("""
 url_input = st.text_area("対象のURLを入力してください（1行に1つ）", height=150,
                         placeholder="https://beauty.hotpepper.jp/slnH000306271/\nhttps://beauty.hotpepper.jp/slnH000xxxxxx/")
 
-if 'coupon_data' not in st.session_state:
-    st.session_state.coupon_data = []
+# Change tracking: compare with the rows saved by the previous run
+changes_only = st.checkbox("前回取得時からの変更分のみ（追加・変更・削除）",
+                           help="前回の取得結果と比較し、変更のあった行だけを表示・出力します。変更のないページは再解析しません。")
+
+# Export column order
+COLUMNS = ['salon_name', 'eligibility', 'icons', 'name', 'price', 'conditions']
+
+# Scrapes run as background jobs shared by every session (with a per-URL
+# result cache); the session only remembers its job and which run to show.
+@st.cache_resource
+def get_jobs():
+    # Results live in the SQLite store
+    return JobManager(default_store())
+
+jobs = get_jobs()
+store = jobs.store
+
+# Runs never change once saved, so the run id in filters is the result
+# version: frames and exports are only rebuilt when the run or filters change.
+@st.cache_data(max_entries=16, show_spinner=False)
+def run_frame(cols, filters):
+    return store.frame('coupon', list(cols), **filters)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def excel_file(cols, filters):
+    # Streamed from the store through a write-only sheet. Column widths come
+    # from SQLite (MAX(LENGTH())) instead of a pass over the cells.
+    widths = ColumnWidthTracker(list(cols))
+    widths.update_lengths(store.max_lengths('coupon', list(cols), **filters))
+    return write_excel(store.iter_rows('coupon', list(cols), **filters), list(cols), 'Coupon List', widths=widths)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def parquet_file(cols, filters):
+    # Typed columns for analytics: integer prices, categorical labels (see arrow_export)
+    return write_parquet(run_frame(cols, filters), 'coupon')
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id):
+    # Polls the running job without rerunning the whole page
+    job = jobs.get(job_id)
+    if job is None or not job.running:
+        st.rerun()
+    st.progress(job.processed / job.total, text=f"Processing ({job.processed}/{job.total})" + (f": {job.current_url}" if job.current_url else "..."))
+    frame = job.frame()
+    if len(frame):
+        # Partial results while the batch is running
+        st.dataframe(frame, use_container_width=True)
 
 if st.button("クーポン情報を取得"):
     urls = [url.strip() for url in url_input.split('\n') if url.strip()]
@@ -26,64 +74,87 @@ if st.button("クーポン情報を取得"):
     if not urls:
         st.warning("URLを入力してください。")
     else:
-        all_data = []
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        st.session_state.coupon_job_id = jobs.submit('coupon', urls, changes_only=changes_only).id
+
+job = jobs.get(st.session_state.get('coupon_job_id'))
+if job is not None:
+    if job.running:
+        job_progress(job.id)
+    elif job.status == 'failed':
+        st.error(f"取得に失敗しました: {job.error}")
+    else:
+        st.text("完了しました！")
+    if not job.running and job.failures:
+        # Failed salons are not in the saved run
+        st.warning(f"{len(job.failures)}件のサロンの取得に失敗しました（結果に含まれていません）:\n\n"
+                   + "\n".join(f"- {url}: {error}" for url, error in job.failures.items()))
+    if job.status == 'done':
+        if job.changes_only and not job.found:
+            st.info("前回の取得時から変更はありません。")
+        # Show the finished run once; the history selectbox is free afterwards
+        if st.session_state.get('coupon_shown_job') != job.id:
+            st.session_state.coupon_shown_job = job.id
+            st.session_state.coupon_run_id = job.run_id
+
+runs = {run['id']: run for run in store.runs('coupon')}
+if runs:
+    st.write("---")
+    # Latest run by default, or the one just scraped; earlier runs stay queryable
+    run_ids = list(runs)
+    run_id = st.selectbox(
+        "取得履歴", run_ids,
+        index=run_ids.index(st.session_state.coupon_run_id) if st.session_state.get('coupon_run_id') in runs else 0,
+        format_func=lambda r: f"{runs[r]['started_at']}（{runs[r]['salons']}店舗・{runs[r]['rows']}件）" + ("・変更分" if runs[r]['changes_only'] else "")
+    )
+
+    # Filters run as indexed queries on the store
+    salons = store.salons('coupon', run_id)
+    filter_cols = st.columns(3)
+    salon_ids = filter_cols[0].multiselect("店舗", list(salons), format_func=lambda sid: f"{salons[sid]} ({sid})")
+    eligibilities = filter_cols[1].multiselect("対象", store.distinct('coupon', 'eligibility', run_id))
+    min_price, max_price = filter_cols[2].slider("価格（円）", 0, 100000, (0, 100000), step=1000)
+    filters = dict(run_id=run_id, salon_ids=salon_ids, eligibilities=eligibilities,
+                   min_price=min_price or None, max_price=max_price if max_price < 100000 else None)
+
+    cols = tuple(COLUMNS + ['change'] if runs[run_id]['changes_only'] else COLUMNS)
+    df = run_frame(cols, filters)
+
+    if len(df):
+        st.success(f"{len(df)} 件のクーポンを取得しました。")
         
-        for i, url in enumerate(urls):
-            status_text.text(f"Processing ({i+1}/{len(urls)}): {url}")
-            # Max pages 20 just to be safe, though usually fewer
-            data = scrape_hpb_coupon(url, max_pages=20)
-            if data:
-                all_data.extend(data)
-            progress_bar.progress((i + 1) / len(urls))
-            
-        status_text.text("完了しました！")
-        progress_bar.progress(100)
-        st.session_state.coupon_data = all_data
-
-if st.session_state.coupon_data:
-    all_data = st.session_state.coupon_data
-    df = pd.DataFrame(all_data)
-    
-    # Reorder columns
-    cols = ['salon_name', 'eligibility', 'icons', 'name', 'price', 'conditions']
-    # Ensure columns exist
-    for col in cols:
-        if col not in df.columns:
-            df[col] = ""
-    df = df[cols]
-    
-    st.success(f"{len(df)} 件のクーポンを取得しました。")
-    
-    # Display Data
-    st.dataframe(df, use_container_width=True)
-    
-    # Excel Export
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Coupon List')
+        # Display Data
+        st.dataframe(df, use_container_width=True)
         
-        # Adjust column widths for better readability (optional simple adjustment)
-        worksheet = writer.sheets['Coupon List']
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            # Limit max width
-            if adjusted_width > 50:
-                adjusted_width = 50
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-
-    st.download_button(
-        label="Excelをダウンロード",
-        data=buffer.getvalue(),
-        file_name="hpb_coupon_list.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+        # Excel Export: the workbook is only built when the download is requested
+        st.download_button(
+            label="Excelをダウンロード",
+            data=lambda: excel_file(cols, filters),
+            file_name="hpb_coupon_list.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click="ignore"
+        )
+        st.download_button(
+            label="Parquetをダウンロード",
+            data=lambda: parquet_file(cols, filters),
+            file_name="hpb_coupon_list.parquet",
+            mime="application/vnd.apache.parquet",
+            on_click="ignore"
+        )
+
+# Timings and counters of this server process (see hpb_metrics)
+with st.expander("計測（処理時間・通信量）"):
+    metrics = get_metrics()
+    stage_rows = metrics.stage_rows()
+    if stage_rows:
+        st.dataframe(pd.DataFrame(stage_rows), use_container_width=True, hide_index=True)
+        st.dataframe(pd.DataFrame(metrics.counter_rows()), use_container_width=True, hide_index=True)
+    else:
+        st.write("まだ計測データはありません。")
+    metric_cols = st.columns(3)
+    metric_cols[0].download_button("JSON", data=metrics.to_json(), file_name="hpb_metrics.json",
+                                   mime="application/json", on_click="ignore")
+    metric_cols[1].download_button("Prometheus", data=metrics.to_prometheus(), file_name="hpb_metrics.prom",
+                                   mime="text/plain", on_click="ignore")
+    if metric_cols[2].button("リセット"):
+        metrics.reset()
+        st.rerun()
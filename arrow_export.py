@@ -0,0 +1,155 @@
+"""
+Typed columnar export of scraped menus and coupons to Parquet or Arrow IPC.
+
+Prices are parsed once, column-wise, into integer columns next to the raw
+text, so analytics jobs load numbers instead of re-parsing "¥11,000～"
+(hpb_price, the same parsing as the store's price_value and wp_export):
+
+    price_min         int64, first amount of the price (null if none, or 要問い合わせ)
+    price_max         int64, last amount when the price is a range ("¥5,500～¥8,800"), else null
+    price_fluctuates  bool, the price has "～" / "~" (open-ended or range)
+
+Low-cardinality text columns (salon_name, category, eligibility, icons,
+change) are dictionary-encoded (pandas categoricals).
+
+.parquet files are compressed with zstd; .arrow / .feather files are
+uncompressed Arrow IPC, which readers can memory-map without copying.
+Requires pyarrow.
+
+Usage:
+    python arrow_export.py menu|coupon --out rows.parquet [--run RUN_ID] [--store PATH]
+    python arrow_export.py menu|coupon --out rows.arrow --ndjson out/menus-00001.ndjson [...]
+"""
+import argparse
+import io
+import sys
+
+import pandas as pd
+
+from hpb_metrics import get_metrics
+from hpb_price import parse_prices
+from hpb_store import TABLES
+
+CATEGORICAL_COLUMNS = ("salon_name", "category", "eligibility", "icons", "change")
+PRICE_COLUMNS = ["price_min", "price_max", "price_fluctuates"]
+
+
+def typed_frame(rows, kind):
+    """
+    The typed export frame of menu or coupon rows.
+
+    Args:
+        rows: DataFrame, RowTable (hpb_rows) or iterable of row dicts.
+        kind (str): "menu" or "coupon".
+
+    Returns:
+        pd.DataFrame: The kind's columns (plus salon_url / salon_id / change
+            when present) as strings or categoricals, with the price columns
+            inserted after price.
+    """
+    fields = TABLES[kind][1]
+    if isinstance(rows, pd.DataFrame):
+        df = rows
+    elif hasattr(rows, "to_frame"):
+        df = rows.to_frame()
+    else:
+        df = pd.DataFrame(list(rows))
+
+    columns = [c for c in ("salon_url", "salon_id") if c in df.columns] + fields
+    columns += [c for c in ("change",) if c in df.columns]
+    df = df.reindex(columns=columns)
+
+    out = {}
+    for column in columns:
+        values = df[column]
+        if column in CATEGORICAL_COLUMNS:
+            out[column] = values.astype("category")
+        else:
+            out[column] = values.astype("string")
+        if column == "price":
+            out.update(parse_prices(values))
+    return pd.DataFrame(out, index=df.index).reset_index(drop=True)
+
+
+def _arrow_table(df):
+    import pyarrow as pa
+
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_parquet(rows, kind, path=None):
+    """
+    Writes the typed rows as Parquet (zstd).
+
+    Returns:
+        bytes or None: The file contents when path is None.
+    """
+    import pyarrow.parquet as pq
+
+    with get_metrics().timer("parquet_export"):
+        table = _arrow_table(typed_frame(rows, kind))
+        target = io.BytesIO() if path is None else path
+        pq.write_table(table, target, compression="zstd")
+    return target.getvalue() if path is None else None
+
+
+def write_arrow(rows, kind, path=None):
+    """
+    Writes the typed rows as an uncompressed Arrow IPC file (memory-mappable).
+
+    Returns:
+        bytes or None: The file contents when path is None.
+    """
+    import pyarrow as pa
+
+    with get_metrics().timer("arrow_export"):
+        table = _arrow_table(typed_frame(rows, kind))
+        sink = pa.BufferOutputStream() if path is None else pa.OSFile(path, "wb")
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        if path is None:
+            return sink.getvalue().to_pybytes()
+        sink.close()
+    return None
+
+
+def read_ndjson(paths):
+    frames = [pd.read_json(path, lines=True, dtype=False) for path in paths]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("kind", choices=["menu", "coupon"])
+    arg_parser.add_argument("--out", required=True, help=".parquet, or .arrow / .feather for Arrow IPC")
+    arg_parser.add_argument("--run", type=int, help="store run to export (default: latest of this kind)")
+    arg_parser.add_argument("--store", help="SQLite store path (default: $HPB_STORE_PATH or hpb_results.sqlite3)")
+    arg_parser.add_argument("--ndjson", nargs="+", help="export hpb_batch_cli NDJSON shards instead of a store run")
+    args = arg_parser.parse_args()
+
+    if args.ndjson:
+        rows = read_ndjson(args.ndjson)
+    else:
+        from hpb_store import ResultStore, default_store
+
+        store = ResultStore(args.store) if args.store else default_store()
+        run_id = args.run
+        if run_id is None:
+            runs = store.runs(args.kind)
+            if not runs:
+                arg_parser.error(f"no {args.kind} runs in the store")
+            run_id = runs[0]["id"]
+        rows = store.frame(args.kind, ["salon_url", "salon_id"] + TABLES[args.kind][1] + ["change"], run_id=run_id)
+        if not rows["change"].notna().any():
+            rows = rows.drop(columns="change")
+
+    if args.out.endswith(".parquet"):
+        write_parquet(rows, args.kind, args.out)
+    else:
+        write_arrow(rows, args.kind, args.out)
+    print(f"Wrote {len(rows)} {args.kind} rows to {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Micro-benchmark: coupon/menu row extraction, per-field find() vs compiled spec.
+
+Usage:
+    python benchmarks/bench_extract.py [rows] [repeat]
+
+The rows of testdata/coupon_page1.html are repeated to the requested count, the
+page is parsed once, and only row extraction is timed.
+"""
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hpb_coupon_scraper import parse_coupon_rows, clean_text as coupon_clean_text  # noqa: E402
+from hpb_menu_scraper import MENU_SPEC, clean_text as menu_clean_text  # noqa: E402
+from hpb_parser import make_soup  # noqa: E402
+
+
+def legacy_coupon_rows(soup, salon_name):
+    # Row extraction as it was before the compiled spec: one find() per field.
+    coupons = []
+    for tr in soup.find_all('tr'):
+        name_tag = tr.find('p', class_='couponMenuName')
+        if not name_tag:
+            continue
+        el_tag = tr.find(class_=re.compile(r'couponLabel.*'))
+        if not el_tag:
+            continue
+        eligibility = coupon_clean_text(el_tag.get_text())
+
+        icons = []
+        icon_list = tr.find('ul', class_='couponMenuIcons')
+        if icon_list:
+            for li in icon_list.find_all('li'):
+                icons.append(coupon_clean_text(li.get_text()))
+
+        price = ""
+        price_tag = tr.find('p', class_='couponMenuPrice')
+        if price_tag:
+            price = coupon_clean_text(price_tag.get_text())
+
+        conditions_str = ""
+        cond_list = tr.find('dl', class_='couponConditionsList')
+        if cond_list:
+            pairs = []
+            dts = cond_list.find_all('dt')
+            dds = cond_list.find_all('dd')
+            if len(dts) == len(dds):
+                for dt, dd in zip(dts, dds):
+                    k = coupon_clean_text(dt.get_text())
+                    v = coupon_clean_text(dd.get_text())
+                    if not k.endswith('：') and not k.endswith(':'):
+                        k += '：'
+                    pairs.append(f"{k} {v}")
+            else:
+                conditions_str = coupon_clean_text(cond_list.get_text())
+            if pairs:
+                conditions_str = "\n".join(pairs)
+
+        coupons.append({
+            "salon_name": salon_name,
+            "eligibility": eligibility,
+            "icons": ", ".join(icons),
+            "name": coupon_clean_text(name_tag.get_text()),
+            "price": price,
+            "conditions": conditions_str,
+        })
+    return coupons
+
+
+def legacy_menu_rows(trs):
+    rows = []
+    for tr in trs:
+        td = tr.find('td', class_='bgWhite')
+        if not td:
+            continue
+        name_tag = td.find('p', class_='couponMenuName')
+        price_tag = td.find('p', class_='taR')
+        desc_tag = td.find('p', class_='wbba')
+        name = menu_clean_text(name_tag.get_text(strip=True)) if name_tag else ""
+        price = menu_clean_text(price_tag.get_text(strip=True)) if price_tag else ""
+        description = menu_clean_text(desc_tag.get_text(strip=True)) if desc_tag else ""
+        if name:
+            rows.append((name, price, description))
+    return rows
+
+
+def spec_menu_rows(trs):
+    rows = []
+    for tr in trs:
+        values = MENU_SPEC.extract(tr)
+        if values and values["name"]:
+            rows.append((values["name"], values["price"], values["description"]))
+    return rows
+
+
+def build_page(rows):
+    with open(os.path.join(ROOT, "testdata", "coupon_page1.html"), "r", encoding="utf-8") as f:
+        html = f.read()
+    soup = make_soup(html, "html.parser")
+    coupon_trs = [str(tr) for tr in soup.find_all('tr') if tr.find(class_='couponMenuName') and tr.find(class_=re.compile('couponLabel'))]
+    menu_trs = [str(tr) for table in soup.find_all('table', class_='menuTbl') for tr in table.find_all('tr')]
+
+    coupons = "".join(coupon_trs[i % len(coupon_trs)] for i in range(rows))
+    menus = "".join(menu_trs[i % len(menu_trs)] for i in range(rows))
+    return (f'<html><body><table class="couponTbl">{coupons}</table>'
+            f'<table class="menuTbl">{menus}</table></body></html>')
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    soup = make_soup(build_page(rows))
+    menu_trs = soup.find('table', class_='menuTbl').find_all('tr')
+    coupon_soup = make_soup(str(soup.find('table', class_='couponTbl')))
+
+    cases = [
+        ("coupon", lambda: legacy_coupon_rows(coupon_soup, "Salon"), lambda: parse_coupon_rows(coupon_soup, "Salon")),
+        ("menu", lambda: legacy_menu_rows(menu_trs), lambda: spec_menu_rows(menu_trs)),
+    ]
+
+    print(f"{'records':8} {'rows':>6} {'find() rows/s':>14} {'spec rows/s':>12} {'speedup':>8}")
+    for label, legacy, spec in cases:
+        legacy_time, legacy_rows = timed(legacy, repeat)
+        spec_time, spec_rows = timed(spec, repeat)
+        assert legacy_rows == spec_rows, f"{label}: spec output differs from legacy output"
+        n = len(spec_rows)
+        print(f"{label:8} {n:6d} {n / legacy_time:14.0f} {n / spec_time:12.0f} {legacy_time / spec_time:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
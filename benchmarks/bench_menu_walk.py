@@ -0,0 +1,102 @@
+"""
+Micro-benchmark: menu row extraction, sibling/find_all walk vs single-pass walker.
+
+Usage:
+    python benchmarks/bench_menu_walk.py [repeat] [--parser lxml]
+
+Every corpus page (benchmarks/corpus/) is parsed once, in full and with the
+targeted menu regions, and only parse_menu_page's row extraction is timed:
+the walk it did before (find_next_sibling, find_all per table and row,
+MENU_SPEC per row, clean_text through re.sub) against iter_menu_rows.
+Reports microseconds per row and checks both give the same rows.
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from hpb_menu_scraper import MENU_SPEC, is_menu_region, iter_menu_rows, mark_menu_region  # noqa: E402
+from hpb_parser import make_soup, region_filter, resolve_backend  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+
+
+def legacy_clean_text(text):
+    if not text:
+        return ""
+    cleaned = re.sub(r'[\[【].*?[\]】]', '', text, flags=re.DOTALL)
+    return " ".join(cleaned.split())
+
+
+def legacy_menu_rows(menu_list_title):
+    # parse_menu_page's walk before iter_menu_rows
+    rows = []
+    current_category = "セットメニュー"
+    sibling = menu_list_title.find_next_sibling()
+    while sibling:
+        classes = sibling.get('class', [])
+        if 'singleMenuHead' in classes:
+            cat_p = sibling.find('p', class_='b')
+            if cat_p:
+                current_category = legacy_clean_text(cat_p.get_text(strip=True))
+        elif sibling.name == 'div' or (sibling.name == 'table' and 'menuTbl' in classes):
+            tables = [sibling] if sibling.name == 'table' else sibling.find_all('table', class_='menuTbl')
+            for table in tables:
+                for tr in table.find_all('tr'):
+                    found = MENU_SPEC.match(tr)
+                    if found[0] is None:
+                        continue
+                    name, price, description = (legacy_clean_text(el.get_text(strip=True)) if el is not None else ""
+                                                for el in found[1:])
+                    if name:
+                        rows.append((current_category, name, price, description))
+        sibling = sibling.find_next_sibling()
+    return rows
+
+
+def walker_menu_rows(menu_list_title):
+    return list(iter_menu_rows(menu_list_title))
+
+
+def timed(fn, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("repeat", type=int, nargs="?", default=20)
+    arg_parser.add_argument("--parser", default=None, help="HTML backend (default: auto)")
+    args = arg_parser.parse_args()
+    backend = resolve_backend(args.parser)
+
+    pages = sorted(glob.glob(os.path.join(CORPUS_DIR, "*", "coupon", "index.html")))
+    print(f"parser: {backend}")
+    print(f"{'page':28} {'tree':9} {'rows':>5} {'legacy us/row':>14} {'walker us/row':>14} {'speedup':>8}")
+    for path in pages:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        label = os.path.relpath(path, CORPUS_DIR).split(os.sep)[0]
+        for tree, markup, parse_only in (("full", html, None),
+                                         ("targeted", mark_menu_region(html), region_filter(is_menu_region))):
+            menu_list_title = make_soup(markup, backend, parse_only=parse_only).find(id='menuList')
+            legacy_time, legacy_rows = timed(legacy_menu_rows, menu_list_title, args.repeat)
+            walker_time, walker_rows = timed(walker_menu_rows, menu_list_title, args.repeat)
+            assert legacy_rows == walker_rows, f"{label} ({tree}): walker rows differ from legacy rows"
+            n = max(1, len(walker_rows))
+            print(f"{label:28} {tree:9} {len(walker_rows):5d} {legacy_time / n * 1e6:14.1f} "
+                  f"{walker_time / n * 1e6:14.1f} {legacy_time / walker_time:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+End-to-end throughput benchmark against a local mock of the site (hpb_mock).
+
+Serves a recording (benchmarks/corpus/ by default, every salon ID aliased
+onto it) with the given latency, failure injection and bandwidth, then
+scrapes --salons distinct salons' coupon pages with each concurrency model:
+
+    threads   hpb_batch.scrape_many over scrape_hpb_coupon (HpbClient)
+    pipeline  hpb_pipeline.iter_pipeline (fetch threads + parse processes)
+    async     hpb_async.scrape_many_async (AsyncHpbClient)
+
+and reports wall time, salons/s, pages/s and the statuses the server sent.
+Nothing touches the network.
+
+Usage:
+    python benchmarks/bench_mock_throughput.py [--salons 200] [--workers 16] [--modes threads,pipeline,async]
+        [--latency 0.05] [--jitter 0.05] [--fail 503=0.02] [--retry-after 0] [--bandwidth 500000]
+        [--gzip] [--rate 0] [--root benchmarks/corpus]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from hpb_async import AsyncHpbClient, scrape_many_async  # noqa: E402
+from hpb_batch import scrape_many  # noqa: E402
+from hpb_coupon_scraper import scrape_hpb_coupon  # noqa: E402
+from hpb_http import DEFAULT_POOL_CONNECTIONS, HpbClient  # noqa: E402
+from hpb_mock import MockHpbServer, parse_fail_rate  # noqa: E402
+from hpb_pipeline import iter_pipeline  # noqa: E402
+from hpb_ratelimit import AdaptiveRateLimiter  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+MAX_PAGES = 20
+
+
+def limiter(rate):
+    # 0: no rate limit, but throttled responses are still retried
+    if rate > 0:
+        return AdaptiveRateLimiter(rate=rate, burst=max(1, int(rate)))
+    return AdaptiveRateLimiter(rate=1e6, burst=10 ** 6, min_rate=1e6, base_delay=0.01)
+
+
+def run_threads(urls, workers, rate):
+    client = HpbClient(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=workers * 4, rate_limiter=limiter(rate))
+    results = scrape_many(urls, lambda url: scrape_hpb_coupon(url, max_pages=MAX_PAGES, client=client),
+                          max_workers=workers, per_host=workers)
+    return sum(len(rows) for rows in results)
+
+
+def run_pipeline(urls, workers, rate):
+    client = HpbClient(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=workers, rate_limiter=limiter(rate))
+    return sum(len(rows) for _, _, rows, _ in iter_pipeline(urls, "coupon", MAX_PAGES, client=client,
+                                                              fetch_workers=workers))
+
+
+def run_async(urls, workers, rate):
+    async def scrape():
+        async with AsyncHpbClient(rate_limiter=limiter(rate)) as client:
+            return await scrape_many_async(urls, "coupon", client=client, concurrency=workers, max_pages=MAX_PAGES)
+    # A failed salon is returned as its exception and counts no rows
+    return sum(len(rows) for rows in asyncio.run(scrape()) if isinstance(rows, list))
+
+
+MODES = {"threads": run_threads, "pipeline": run_pipeline, "async": run_async}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--root", default=CORPUS_DIR, help="recording to serve")
+    arg_parser.add_argument("--salons", type=int, default=200, help="distinct salon IDs scraped per mode")
+    arg_parser.add_argument("--workers", type=int, default=16, help="salons in flight")
+    arg_parser.add_argument("--modes", default=",".join(MODES))
+    arg_parser.add_argument("--latency", type=float, default=0.05)
+    arg_parser.add_argument("--jitter", type=float, default=0.05)
+    arg_parser.add_argument("--fail", type=parse_fail_rate, action="append", default=[], metavar="STATUS=RATE")
+    arg_parser.add_argument("--retry-after", type=float, default=0)
+    arg_parser.add_argument("--bandwidth", type=float, help="bytes per second per response")
+    arg_parser.add_argument("--gzip", action="store_true")
+    arg_parser.add_argument("--rate", type=float, default=0, help="client rate limit, requests/s (0: none)")
+    args = arg_parser.parse_args()
+
+    server = MockHpbServer(args.root, latency=args.latency, jitter=args.jitter, fail_rates=dict(args.fail),
+                           retry_after=args.retry_after, bandwidth=args.bandwidth, gzip=args.gzip, alias=True, seed=0)
+    with server:
+        print(f"{'mode':9} {'salons':>6} {'rows':>7} {'pages':>6} {'wall_s':>7} {'salons/s':>9} {'pages/s':>8} "
+              f"statuses")
+        # Distinct IDs, aliased onto the recorded salons; the clients have no HTTP cache
+        urls = [server.salon_url(f"slnH{10 ** 6 + n:09d}") for n in range(args.salons)]
+        for mode in args.modes.split(","):
+            before = dict(server.stats["statuses"])
+            start = time.perf_counter()
+            rows = MODES[mode](urls, args.workers, args.rate)
+            wall = time.perf_counter() - start
+            statuses = {s: n - before.get(s, 0) for s, n in server.stats["statuses"].items() if n - before.get(s, 0)}
+            pages = statuses.get(200, 0)
+            print(f"{mode:9} {args.salons:6d} {rows:7d} {pages:6d} {wall:7.2f} {args.salons / wall:9.1f} "
+                  f"{pages / wall:8.1f} {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark: memory and DataFrame build time, list of dicts vs RowTable.
+
+Usage:
+    python benchmarks/bench_rows.py [rows]
+
+Coupon rows are built the way they arrive from the HTTP cache or a JSON
+round trip (every string a separate object), 200,000 by default. Reports the
+memory held by each representation (tracemalloc) and the time to turn it into
+a DataFrame. Both frames must be equal.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hpb_rows import RowTable  # noqa: E402
+from hpb_store import TABLES  # noqa: E402
+
+COLUMNS = TABLES["coupon"][1]
+ELIGIBILITIES = ["新規", "全員", "再来"]
+ICONS = ["カット, カラー", "カット", "パーマ, トリートメント", ""]
+
+
+def build_rows(count):
+    rows = [{
+        "salon_name": f"Salon {i % 50}",
+        "eligibility": ELIGIBILITIES[i % len(ELIGIBILITIES)],
+        "icons": ICONS[i % len(ICONS)],
+        "name": f"【人気】クーポン {i}",
+        "price": f"¥{(i % 20 + 1) * 1100:,}",
+        "conditions": "提示条件： 予約時\n利用条件： 平日限定",
+    } for i in range(count)]
+    # Fresh string objects per row, as json.loads gives them
+    return json.loads(json.dumps(rows, ensure_ascii=False))
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    data = json.dumps(build_rows(count), ensure_ascii=False)
+
+    rows, dict_bytes, _ = measure(lambda: json.loads(data))
+    table, table_bytes, _ = measure(lambda: RowTable(COLUMNS, json.loads(data)))
+
+    start = time.perf_counter()
+    expected = pd.DataFrame(rows, columns=COLUMNS)
+    dict_frame = time.perf_counter() - start
+    start = time.perf_counter()
+    frame = table.to_frame(COLUMNS)
+    table_frame = time.perf_counter() - start
+    assert frame.equals(expected), "frames differ"
+
+    print(f"{count} coupon rows")
+    print(f"  list of dicts: {dict_bytes / 1e6:8.1f} MB, DataFrame in {dict_frame * 1000:7.1f} ms")
+    print(f"  RowTable:      {table_bytes / 1e6:8.1f} MB, DataFrame in {table_frame * 1000:7.1f} ms")
+    print(f"  memory {dict_bytes / table_bytes:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
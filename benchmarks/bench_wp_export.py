@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: convert_to_wp_csv, per-item loop vs columnar conversion.
+
+Usage:
+    python benchmarks/bench_wp_export.py [rows] [repeat]
+
+Menu rows covering every price shape the scrapers produce (plain, fluctuating,
+inquiry required, empty) and every category slug are repeated to the requested
+count (100,000 by default). Both implementations must return identical frames.
+"""
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from wp_export import CATEGORY_MAP, WP_COLUMNS, clean_price_and_get_metadata, convert_to_wp_csv  # noqa: E402
+
+PRICES = ["¥5,500", "¥11,000～", "¥3,300~", "要問い合わせ", "", "¥22,000", "¥8,800～要問い合わせ"]
+CATEGORIES = list(CATEGORY_MAP) + ["", "キャンペーン"]
+
+
+def legacy_convert_to_wp_csv(scraped_data, cpt_mapping):
+    # Conversion as it was before the columnar version: one dict per item.
+    rows = []
+    for item in scraped_data:
+        salon_name = item.get('salon_name', '')
+        menu_price, menu_fluctuation = clean_price_and_get_metadata(item.get('price', ''))
+        rows.append({
+            'post_type': cpt_mapping.get(salon_name, ''),
+            'post_title': item.get('name', ''),
+            'post_content': '',
+            'post_status': 'publish',
+            'tax_menu_cat': CATEGORY_MAP.get(item.get('category', ''), ''),
+            'menu_name': item.get('name', ''),
+            'menu_info': '',
+            'menu_price': menu_price,
+            'menu_fluctuation': menu_fluctuation,
+            'menu_price_max': '',
+            'menu_plus': 'no',
+            'menu_remarks': item.get('description', ''),
+            'salon_name_ref': salon_name,
+        })
+    return pd.DataFrame(rows)[WP_COLUMNS]
+
+
+def build_rows(count):
+    return [{
+        "salon_name": f"Salon {i % 7}",
+        "category": CATEGORIES[i % len(CATEGORIES)],
+        "name": f"【人気】メニュー {i}",
+        "price": PRICES[i % len(PRICES)],
+        "description": f"説明 {i}【所要時間】60分",
+    } for i in range(count)]
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    data = build_rows(rows)
+    mapping = {f"Salon {i}": f"salon{i}-menu_list" for i in range(6)}  # one salon left unmapped
+
+    legacy_time, legacy_df = timed(lambda: legacy_convert_to_wp_csv(data, mapping), repeat)
+    columnar_time, columnar_df = timed(lambda: convert_to_wp_csv(data, mapping), repeat)
+    assert legacy_df.equals(columnar_df), "columnar output differs from legacy output"
+    assert re.fullmatch(r"\d*", "".join(columnar_df["menu_price"]))
+
+    print(f"{'rows':>8} {'loop rows/s':>12} {'columnar rows/s':>16} {'speedup':>8}")
+    print(f"{rows:8d} {rows / legacy_time:12.0f} {rows / columnar_time:16.0f} {legacy_time / columnar_time:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
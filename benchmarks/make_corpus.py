@@ -0,0 +1,153 @@
+"""
+Regenerates the benchmark corpus in benchmarks/corpus/.
+
+The pages follow the markup of beauty.hotpepper.jp coupon pages (JSON-LD
+breadcrumb, paging block, coupon table rows, #menuList with category headers
+and menuTbl tables, plus header/footer/recommendation blocks the scrapers do
+not read). Output is deterministic, so the checked-in files only change when
+this script does.
+
+Layout mirrors the site: corpus/<salon_id>/coupon/index.html for page 1 and
+corpus/<salon_id>/coupon/PN<n>.html for the following pages.
+
+Usage:
+    python benchmarks/make_corpus.py
+"""
+import json
+import os
+import random
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+# salon_id: (coupon count, coupons per page, menu count, menu categories)
+SALONS = {
+    "slnH000000101": (12, 25, 30, ["カット", "カラー", "トリートメント"]),   # single coupon page
+    "slnH000000102": (88, 25, 40, ["カット", "カラー", "パーマ", "ヘッドスパ"]),  # 4 coupon pages
+    "slnH000000103": (20, 25, 400, ["セットメニュー", "カット", "カラー", "パーマ", "縮毛矯正",
+                                    "髪質改善", "トリートメント", "ヘッドスパ", "その他メニュー", "着付け"]),  # large menu
+}
+
+LABELS = [("CT01", "新規"), ("CT02", "再来"), ("CT03", "全員")]
+ICONS = ["カット", "カラー", "パーマ", "トリートメント", "ヘッドスパ", "縮毛矯正", "ヘアセット"]
+WORDS = ["人気No.1", "透明感", "髪質改善", "イルミナ", "ケアブリーチ", "艶髪", "似合わせ", "ダメージレス",
+         "白髪ぼかし", "ハイライト", "韓国風", "レイヤー", "ボブ", "前髪カット", "高濃度炭酸泉"]
+
+
+def _price(rng):
+    value = rng.randrange(22, 300) * 100
+    suffix = "～" if rng.random() < 0.25 else ""
+    return f"¥{value:,}{suffix}"
+
+
+def _coupon_row(rng, i):
+    cls, label = LABELS[i % len(LABELS)]
+    icons = "".join(f'<li class="couponMenuIcon">{icon}</li>' for icon in rng.sample(ICONS, rng.randint(1, 3)))
+    name = f"【{rng.choice(WORDS)}】" + "+".join(rng.sample(ICONS, 2)) + f" {rng.choice(WORDS)} <span class=\"fs10\">&lt;{i}&gt;</span>"
+    return f'''<tr>
+<td class="couponLabel{cls} w70 taC"><span class="couponLabelText">{label}</span></td>
+<td class="bgWhite"><div class="cFix">
+<div class="fl w120"><img src="https://imgbp.hotp.jp/CSP/IMG_SRC/{i:02d}/coupon_{i}.jpg" width="120" height="90" alt="" loading="lazy"></div>
+<div class="fr w618">
+<p class="couponMenuName">{name}</p>
+<ul class="couponMenuIcons cFix">{icons}</ul>
+<div class="cFix mT5"><p class="couponMenuPrice fl">{_price(rng)}</p></div>
+<p class="couponMenuTxt mT5">{rng.choice(WORDS)}で仕上げる{rng.choice(WORDS)}スタイル。<br>※{rng.choice(WORDS)}の方は[要相談]</p>
+<dl class="couponConditionsList cFix mT5"><dt>提示条件</dt><dd>予約時</dd><dt>利用条件</dt><dd>{rng.choice(["平日限定", "土日祝OK", "他クーポン併用不可"])}</dd><dt>有効期限</dt><dd>2026年12月末まで</dd></dl>
+<p class="mT5"><a href="/CSP/bt/reserve/?storeId=H0&amp;couponId=CP{i:08d}" class="btnReserve">予約する</a></p>
+</div></div></td>
+</tr>'''
+
+
+def _menu_section(rng, count, categories):
+    parts = ['<h3 id="menuList" class="menuListTitle mT30">メニュー</h3>']
+    per_cat = max(1, count // len(categories))
+    k = 0
+    for c, category in enumerate(categories):
+        n = per_cat if c < len(categories) - 1 else count - per_cat * (len(categories) - 1)
+        parts.append(f'<div class="singleMenuHead mT20 cFix"><p class="b fl">{category}</p><p class="fr fs10">[{category}]</p></div>')
+        rows = []
+        for _ in range(n):
+            rows.append(f'''<tr><td class="bgWhite"><div class="pT10 cFix">
+<p class="couponMenuName fl w500">【{rng.choice(WORDS)}】{category} {rng.choice(WORDS)} {k}</p>
+<p class="taR fr fs14 b">{_price(rng) if rng.random() > 0.05 else "要問い合わせ"}</p></div>
+<p class="wbba mT5">{rng.choice(WORDS)}[{rng.choice(WORDS)}]の{category}。<span class="fgGray">【所要時間】{rng.randint(3, 18) * 10}分</span></p></td></tr>''')
+            k += 1
+        parts.append('<div class="mT10"><table class="menuTbl wFull">' + "".join(rows) + '</table></div>')
+    return '<div class="mT30">' + "".join(parts) + '</div>'
+
+
+def _filler(rng, salon_id, blocks):
+    # Navigation, recommendations and footer: present on real pages, never read by the scrapers.
+    links = "".join(f'<li><a href="/svcSA/macAB/salon/PN{n}.html">{rng.choice(WORDS)}エリア</a></li>' for n in range(60))
+    reco = "".join(
+        f'<div class="recommendSalon cFix"><a href="/slnH{rng.randrange(10**9):09d}/"><img src="https://imgbp.hotp.jp/x{n}.jpg" alt=""></a>'
+        f'<p class="b">{rng.choice(WORDS)} {n}</p><table class="recoTbl"><tr><td>{rng.choice(WORDS)}</td><td>{_price(rng)}</td></tr></table></div>'
+        for n in range(blocks))
+    return links, reco
+
+
+def build_page(salon_id, page_num, coupons, per_page, menus, categories):
+    rng = random.Random(f"{salon_id}/{page_num}")
+    pages = max(1, -(-coupons // per_page))
+    start = (page_num - 1) * per_page
+    rows = "".join(_coupon_row(rng, i) for i in range(start, min(coupons, start + per_page)))
+
+    links = "".join(
+        f'<li><span class="current">{p}</span></li>' if p == page_num else f'<li><a href="/{salon_id}/coupon/PN{p}.html">{p}</a></li>'
+        for p in range(1, pages + 1))
+    after = (f'<li class="pa top0 right0 afterPage"><a href="/{salon_id}/coupon/PN{page_num + 1}.html">'
+             f'<span class="iS arrowPagingR">次の{per_page}件</span></a></li>') if page_num < pages else ''
+    paging = (f'<div class="preListHead mT20"><div class="pr"><p class="pa bottom0 right0">{page_num}/{pages}ページ</p>'
+              f'<p><span class="numberOfResult">{coupons}</span>件</p></div>'
+              f'<ul class="paging jscPagingParents cFix">{links}{after}</ul></div>')
+
+    menu = _menu_section(rng, menus, categories) if page_num == 1 else ""
+    nav, reco = _filler(rng, salon_id, 40)
+    name = f"HAIR {salon_id[-3:]} 渋谷店"
+    crumbs = {"@context": "https://schema.org", "@type": "BreadcrumbList", "itemListElement": [
+        {"@type": "ListItem", "position": i, "item": {"@id": f"https://beauty.hotpepper.jp/{i}/", "name": n}}
+        for i, n in enumerate(["ホットペッパービューティー", "ヘアサロン", "関東", "渋谷", name, "クーポン"], 1)]}
+
+    return f'''<!DOCTYPE html>
+<html lang="ja"><head>
+<meta charset="UTF-8">
+<title>{name}｜クーポン・メニュー｜ホットペッパービューティー</title>
+<meta name="description" content="{name}のクーポン・メニュー一覧。">
+<link rel="stylesheet" href="/css/common.css">
+<script type="text/javascript">var hpb = {{"salonId": "{salon_id}", "page": {page_num}}};</script>
+<script type="application/ld+json">{json.dumps(crumbs, ensure_ascii=False)}</script>
+</head><body>
+<div id="header"><div class="headerInner"><ul class="headerNav cFix">{nav}</ul>
+<table class="headerTbl"><tr><td>ログイン</td><td>予約確認</td></tr></table></div></div>
+<div id="mainContents" class="cFix"><div class="detailTitle"><p class="detailTitle b">{name}</p></div>
+{paging}
+<table class="couponTbl wFull">{rows}</table>
+{paging}
+{menu}
+</div>
+<div id="recommend">{reco}</div>
+<div id="footer"><ul class="footerNav">{nav}</ul><table class="footerTbl"><tr><td>&copy; Recruit</td></tr></table></div>
+</body></html>
+'''
+
+
+def main():
+    manifest = {}
+    for salon_id, (coupons, per_page, menus, categories) in SALONS.items():
+        pages = max(1, -(-coupons // per_page))
+        out_dir = os.path.join(CORPUS_DIR, salon_id, "coupon")
+        os.makedirs(out_dir, exist_ok=True)
+        for page_num in range(1, pages + 1):
+            file_name = "index.html" if page_num == 1 else f"PN{page_num}.html"
+            with open(os.path.join(out_dir, file_name), "w", encoding="utf-8", newline="\n") as f:
+                f.write(build_page(salon_id, page_num, coupons, per_page, menus, categories))
+        manifest[salon_id] = {"pages": pages, "coupons": coupons, "menus": menus}
+
+    with open(os.path.join(CORPUS_DIR, "manifest.json"), "w", encoding="utf-8", newline="\n") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"Wrote corpus for {len(manifest)} salons to {CORPUS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Offline benchmark suite over the recorded page corpus (benchmarks/corpus/).
+
+Measures, per corpus page and per 1,000 rows:
+    decode_ms   charset detection + decode (hpb_http.decode_response), and
+                hpb_menu_scraper.mark_menu_region for menus
+    parse_ms    tree building (hpb_parser.make_soup, targeted regions)
+    extract_ms  row extraction (parse_coupon_page / parse_menu_page)
+    peak_kb     peak traced memory for decode + parse + extract
+for the coupon and menu scrapers, end-to-end scrape_hpb_coupon /
+scrape_hpb_menu runs per salon, and convert_to_wp_csv over the menu rows.
+
+Timings are the median of --repeat runs, which a single slow or lucky run
+does not move. Results are compared against benchmarks/baseline.json; a
+metric more than --tolerance slower (or larger) than its baseline is
+reported as a regression. Timings on a shared machine vary too much for a
+hard gate, so regressions only fail the exit status with --strict.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--repeat N] [--tolerance 0.25] [--min-delta-ms 1]
+                                        [--parser lxml] [--save-baseline] [--json results.json] [--strict]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from hpb_cache import build_response  # noqa: E402
+from hpb_coupon_scraper import is_coupon_region, parse_coupon_page, scrape_hpb_coupon  # noqa: E402
+from hpb_http import decode_response  # noqa: E402
+from hpb_menu_scraper import is_menu_region, mark_menu_region, parse_menu_page, scrape_hpb_menu  # noqa: E402
+from hpb_mock import ReplayClient, page_file  # noqa: E402
+from hpb_parser import make_soup, region_filter, resolve_backend  # noqa: E402
+from wp_export import convert_to_wp_csv  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+CORPUS_HOST = "https://beauty.hotpepper.jp"
+
+# Rows fed to convert_to_wp_csv (corpus menu rows repeated)
+WP_ROWS = 10000
+
+
+def corpus_response(url, content):
+    return build_response(url, 200, {"Content-Type": "text/html"}, content)
+
+
+def median_of(fn, repeat):
+    times = []
+    result = fn()  # warm-up, not timed
+    for _ in range(repeat):
+        # Collector pauses are the main source of noise between runs
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        times.append(elapsed)
+    return statistics.median(times) * 1000, result
+
+
+def peak_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_page(url, content, kind, parser, repeat):
+    if kind == "coupon":
+        region, parse, mark = is_coupon_region, parse_coupon_page, str
+    else:
+        region, parse, mark = is_menu_region, parse_menu_page, mark_menu_region
+    parse_only = region_filter(region)
+
+    decode_ms, text = median_of(lambda: mark(decode_response(corpus_response(url, content))), repeat)
+    parse_ms, soup = median_of(lambda: make_soup(text, parser, parse_only=parse_only), repeat)
+    extract_ms, result = median_of(lambda: parse(soup), repeat)
+
+    rows = len(result["rows"] if kind == "coupon" else (result or []))
+    peak = peak_kb(lambda: parse(make_soup(mark(decode_response(corpus_response(url, content))), parser,
+                                           parse_only=parse_only)))
+
+    metrics = {"rows": rows, "decode_ms": decode_ms, "parse_ms": parse_ms, "extract_ms": extract_ms, "peak_kb": peak}
+    if rows:
+        metrics["ms_per_1k_rows"] = (decode_ms + parse_ms + extract_ms) * 1000 / rows
+    return metrics
+
+
+def run(parser, repeat):
+    with open(os.path.join(CORPUS_DIR, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    results = {}
+    client = ReplayClient(CORPUS_DIR)
+    menu_rows = []
+
+    for salon_id, info in manifest.items():
+        for page_num in range(1, info["pages"] + 1):
+            page = "" if page_num == 1 else f"PN{page_num}.html"
+            url = f"{CORPUS_HOST}/{salon_id}/coupon/{page}"
+            with open(page_file(CORPUS_DIR, url)[1], "rb") as f:
+                content = f.read()
+
+            results[f"page/{salon_id}/{page or 'index.html'}/coupon"] = bench_page(url, content, "coupon", parser, repeat)
+            if page_num == 1:
+                results[f"page/{salon_id}/index.html/menu"] = bench_page(url, content, "menu", parser, repeat)
+
+        base_url = f"{CORPUS_HOST}/{salon_id}/"
+        coupon_ms, coupons = median_of(lambda: scrape_hpb_coupon(base_url, max_pages=20, client=client, page_workers=1, parser=parser), repeat)
+        menu_ms, menus = median_of(lambda: scrape_hpb_menu(base_url, client=client, parser=parser), repeat)
+        assert len(coupons) == info["coupons"], f"{salon_id}: {len(coupons)} coupons, expected {info['coupons']}"
+        assert len(menus) == info["menus"], f"{salon_id}: {len(menus)} menus, expected {info['menus']}"
+
+        results[f"scrape/{salon_id}/coupon"] = {"rows": len(coupons), "total_ms": coupon_ms,
+                                                "ms_per_1k_rows": coupon_ms * 1000 / len(coupons)}
+        results[f"scrape/{salon_id}/menu"] = {"rows": len(menus), "total_ms": menu_ms,
+                                              "ms_per_1k_rows": menu_ms * 1000 / len(menus)}
+        menu_rows.extend(menus)
+
+    wp_input = [menu_rows[i % len(menu_rows)] for i in range(WP_ROWS)]
+    mapping = {row["salon_name"]: "menu_list" for row in menu_rows}
+    wp_ms, wp_df = median_of(lambda: convert_to_wp_csv(wp_input, mapping), repeat)
+    results["wp_export/convert_to_wp_csv"] = {
+        "rows": len(wp_df), "total_ms": wp_ms, "ms_per_1k_rows": wp_ms * 1000 / len(wp_df),
+        "peak_kb": peak_kb(lambda: convert_to_wp_csv(wp_input, mapping)),
+    }
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            if metric == "rows":
+                continue
+            base = baseline.get(name, {}).get(metric)
+            if not base or value <= base * (1 + tolerance):
+                continue
+            # Sub-millisecond timings are dominated by scheduler noise
+            if metric.endswith("_ms") and value - base < min_delta_ms:
+                continue
+            regressions.append((name, metric, base, value))
+    return regressions
+
+
+def print_table(results, baseline):
+    columns = ["rows", "decode_ms", "parse_ms", "extract_ms", "total_ms", "ms_per_1k_rows", "peak_kb"]
+    print(f"{'benchmark':42}" + "".join(f"{c:>18}" for c in columns))
+    for name, metrics in results.items():
+        cells = []
+        for c in columns:
+            value = metrics.get(c)
+            if value is None:
+                cells.append(f"{'':>18}")
+                continue
+            base = baseline.get(name, {}).get(c)
+            delta = f" ({(value / base - 1) * 100:+.0f}%)" if base and c != "rows" else ""
+            cells.append(f"{(f'{value:.2f}' if isinstance(value, float) else str(value)) + delta:>18}")
+        print(f"{name:42}" + "".join(cells))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--repeat", type=int, default=9, help="runs per measurement (the median is kept)")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    arg_parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore timing regressions smaller than this")
+    arg_parser.add_argument("--parser", default=None, help="HTML parser backend (see hpb_parser)")
+    arg_parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH}")
+    arg_parser.add_argument("--json", help="also write results to this file")
+    arg_parser.add_argument("--strict", action="store_true", help="exit with status 1 on regressions")
+    args = arg_parser.parse_args()
+
+    parser = resolve_backend(args.parser)
+
+    # The scrapers log every fetch on stderr; keep the report readable.
+    with contextlib.redirect_stderr(io.StringIO()):
+        results = run(parser, args.repeat)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH) and not args.save_baseline:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    print(f"parser: {parser}, repeat: {args.repeat}")
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parser": parser, "results": results}, f, indent=2)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8", newline="\n") as f:
+            json.dump({"parser": parser, "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    for name, metric, base, value in regressions:
+        print(f"REGRESSION {name} {metric}: {base:.2f} -> {value:.2f} ({(value / base - 1) * 100:+.0f}%)")
+    if not baseline:
+        print("No baseline found; run with --save-baseline to create one.")
+    return 1 if regressions and args.strict else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+from hpb_http import site_url
 from hpb_menu_scraper import scrape_hpb_menu
 import re
 
@@ -13,7 +14,7 @@ def clean_text(text):
     return " ".join(cleaned.split())
 
 def debug():
-    url = "https://beauty.hotpepper.jp/slnH000306271/coupon/"
+    url = site_url("/slnH000306271/coupon/")
     data = scrape_hpb_menu(url)
     if len(data) > 3:
         item = data[3] # Item 3 was the one failing
@@ -25,11 +26,10 @@ def debug():
         pass
 
     # Inspect HTML of Item 3
-    import requests
+    from hpb_http import decode_response, fetch
     from bs4 import BeautifulSoup
-    res = requests.get(url)
-    res.encoding = res.apparent_encoding
-    soup = BeautifulSoup(res.text, 'html.parser')
+    res = fetch(url)
+    soup = BeautifulSoup(decode_response(res), 'html.parser')
     
     # Locate Item 3
     # Traverse to find the 3rd item
@@ -1,11 +1,11 @@
-import requests
+from hpb_http import decode_response, fetch, site_url
 
-url = 'https://beauty.hotpepper.jp/slnH000306271/coupon/'
+url = site_url('/slnH000306271/coupon/')
 try:
-    response = requests.get(url)
-    response.encoding = response.apparent_encoding
+    response = fetch(url)
+    text = decode_response(response)
     with open('temp_page.html', 'w', encoding='utf-8') as f:
-        f.write(response.text)
+        f.write(text)
     print("Successfully saved to temp_page.html")
 except Exception as e:
     print(f"Error: {e}")
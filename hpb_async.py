@@ -0,0 +1,365 @@
+"""
+asyncio scraping API, for embedding the scrapers in an async service.
+
+The scrapers in hpb_coupon_scraper / hpb_menu_scraper block on requests and
+would stall an event loop. The coroutines here fetch with an httpx
+AsyncClient instead and hand each response to the same parse code
+(coupon_page_from_response, menus_from_response), run in an executor so
+tree building does not block the loop either:
+
+    rows = await scrape_hpb_coupon_async(url)
+    rows = await scrape_hpb_menu_async(url)
+    per_salon = await scrape_many_async(urls, "coupon")
+
+async with AsyncHpbClient() as client: shares one client (and its
+connections) between calls. With h2 installed the client speaks HTTP/2, so
+all pages to the HPB host are multiplexed as streams over a few connections
+and hundreds of fetches can be in flight (max_in_flight caps them). Without
+h2 it falls back to HTTP/1.1 keep-alive.
+
+Every request has a timeout (the client's, or timeout= per call); a page
+that times out is handled like a failed page. Cancelling the awaiting task
+cancels its requests, and an early exit from iter_coupons_async cancels the
+pages it had already started. The HTTP cache (hpb_cache) is not used here,
+its disk I/O is synchronous; rate limiting (hpb_ratelimit) is, the waits
+being asyncio sleeps.
+"""
+import asyncio
+import functools
+import sys
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from hpb_cache import build_response
+from hpb_coupon_scraper import IncompleteScrapeError, coupon_page_from_response, coupon_page_url, normalize_coupon_url
+from hpb_http import DEFAULT_HEADERS, DEFAULT_POOL_MAXSIZE, DEFAULT_TIMEOUT
+from hpb_menu_scraper import menus_from_response
+from hpb_metrics import get_metrics
+from hpb_parser import resolve_backend
+from hpb_ratelimit import ThrottledError, limiter_from_env
+from hpb_rows import intern_value
+
+DEFAULT_MAX_IN_FLIGHT = 256  # requests awaiting a response, per client
+DEFAULT_CONCURRENCY = 32  # salons scraped at once by scrape_many_async
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _httpx_timeout(timeout):
+    # hpb_http style (connect, read) tuple or seconds -> httpx.Timeout. Waiting
+    # for a pooled connection is not limited: max_in_flight bounds that queue.
+    if isinstance(timeout, httpx.Timeout):
+        return timeout
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect, pool=None)
+    return httpx.Timeout(timeout, pool=None)
+
+
+def _to_requests_response(response):
+    # The parse code reads requests.Response (decode_response, status checks)
+    converted = build_response(str(response.url), response.status_code, response.headers, response.content)
+    converted.http_version = response.http_version
+    converted.retries = 0
+    return converted
+
+
+class AsyncHpbClient:
+    """
+    asyncio counterpart of hpb_http.HpbClient, on httpx.
+
+    Use it from one event loop, and close it (aclose(), or async with).
+
+    Args:
+        headers (dict): Extra headers merged over DEFAULT_HEADERS.
+        timeout (float, tuple or httpx.Timeout): Default timeout of each
+            request; a tuple is (connect, read) as in hpb_http.
+        http2 (bool): Use HTTP/2 when the h2 package is installed.
+        max_connections (int): Connections kept to a host. With HTTP/2 each
+            one multiplexes many requests.
+        max_in_flight (int): Requests awaiting a response at once; others wait.
+        rate_limiter (AdaptiveRateLimiter): Optional per-host rate limit with
+            retries of throttled responses (see hpb_ratelimit).
+    """
+
+    def __init__(self, headers=None, timeout=DEFAULT_TIMEOUT, http2=True, max_connections=DEFAULT_POOL_MAXSIZE,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, rate_limiter=None):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.http2 = http2 and _http2_available()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        # Accept-Encoding is left to httpx, which advertises what it can decode
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            headers={**DEFAULT_HEADERS, **(headers or {})},
+            timeout=_httpx_timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=True,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _send(self, url, timeout):
+        # Everything that actually goes over the network passes here
+        async with self._in_flight:
+            start = time.perf_counter()
+            response = await self.client.get(
+                url, timeout=httpx.USE_CLIENT_DEFAULT if timeout is None else _httpx_timeout(timeout))
+
+        metrics = get_metrics()
+        metrics.stage("fetch", time.perf_counter() - start)
+        metrics.inc("hpb_requests_total", status=response.status_code)
+        metrics.inc("hpb_response_bytes_total", int(response.headers.get("Content-Length") or len(response.content)))
+        return _to_requests_response(response)
+
+    async def _send_limited(self, url, timeout):
+        # AdaptiveRateLimiter.send, with the waits as asyncio sleeps
+        limiter = self.rate_limiter
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            wait = limiter.try_acquire(host)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            response = await self._send(url, timeout)
+            if limiter.retry_delay(host, url, response, attempt) is None:
+                break
+            attempt += 1
+
+        if response.retries:
+            get_metrics().inc("hpb_retries_total", response.retries)
+        return response
+
+    async def get(self, url, timeout=None):
+        """
+        GETs url.
+
+        Args:
+            timeout (float, tuple or httpx.Timeout): Overrides the client's
+                timeout for this request.
+
+        Returns:
+            requests.Response: The response, body read. http_version tells
+                HTTP/1.1 from HTTP/2. Raises httpx.TimeoutException on timeout.
+        """
+        start = time.perf_counter()
+        if self.rate_limiter is None:
+            response = await self._send(url, timeout)
+        else:
+            response = await self._send_limited(url, timeout)
+        get_metrics().observe("hpb_request_seconds", time.perf_counter() - start, source="network")
+        return response
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+@asynccontextmanager
+async def _client_scope(client):
+    # A client given by the caller is theirs to close; otherwise one is made
+    # for the call, rate limited as the shared sync client is.
+    if client is not None:
+        yield client
+        return
+    async with AsyncHpbClient(rate_limiter=limiter_from_env()) as client:
+        yield client
+
+
+async def _parse(executor, fn, *args):
+    # Tree building and extraction are CPU-bound: off the event loop
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args))
+
+
+async def load_coupon_page_async(target_url, client, parser=None, targeted=True, timeout=None, executor=None):
+    """
+    Coroutine version of hpb_coupon_scraper.load_coupon_page.
+
+    Args:
+        client (AsyncHpbClient): Client fetching the page.
+        executor (Executor): Where the page is parsed (default: the loop's thread pool).
+
+    Returns:
+        dict or None: As load_coupon_page.
+    """
+    print(f"Fetching: {target_url}", file=sys.stderr)
+    response = await client.get(target_url, timeout=timeout)
+    return await _parse(executor, coupon_page_from_response, response, target_url, None, parser, targeted)
+
+
+async def _load_page(page_num, *args):
+    # Pages after page 1 fail the scrape as in iter_coupon_pages
+    try:
+        return await load_coupon_page_async(*args)
+    except ThrottledError:
+        raise
+    except Exception as e:
+        raise IncompleteScrapeError(f"Error on page {page_num}: {e}") from e
+
+
+async def iter_coupons_async(base_url, max_pages=10, client=None, parser=None, targeted=True, batches=False,
+                             timeout=None, executor=None):
+    """
+    Async generator counterpart of hpb_coupon_scraper.iter_coupons.
+
+    With batches=True one list of rows is yielded per page instead of
+    individual rows. Raises ThrottledError and IncompleteScrapeError as
+    iter_coupons does, and ValueError for a bad parser backend.
+    """
+    parser = resolve_backend(parser)
+    async with _client_scope(client) as client:
+        base_url = normalize_coupon_url(base_url)
+        load_args = (client, parser, targeted, timeout, executor)
+        try:
+            first_page = await load_coupon_page_async(base_url, *load_args)
+        except ThrottledError:
+            raise
+        except Exception as e:
+            print(f"Error on page 1: {e}", file=sys.stderr)
+            return
+        if first_page is None:
+            return
+
+        pages = _iter_coupon_pages(base_url, first_page, max_pages, load_args)
+        try:
+            async for rows in pages:
+                if batches:
+                    yield rows
+                else:
+                    for row in rows:
+                        yield row
+        finally:
+            await pages.aclose()
+
+
+async def _iter_coupon_pages(base_url, first_page, max_pages, load_args):
+    # hpb_coupon_scraper.iter_coupon_pages. When page 1 gives the page count,
+    # the other pages are all requested at once (the client's max_in_flight
+    # and rate limiter pace them) and yielded in page order.
+    salon_name = intern_value(first_page["salon_name"])
+    yield first_page["rows"]
+
+    def page_rows(page):
+        for row in page["rows"]:
+            row["salon_name"] = salon_name
+        return page["rows"]
+
+    if max_pages < 2 or not first_page["has_next"]:
+        return
+
+    page_count = first_page["page_count"]
+    if page_count:
+        tasks = [asyncio.ensure_future(_load_page(n, coupon_page_url(base_url, n), *load_args))
+                 for n in range(2, min(page_count, max_pages) + 1)]
+        try:
+            for task in tasks:
+                page = await task
+                if page is None:
+                    # Keep sequential semantics: nothing after a missing page.
+                    break
+                yield page_rows(page)
+        finally:
+            # Also reached when the consumer stops early or is cancelled
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return
+
+    # Sequential fallback: follow the "next" links one page at a time.
+    for page_num in range(2, max_pages + 1):
+        page = await _load_page(page_num, coupon_page_url(base_url, page_num), *load_args)
+        if page is None:
+            break
+        yield page_rows(page)
+        if not page["has_next"]:
+            break
+
+
+async def scrape_hpb_coupon_async(base_url, max_pages=10, client=None, parser=None, targeted=True, timeout=None,
+                                  executor=None):
+    """Coroutine version of hpb_coupon_scraper.scrape_hpb_coupon: all coupon rows of a salon."""
+    with get_metrics().timer("scrape_coupon"):
+        rows = []
+        async for batch in iter_coupons_async(base_url, max_pages, client, parser, targeted, batches=True,
+                                              timeout=timeout, executor=executor):
+            rows.extend(batch)
+        return rows
+
+
+async def scrape_hpb_menu_async(url, client=None, parser=None, targeted=True, timeout=None, executor=None):
+    """
+    Coroutine version of hpb_menu_scraper.scrape_hpb_menu: the menu rows of a
+    salon, [] on failure. A throttled page raises ThrottledError.
+    """
+    parser = resolve_backend(parser)
+    with get_metrics().timer("scrape_menu"):
+        url = normalize_coupon_url(url)
+        try:
+            async with _client_scope(client) as client:
+                response = await client.get(url, timeout=timeout)
+            return await _parse(executor, menus_from_response, response, None, parser, targeted)
+        except ThrottledError:
+            raise
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return []
+
+
+async def scrape_many_async(urls, kind="coupon", client=None, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """
+    Scrapes several salons concurrently over one client.
+
+    Args:
+        urls (list): Salon URLs, in the order the results should be returned.
+        kind (str): "coupon" or "menu".
+        concurrency (int): Salons in flight at once.
+        **kwargs: Passed to scrape_hpb_coupon_async / scrape_hpb_menu_async.
+
+    Returns:
+        list: One result per input URL, in input order: the salon's list of
+            rows, or the exception it failed with (ThrottledError, a
+            timeout...), also reported on stderr. An empty list is a salon
+            without rows, not a failure.
+
+    Raises:
+        ValueError: The parser backend is unknown or not installed; raised
+            before anything is fetched.
+    """
+    scrape = scrape_hpb_coupon_async if kind == "coupon" else scrape_hpb_menu_async
+    kwargs["parser"] = resolve_backend(kwargs.get("parser"))
+    salons = asyncio.Semaphore(concurrency)
+
+    async def scrape_one(url, client):
+        async with salons:
+            try:
+                return await scrape(url, client=client, **kwargs)
+            except Exception as e:
+                print(f"Error scraping {url}: {e}", file=sys.stderr)
+                return e
+
+    async with _client_scope(client) as client:
+        return list(await asyncio.gather(*(scrape_one(url, client) for url in urls)))
+
+
+if __name__ == "__main__":
+    import json
+
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    kind = "menu" if '--menu' in sys.argv else "coupon"
+    results = asyncio.run(scrape_many_async(args or ["https://beauty.hotpepper.jp/slnH000122973/coupon/"], kind))
+    print(json.dumps([rows if isinstance(rows, list) else {"error": str(rows)} for rows in results],
+                     ensure_ascii=False, indent=2))
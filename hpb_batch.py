@@ -0,0 +1,104 @@
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Salons scraped at the same time, and the cap on simultaneous salons per host.
+# Every HPB URL lives on beauty.hotpepper.jp, so the per-host cap is what
+# actually bounds the load we put on the site.
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_HOST = 4
+
+
+def iter_many(urls, iter_fn, max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST):
+    """
+    Runs iter_fn over several salon URLs concurrently and streams the results.
+
+    Args:
+        urls (list): Salon URLs.
+        iter_fn (callable): Called as iter_fn(url), returns an iterable of row
+            batches (lists), e.g. lambda url: iter_coupons(url, batches=True).
+        max_workers (int): Maximum number of salons in flight overall.
+        per_host (int): Maximum number of salons in flight per host.
+
+    Yields:
+        tuple: (index, url, rows, finished) in the calling thread, as batches
+            arrive. index is the position of url in urls. A salon's last event
+            has rows=[] and finished set: True when iter_fn ran to the end, or
+            the exception that ended it early (also reported on stderr), in
+            which case the rows already yielded are incomplete.
+    """
+    if not urls:
+        return
+
+    # One semaphore per host, created up front so workers never race on the dict.
+    host_slots = {}
+    for url in urls:
+        host = urlsplit(url).netloc
+        if host not in host_slots:
+            host_slots[host] = threading.BoundedSemaphore(max(1, per_host))
+
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def _run(i, url):
+        finished = True
+        try:
+            with host_slots[urlsplit(url).netloc]:
+                for rows in iter_fn(url):
+                    if stop.is_set():
+                        break
+                    events.put((i, url, rows, False))
+        except Exception as e:
+            print(f"Error scraping {url}: {e}", file=sys.stderr)
+            finished = e
+        finally:
+            events.put((i, url, [], finished))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        for i, url in enumerate(urls):
+            executor.submit(_run, i, url)
+
+        remaining = len(urls)
+        while remaining:
+            event = events.get()
+            if event[3]:
+                remaining -= 1
+            yield event
+    finally:
+        # Reached early when the consumer stops iterating: let workers wind down.
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scrape_many(urls, scrape_fn, max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST, on_done=None):
+    """
+    Runs scrape_fn over several salon URLs concurrently.
+
+    Args:
+        urls (list): Salon URLs, in the order the results should be returned.
+        scrape_fn (callable): Called as scrape_fn(url), returns a list of rows.
+        max_workers (int): Maximum number of salons in flight overall.
+        per_host (int): Maximum number of salons in flight per host.
+        on_done (callable): Optional on_done(done, total, url, rows), called from
+            the calling thread each time a salon finishes (safe for Streamlit).
+
+    Returns:
+        list: One list of rows per input URL, in input order. A salon that
+            raised is reported on stderr and yields an empty list.
+    """
+    results = [[] for _ in urls]
+    done = 0
+
+    for i, url, rows, finished in iter_many(urls, lambda url: [scrape_fn(url) or []], max_workers, per_host):
+        if not finished:
+            results[i] = rows
+            continue
+
+        done += 1
+        if on_done:
+            on_done(done, len(urls), url, results[i])
+
+    return results
@@ -0,0 +1,299 @@
+"""
+Batch runner: scrapes menus and/or coupons for a file of salons, resumably.
+
+Input is a text file with one salon per line, either an ID (slnH000306271)
+or a salon URL; blank lines and lines starting with # are skipped.
+
+Rows are written to shard files in the output directory, menus-00001.ndjson,
+coupons-00001.csv etc., a new shard every --shard-rows rows. Each row gets a
+salon_url field. A salon's rows are written together once it has finished,
+then the salon is appended to checkpoint.ndjson with the shard offsets after
+its rows. A salon whose scrape failed part way (e.g. a coupon page still
+throttled after the retries) is neither written nor checkpointed. Re-running
+the same command resumes: checkpointed salons are skipped, failed ones are
+scraped again, and anything written after the last checkpoint is cut off
+first, so no salon is lost or written twice. The exit status is 1 when some
+salons failed.
+
+Usage:
+    python hpb_batch_cli.py salons.txt --out out/ [--kind both|menu|coupon] [--format ndjson|csv]
+                            [--workers 8] [--per-host 4] [--max-pages 20] [--shard-rows 100000]
+                            [--retry-empty] [--parse-processes N] [--metrics metrics.json|metrics.prom]
+
+--parse-processes runs menu or coupon scrapes through the staged pipeline of
+hpb_pipeline (--workers fetch threads feeding N parse processes) and prints
+each stage's utilization at the end.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+from hpb_batch import DEFAULT_MAX_WORKERS, DEFAULT_PER_HOST, iter_many
+from hpb_coupon_scraper import iter_coupons
+from hpb_http import HPB_SITE
+from hpb_menu_scraper import iter_menus
+from hpb_metrics import get_metrics
+from hpb_parser import resolve_backend
+from hpb_pipeline import iter_pipeline
+from hpb_rows import RowTable
+from hpb_salon_scraper import scrape_hpb_salon
+from hpb_store import SALON_ID_RE, TABLES
+
+HPB_BASE_URL = HPB_SITE  # bare salon IDs are expanded on this host
+CHECKPOINT_NAME = "checkpoint.ndjson"
+DEFAULT_SHARD_ROWS = 100000
+
+# Shard file prefix per kind
+SHARD_PREFIXES = {"menu": "menus", "coupon": "coupons"}
+_SHARD_RE = re.compile(r'^(menus|coupons)-(\d+)\.(ndjson|csv)$')
+
+
+def salon_url(entry):
+    """Salon URL for an input line: URLs are kept, bare IDs are expanded."""
+    entry = entry.strip()
+    if SALON_ID_RE.fullmatch(entry):
+        return f"{HPB_BASE_URL}/{entry}/"
+    return entry
+
+
+def read_salons(path):
+    urls = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            url = salon_url(line)
+            if url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+
+class ShardWriter:
+    """
+    Appends rows of one kind to numbered shard files.
+
+    Shards only rotate between salons, so a salon's rows always sit in one
+    file and the offset write_salon() returns is a valid resume point.
+    """
+
+    def __init__(self, out_dir, kind, fmt, shard_rows):
+        self.out_dir = out_dir
+        self.prefix = SHARD_PREFIXES[kind]
+        self.fmt = fmt
+        self.shard_rows = shard_rows
+        self.columns = ["salon_url"] + TABLES[kind][1]
+        self.index = max([n for p, n in existing_shards(out_dir) if p == self.prefix], default=0)
+        self.file = None
+        self.rows = 0
+
+    def _open_next(self):
+        self.close()
+        self.index += 1
+        self.name = f"{self.prefix}-{self.index:05d}.{self.fmt}"
+        self.file = open(os.path.join(self.out_dir, self.name), "w", encoding="utf-8", newline="")
+        self.rows = 0
+        if self.fmt == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=self.columns, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write_salon(self, url, rows):
+        if self.file is None or self.rows >= self.shard_rows:
+            self._open_next()
+        for row in rows:
+            row = {"salon_url": url, **row}
+            if self.fmt == "csv":
+                self.csv.writerow(row)
+            else:
+                self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.rows += len(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return [self.name, self.file.tell()]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def existing_shards(out_dir):
+    shards = []
+    for name in os.listdir(out_dir):
+        match = _SHARD_RE.match(name)
+        if match:
+            shards.append((match.group(1), int(match.group(2))))
+    return shards
+
+
+def load_checkpoint(out_dir):
+    """
+    Reads the checkpoint and cuts every shard back to its last checkpointed offset.
+
+    Returns:
+        dict: salon URL -> checkpoint entry, for the salons already done.
+    """
+    done = {}
+    path = os.path.join(out_dir, CHECKPOINT_NAME)
+    if os.path.exists(path):
+        with open(path, "r+b") as f:
+            valid = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                done[entry["salon"]] = entry
+                valid += len(line)
+            # Drop a torn last line from a crash, so new entries start on a clean line
+            f.truncate(valid)
+
+    ends = {}
+    for entry in done.values():
+        for name, offset in entry["offsets"].values():
+            ends[name] = max(ends.get(name, 0), offset)
+
+    for prefix, index in existing_shards(out_dir):
+        for fmt in ("ndjson", "csv"):
+            name = f"{prefix}-{index:05d}.{fmt}"
+            path = os.path.join(out_dir, name)
+            if not os.path.exists(path):
+                continue
+            if name not in ends:
+                os.remove(path)  # nothing in it was checkpointed
+            elif os.path.getsize(path) > ends[name]:
+                with open(path, "r+b") as f:
+                    f.truncate(ends[name])
+    return done
+
+
+def salon_batches(kind, max_pages):
+    """iter_fn for iter_many: yields (kind, rows) batches for one salon."""
+    def iter_fn(url):
+        if kind == "both":
+            # One fetch of page 1 serves both menus and coupons
+            salon = scrape_hpb_salon(url, max_pages=max_pages)
+            yield ("menu", salon["menus"])
+            yield ("coupon", salon["coupons"])
+        elif kind == "menu":
+            for rows in iter_menus(url, batches=True):
+                yield ("menu", rows)
+        else:
+            for rows in iter_coupons(url, max_pages=max_pages, batches=True):
+                yield ("coupon", rows)
+    return iter_fn
+
+
+def run(urls, out_dir, kind="both", fmt="ndjson", max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST,
+        max_pages=20, shard_rows=DEFAULT_SHARD_ROWS, retry_empty=False, parse_processes=0):
+    """
+    Scrapes urls into out_dir, skipping salons a previous run checkpointed.
+
+    parse_processes > 0 parses in that many processes (see hpb_pipeline),
+    with max_workers fetch threads; kind must then be "menu" or "coupon".
+
+    Returns:
+        dict: Counts of salons done in this run, skipped, empty (no rows),
+            and failed (not checkpointed, retried by the next run).
+
+    Raises:
+        ValueError: HPB_PARSER names an unknown or uninstalled backend.
+    """
+    # A bad HPB_PARSER would otherwise fail every salon one by one
+    resolve_backend()
+    os.makedirs(out_dir, exist_ok=True)
+    done = load_checkpoint(out_dir)
+    todo = [url for url in urls if url not in done or (retry_empty and done[url]["empty"])]
+    print(f"{len(urls)} salons, {len(urls) - len(todo)} already done, {len(todo)} to scrape", file=sys.stderr)
+
+    kinds = ["menu", "coupon"] if kind == "both" else [kind]
+    writers = {k: ShardWriter(out_dir, k, fmt, shard_rows) for k in kinds}
+    pending = {}
+    stats = {"done": 0, "skipped": len(urls) - len(todo), "empty": 0, "failed": 0}
+    start = time.monotonic()
+
+    if parse_processes > 0:
+        events = ((i, url, (kind, rows), finished) for i, url, rows, finished in
+                  iter_pipeline(todo, kind, max_pages, fetch_workers=max_workers, parse_workers=parse_processes))
+    else:
+        events = iter_many(todo, salon_batches(kind, max_pages), max_workers, per_host)
+
+    try:
+        with open(os.path.join(out_dir, CHECKPOINT_NAME), "a", encoding="utf-8") as checkpoint:
+            for i, url, batch, finished in events:
+                # Columnar until written: salons in flight hold no per-row dicts
+                rows_by_kind = pending.setdefault(i, {k: RowTable(TABLES[k][1]) for k in kinds})
+                if batch:
+                    rows_by_kind[batch[0]].extend(batch[1])
+                if not finished:
+                    continue
+
+                rows_by_kind = pending.pop(i)
+                if finished is not True:
+                    # Incomplete salon (finished is the error): left for the next run
+                    stats["failed"] += 1
+                    print(f"{url}: failed, not checkpointed ({finished})", file=sys.stderr)
+                    continue
+
+                # Rows first, then the checkpoint line that makes them count
+                offsets = {k: writers[k].write_salon(url, rows) for k, rows in rows_by_kind.items()}
+                counts = {k: len(rows) for k, rows in rows_by_kind.items()}
+                empty = not any(counts.values())
+                checkpoint.write(json.dumps({"salon": url, "rows": counts, "empty": empty, "offsets": offsets,
+                                             "at": time.strftime("%Y-%m-%dT%H:%M:%S")}, ensure_ascii=False) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+
+                stats["done"] += 1
+                stats["empty"] += empty
+                elapsed = time.monotonic() - start
+                eta = elapsed / stats["done"] * (len(todo) - stats["done"] - stats["failed"])
+                print(f"[{stats['done']}/{len(todo)}] {url}: "
+                      + ", ".join(f"{n} {k}s" for k, n in counts.items())
+                      + f" ({stats['done'] / elapsed:.2f} salons/s, ETA {eta:.0f}s)", file=sys.stderr)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return stats
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("salons", help="file with one salon ID or URL per line")
+    arg_parser.add_argument("--out", required=True, help="output directory (shards and checkpoint)")
+    arg_parser.add_argument("--kind", choices=["both", "menu", "coupon"], default="both")
+    arg_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    arg_parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="salons scraped concurrently")
+    arg_parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="concurrent salons per host")
+    arg_parser.add_argument("--max-pages", type=int, default=20, help="coupon pages read per salon")
+    arg_parser.add_argument("--shard-rows", type=int, default=DEFAULT_SHARD_ROWS, help="rows per shard file")
+    arg_parser.add_argument("--retry-empty", action="store_true", help="scrape again salons that returned no rows")
+    arg_parser.add_argument("--parse-processes", type=int, default=0,
+                            help="parse in N processes fed by --workers fetch threads (menu or coupon only)")
+    arg_parser.add_argument("--metrics", help="write stage timings and counters here at the end "
+                                                 "(Prometheus text for .prom, else JSON)")
+    args = arg_parser.parse_args()
+    if args.parse_processes > 0 and args.kind == "both":
+        arg_parser.error("--parse-processes needs --kind menu or --kind coupon")
+
+    stats = run(read_salons(args.salons), args.out, args.kind, args.format, args.workers, args.per_host,
+                args.max_pages, args.shard_rows, args.retry_empty, args.parse_processes)
+    print(f"Done: {stats['done']} scraped ({stats['empty']} empty), {stats['skipped']} skipped, "
+          f"{stats['failed']} failed", file=sys.stderr)
+    if args.metrics:
+        metrics = get_metrics()
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.to_prometheus() if args.metrics.endswith(".prom") else metrics.to_json())
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
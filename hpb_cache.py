@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_CACHE_DIR = ".hpb_cache"
+DEFAULT_TTL = 6 * 60 * 60  # seconds a page is served without revalidation
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # bytes of cache files kept on disk
+
+# Cache modes
+#   default : fresh entries are served, stale ones are revalidated with ETag/Last-Modified
+#   offline : only the cache is used, misses return a synthetic 504 (no network at all)
+#   refresh : every entry is revalidated regardless of age
+CACHE_MODES = ("default", "offline", "refresh")
+
+_META_SUFFIX = ".json"
+_BODY_SUFFIX = ".body.z"
+
+
+def canonical_url(url):
+    """
+    Normalizes a URL into the cache key form.
+
+    Lowercases scheme and host, drops the fragment and default ports, sorts the
+    query string, and makes an empty path "/".
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def build_response(url, status_code, headers=None, content=b""):
+    """
+    A requests.Response built from stored parts, for pages that did not come
+    off the network (cache hits, replayed recordings, bodies handed to a
+    parse process). It is a real Response, so callers keep using .text,
+    .encoding, decode_response etc.
+    """
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers or {})
+    response._content = content
+    response.encoding = None
+    return response
+
+
+class HttpCache:
+    """
+    On-disk HTTP response cache keyed by canonical URL.
+
+    Bodies are stored zlib-compressed next to a small JSON metadata file. Entries
+    are fresh for ttl seconds; after that they are revalidated with
+    If-None-Match / If-Modified-Since, so an unchanged page costs a 304. The
+    cache is capped at max_bytes of compressed data and evicts least recently
+    used entries first; an entry's size is its compressed body plus its
+    metadata file, derived data included.
+
+    Parsed results can be attached to an entry with put_derived(), and are
+    returned by get_derived() for as long as the stored body is unchanged, so
+    a 304 also skips reparsing the page.
+
+    Args:
+        cache_dir (str): Directory holding the cache files.
+        ttl (float): Seconds an entry is served without revalidation.
+        max_bytes (int): Size cap for the cache files on disk.
+        mode (str): One of CACHE_MODES.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, mode="default"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode!r} (expected one of {CACHE_MODES})")
+
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._scan())
+
+    # --- storage -----------------------------------------------------------
+
+    def _paths(self, url):
+        key = hashlib.sha256(canonical_url(url).encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + _META_SUFFIX, base + _BODY_SUFFIX
+
+    def _scan(self):
+        # (mtime of the body, body path, body + metadata size) per entry
+        bodies, meta_sizes = [], {}
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith((_BODY_SUFFIX, _META_SUFFIX)):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(_BODY_SUFFIX):
+                    bodies.append((stat.st_mtime_ns, entry.path, stat.st_size))
+                else:
+                    meta_sizes[entry.path[:-len(_META_SUFFIX)]] = stat.st_size
+        return [(mtime, path, size + meta_sizes.get(path[:-len(_BODY_SUFFIX)], 0)) for mtime, path, size in bodies]
+
+    def _write_atomic(self, path, data):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _load_meta(self, url):
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_meta(self, url, meta):
+        # Called with self._lock held: metadata is read-modify-written, and its size counts
+        meta_path, _ = self._paths(url)
+        data = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        try:
+            old_size = os.path.getsize(meta_path)
+        except FileNotFoundError:
+            old_size = 0
+        self._write_atomic(meta_path, data)
+        self._total_bytes += len(data) - old_size
+
+    def _load_body(self, url):
+        _, body_path = self._paths(url)
+        try:
+            with open(body_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(body_path)
+        except FileNotFoundError:
+            pass
+        return zlib.decompress(data)
+
+    def _store(self, url, response):
+        meta_path, body_path = self._paths(url)
+        compressed = zlib.compress(response.content, 6)
+
+        try:
+            old_size = os.path.getsize(body_path)
+        except FileNotFoundError:
+            old_size = 0
+
+        meta = {
+            "url": canonical_url(url),
+            "status_code": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")},
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "digest": hashlib.sha1(response.content).hexdigest(),
+            "derived": {},
+        }
+        self._write_atomic(body_path, compressed)
+        with self._lock:
+            self._save_meta(url, meta)
+            self._total_bytes += len(compressed) - old_size
+        self._evict(keep=body_path)
+        return meta
+
+    def _evict(self, keep=None):
+        # Drops least recently used entries until the cache fits max_bytes.
+        # The entry just written (keep) is never evicted.
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            entries = sorted(self._scan())
+            total = sum(size for _, _, size in entries)
+            for _, body_path, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if body_path == keep:
+                    continue
+                meta_path = body_path[:-len(_BODY_SUFFIX)] + _META_SUFFIX
+                for path in (body_path, meta_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+            self._total_bytes = total
+
+    # --- public API --------------------------------------------------------
+
+    def fetch(self, send, url, **kwargs):
+        """
+        Returns the response for url, going through the cache.
+
+        Args:
+            send (callable): send(url, **kwargs) performing the real GET.
+            url (str): Target URL.
+
+        Returns:
+            requests.Response: Extra attributes are set on it:
+                from_cache (bool): the body came from disk.
+                not_modified (bool): the server answered 304 to a revalidation.
+                cache_url (str): the URL the entry is stored under.
+                cache_digest (str): digest of the stored body, for put_derived().
+        """
+        meta = self._load_meta(url)
+        body = self._load_body(url) if meta else None
+        if body is None:
+            meta = None
+
+        if meta and self.mode == "offline":
+            return self._cached_response(url, meta, body)
+
+        if meta and self.mode == "default" and time.time() - meta["stored_at"] < self.ttl:
+            return self._cached_response(url, meta, body)
+
+        if self.mode == "offline":
+            print(f"Cache miss in offline mode: {url}", file=sys.stderr)
+            response = build_response(url, 504, {}, b"")
+            response.from_cache = False
+            response.not_modified = False
+            response.cache_url = url
+            response.cache_digest = None
+            return response
+
+        if meta:
+            headers = dict(kwargs.pop("headers", None) or {})
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+            kwargs["headers"] = headers
+
+        response = send(url, **kwargs)
+
+        if meta and response.status_code == 304:
+            with self._lock:
+                # Derived data attached since meta was read is kept
+                current = self._load_meta(url)
+                if current and current.get("digest") == meta["digest"]:
+                    meta = current
+                meta["stored_at"] = time.time()
+                self._save_meta(url, meta)
+            cached = self._cached_response(url, meta, body)
+            cached.not_modified = True
+            return cached
+
+        response.from_cache = False
+        response.not_modified = False
+        response.cache_url = url
+        response.cache_digest = None
+        if response.status_code == 200:
+            response.cache_digest = self._store(url, response)["digest"]
+        return response
+
+    def _cached_response(self, url, meta, body):
+        response = build_response(url, meta["status_code"], meta["headers"], body)
+        response.from_cache = True
+        response.not_modified = False
+        response.cache_url = url
+        response.cache_digest = meta["digest"]
+        return response
+
+    def get_derived(self, response, name):
+        """Returns the parsed result stored under name for this response body, or None."""
+        digest = getattr(response, "cache_digest", None)
+        if not digest:
+            return None
+        meta = self._load_meta(response.cache_url)
+        if not meta or meta.get("digest") != digest:
+            return None
+        return meta.get("derived", {}).get(name)
+
+    def put_derived(self, response, name, value):
+        """Attaches a JSON-serializable parsed result to the cached body of response."""
+        digest = getattr(response, "cache_digest", None)
+        if not digest:
+            return
+        with self._lock:
+            # Under the lock, so a concurrent put_derived or _store is not overwritten
+            meta = self._load_meta(response.cache_url)
+            if not meta or meta.get("digest") != digest:
+                return
+            meta.setdefault("derived", {})[name] = value
+            self._save_meta(response.cache_url, meta)
+        self._evict(keep=self._paths(response.cache_url)[1])
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(_META_SUFFIX) or name.endswith(_BODY_SUFFIX):
+                    os.remove(os.path.join(self.cache_dir, name))
+            self._total_bytes = 0
+
+
+def cache_from_env():
+    """
+    Builds an HttpCache from environment variables, or returns None if disabled.
+
+    HPB_CACHE_DIR enables the cache. HPB_CACHE_TTL, HPB_CACHE_MAX_MB and
+    HPB_CACHE_MODE (default/offline/refresh) tune it.
+    """
+    cache_dir = os.environ.get("HPB_CACHE_DIR")
+    if not cache_dir:
+        return None
+    return HttpCache(
+        cache_dir=cache_dir,
+        ttl=float(os.environ.get("HPB_CACHE_TTL", DEFAULT_TTL)),
+        max_bytes=int(float(os.environ.get("HPB_CACHE_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+        mode=os.environ.get("HPB_CACHE_MODE", "default"),
+    )
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from hpb_http import get_client
+from hpb_store import salon_id
+
+DEFAULT_STATE_DIR = ".hpb_changes"
+
+# Fields identifying a row within its salon. A row whose identity is kept but
+# whose other fields change is reported as modified; a renamed row shows up
+# as one removal plus one addition.
+MENU_KEY = ("category", "name")
+COUPON_KEY = ("eligibility", "name")
+
+# Markup that changes on every request without the salon changing anything:
+# inline scripts (tracking, tokens), comments and whitespace. JSON-LD is kept,
+# the salon name is read from it.
+_VOLATILE_RE = re.compile(
+    rb'<script(?![^>]*application/ld\+json)[^>]*>.*?</script>|<!--.*?-->',
+    re.IGNORECASE | re.DOTALL,
+)
+_SPACE_RE = re.compile(rb'\s+')
+_TAG_SPACE_RE = re.compile(rb'\s*([<>])\s*')
+
+
+def page_fingerprint(content):
+    """Digest of a page body, ignoring markup that changes on every request."""
+    body = _VOLATILE_RE.sub(b'', content or b'')
+    body = _SPACE_RE.sub(b' ', _TAG_SPACE_RE.sub(rb'\1', body))
+    return hashlib.sha1(body).hexdigest()
+
+
+def row_fingerprint(row):
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ChangeTracker:
+    """
+    Remembers what the previous runs saw, per salon page and per row.
+
+    Two levels of fingerprints are kept in one JSON state file:
+
+    - Pages: the parsed result of every page is stored with the fingerprint
+      of its body. Scrapers given client() skip parsing a page whose
+      fingerprint matches, and reuse the stored rows.
+    - Rows: diff() compares the rows of a salon with the previous run, keyed
+      by key_fields, and returns only what was added, removed or modified.
+
+    Call save() once the run is complete. Stored pages of the salons fetched
+    in the run that the run did not get again (a page that is gone) are
+    dropped then.
+
+    Args:
+        path (str): State file; created on the first save().
+        key_fields (tuple): Row fields identifying a row within its salon
+            (MENU_KEY or COUPON_KEY).
+    """
+
+    def __init__(self, path, key_fields):
+        self.path = path
+        self.key_fields = tuple(key_fields)
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {}
+        self.state.setdefault("pages", {})
+        self.state.setdefault("salons", {})
+        self._fetched = {}  # page URL -> status, of pages fetched through client() in this run
+
+    def client(self, client=None):
+        """Wraps an HpbClient so the scrapers reuse unchanged pages (see TrackingClient)."""
+        return TrackingClient(self, client)
+
+    def fetched(self, url, status):
+        """Records a page fetched in this run; see save()."""
+        with self._lock:
+            self._fetched[url] = status
+
+    def get_derived(self, response, name):
+        """Returns the stored parsed result of an unchanged page, or None."""
+        fingerprint = getattr(response, "change_fingerprint", None)
+        with self._lock:
+            page = self.state["pages"].get(getattr(response, "change_url", None))
+            if not fingerprint or not page or page["fingerprint"] != fingerprint or name not in page["derived"]:
+                return None
+            # A fresh copy: callers mutate the rows they get
+            return json.loads(page["derived"][name])
+
+    def put_derived(self, response, name, value):
+        fingerprint = getattr(response, "change_fingerprint", None)
+        if not fingerprint:
+            return
+        with self._lock:
+            page = self.state["pages"].get(response.change_url)
+            if not page or page["fingerprint"] != fingerprint:
+                page = self.state["pages"][response.change_url] = {"fingerprint": fingerprint, "derived": {}}
+            page["derived"][name] = json.dumps(value, ensure_ascii=False)
+
+    def _row_keys(self, rows):
+        # Identity of each row; repeated identities are numbered in page order.
+        # Rows are copied to plain dicts (they may be hpb_rows.Row views) for the JSON state.
+        seen = {}
+        for row in map(dict, rows):
+            key = "\t".join(str(row.get(f, "")) for f in self.key_fields)
+            seen[key] = seen.get(key, 0) + 1
+            yield (key if seen[key] == 1 else f"{key}\t#{seen[key]}"), row
+
+    def diff(self, salon_url, rows, complete=True):
+        """
+        Compares the rows of one salon with the previous run and records them.
+
+        A scrape that stopped early (complete=False) is taken as failed:
+        nothing is recorded and nothing is reported, so the next run is still
+        compared with the last good one. A complete scrape without rows
+        reports every row of the previous run as removed.
+
+        Args:
+            salon_url (str): Salon URL, as given to the scraper.
+            rows (list): All rows of the salon from this run.
+            complete (bool): False when the scraper failed part way, e.g.
+                the finished event of hpb_batch.iter_many was an exception.
+
+        Returns:
+            dict: added, modified and removed (lists of rows; removed rows
+                are as last seen) and unchanged (int, number of rows).
+        """
+        delta = {"added": [], "modified": [], "removed": [], "unchanged": 0}
+        if not complete:
+            return delta
+
+        current = {key: [row_fingerprint(row), row] for key, row in self._row_keys(rows)}
+        with self._lock:
+            previous = self.state["salons"].get(salon_url, {}).get("rows", {})
+            self.state["salons"][salon_url] = {"updated": time.strftime("%Y-%m-%dT%H:%M:%S"), "rows": current}
+
+        for key, (fingerprint, row) in current.items():
+            if key not in previous:
+                delta["added"].append(row)
+            elif previous[key][0] != fingerprint:
+                delta["modified"].append(row)
+            else:
+                delta["unchanged"] += 1
+        delta["removed"] = [row for key, (_, row) in previous.items() if key not in current]
+        return delta
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            salons = {salon_id(url) for url in self._fetched}
+            pages = self.state["pages"]
+            for url in [url for url in pages if self._fetched.get(url) != 200 and salon_id(url) in salons]:
+                del pages[url]
+            data = json.dumps(self.state, ensure_ascii=False)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+class TrackingClient:
+    """
+    HpbClient wrapper that fingerprints every page it fetches.
+
+    Its cache attribute is the tracker, so load_coupon_page / scrape_hpb_menu
+    find the parsed result of an unchanged page there and skip parsing. Pages
+    the tracker does not know fall through to the wrapped client's HTTP cache.
+    """
+
+    def __init__(self, tracker, client=None):
+        self.client = client or get_client()
+        self.cache = _TrackerCache(tracker, self.client.cache)
+
+    def get(self, url, **kwargs):
+        response = self.client.get(url, **kwargs)
+        self.cache.tracker.fetched(url, response.status_code)
+        response.change_url = url
+        response.change_fingerprint = page_fingerprint(response.content) if response.status_code == 200 else None
+        return response
+
+
+class _TrackerCache:
+    # The derived-result half of HttpCache, backed by the tracker first
+
+    def __init__(self, tracker, http_cache):
+        self.tracker = tracker
+        self.http_cache = http_cache
+
+    def get_derived(self, response, name):
+        value = self.tracker.get_derived(response, name)
+        if value is None and self.http_cache is not None:
+            value = self.http_cache.get_derived(response, name)
+            if value is not None:
+                self.tracker.put_derived(response, name, value)
+        return value
+
+    def put_derived(self, response, name, value):
+        self.tracker.put_derived(response, name, value)
+        if self.http_cache is not None:
+            self.http_cache.put_derived(response, name, value)
+
+
+def delta_rows(delta):
+    """Flattens a diff() result into rows with a "change" column (added/modified/removed)."""
+    return [{**row, "change": change} for change in ("added", "modified", "removed") for row in delta[change]]
+
+
+def state_path(kind, state_dir=DEFAULT_STATE_DIR):
+    """Default state file of the "menu" or "coupon" tracker."""
+    return os.path.join(state_dir, f"{kind}.json")
+
+
+if __name__ == "__main__":
+    # python hpb_changes.py coupon|menu URL [URL ...]
+    # Prints the changes since the previous run as NDJSON, one row per line.
+    from hpb_coupon_scraper import iter_coupons
+    from hpb_menu_scraper import iter_menus
+
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("coupon", "menu"):
+        print("Usage: python hpb_changes.py coupon|menu URL [URL ...]", file=sys.stderr)
+        sys.exit(2)
+
+    kind, urls = sys.argv[1], sys.argv[2:]
+    tracker = ChangeTracker(state_path(kind), COUPON_KEY if kind == "coupon" else MENU_KEY)
+    client = tracker.client()
+
+    for url in urls:
+        try:
+            rows = list(iter_coupons(url, max_pages=20, client=client) if kind == "coupon" else iter_menus(url, client=client))
+        except Exception as e:
+            # Incomplete: the salon keeps its previous state
+            print(f"{url}: skipped, {e}", file=sys.stderr)
+            continue
+        delta = tracker.diff(url, rows)
+        print(f"{url}: {len(delta['added'])} added, {len(delta['modified'])} modified, "
+              f"{len(delta['removed'])} removed, {delta['unchanged']} unchanged", file=sys.stderr)
+        for row in delta_rows(delta):
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    tracker.save()
@@ -1,9 +1,15 @@
-import requests
-from bs4 import BeautifulSoup
+from hpb_extract import Field, RecordSpec
+from hpb_http import decode_response, fetch, get_client
+from hpb_metrics import get_metrics
+from hpb_menu_scraper import is_menu_region, mark_menu_region, parse_menu_page
+from hpb_parser import make_soup, region_filter, resolve_backend, tag_classes
+from hpb_ratelimit import THROTTLE_STATUSES, ThrottledError
+from hpb_rows import intern_value
 import re
 import json
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Force stdout to use utf-8
 if sys.stdout.encoding != 'utf-8':
@@ -40,192 +46,377 @@ def extract_salon_name(soup):
         pass
     return "Unknown Salon"
 
-def scrape_hpb_coupon(base_url, max_pages=10):
+class IncompleteScrapeError(RuntimeError):
+    """A coupon page after page 1 failed to load: the rows yielded before it are not the whole list."""
+
+# Number of coupon pages fetched concurrently once the page count is known.
+# 1 disables speculation and always walks the pages one by one.
+DEFAULT_PAGE_WORKERS = 4
+
+# Name of the parsed page result stored in the HTTP cache. Bump the version
+# whenever parse_coupon_page changes its output.
+DERIVED_KEY = "coupon_page/v1"
+# Same, for a page parsed together with its menus (include_menus=True)
+SALON_DERIVED_KEY = "salon_page/v2"
+
+# Paging block text such as "1/3ページ"
+PAGE_OF_RE = re.compile(r'(\d+)\s*/\s*(\d+)\s*ページ')
+
+# Classes of the paging block elements that has_next_page / get_page_count read.
+# "pa" is the "1/3ページ" label.
+PAGING_CLASSES = {'next', 'arrowPagingR', 'paging', 'jscPagingParents', 'afterPage', 'numberOfResult', 'pa'}
+
+def is_coupon_region(name, attrs):
+    # Targeted parsing keeps only what parse_coupon_page reads: table rows,
+    # the paging block, and the title / JSON-LD used for the salon name.
+    if name in ('tr', 'title'):
+        return True
+    if name == 'script':
+        return attrs.get('type') == 'application/ld+json'
+    return not PAGING_CLASSES.isdisjoint(tag_classes(attrs))
+
+def normalize_coupon_url(base_url):
     # Ensure URL ends with /coupon/
     if not base_url.endswith('/coupon/'):
         if base_url.endswith('/'):
              base_url += 'coupon/'
         else:
              base_url += '/coupon/'
+    return base_url
 
-    all_coupons = []
-    
-    # We will loop through PN1, PN2, ...
+def coupon_page_url(base_url, page_num):
     # The first page is often just .../coupon/ but can be treated as page 1.
     # Subsequent pages are .../coupon/PN{i}.html
-    
-    for page_num in range(1, max_pages + 1):
-        if page_num == 1:
-            target_url = base_url
+    if page_num == 1:
+        return base_url
+    return f"{base_url}PN{page_num}.html"
+
+def is_salon_region(name, attrs):
+    # Coupon and menu regions together, for pages parsed once for both
+    return is_coupon_region(name, attrs) or is_menu_region(name, attrs)
+
+def load_coupon_page(target_url, client=None, parser=None, targeted=True, include_menus=False):
+    """
+    Fetches one coupon page and extracts its rows and paging info.
+
+    Pages served unchanged by the HTTP cache reuse the stored result instead
+    of being parsed again. parser selects the HTML backend (see hpb_parser);
+    targeted builds the tree only for the regions in is_coupon_region.
+    include_menus also extracts the #menuList rows of the same tree into
+    page["menus"] (see hpb_menu_scraper.parse_menu_page).
+
+    Returns:
+        dict or None: See parse_coupon_page. None when the page is missing (404) or blocked.
+    """
+    print(f"Fetching: {target_url}", file=sys.stderr)
+    client = client or get_client()
+
+    # Browser-like headers and connection reuse come from the shared client
+    response = fetch(target_url, client=client)
+    return coupon_page_from_response(response, target_url, client.cache, parser, targeted, include_menus)
+
+def coupon_page_from_response(response, target_url, cache=None, parser=None, targeted=True, include_menus=False):
+    """
+    The parse half of load_coupon_page, for a response fetched elsewhere
+    (e.g. by hpb_async). cache is the HttpCache the response came through, if any.
+
+    Returns:
+        dict or None: As load_coupon_page.
+    """
+    # Additional Logging for debugging
+    if response.status_code != 200:
+        print(f"Warning: Failed to fetch {target_url}. Status: {response.status_code}", file=sys.stderr)
+
+    # Still blocked after the rate limiter's retries (see hpb_ratelimit): fail
+    # instead of ending the coupon list as if this were the last page.
+    if response.status_code in THROTTLE_STATUSES:
+        raise ThrottledError(target_url, response.status_code, getattr(response, 'retries', 0))
+
+    # If page doesn't exist (e.g. 404), we stop
+    if response.status_code == 404:
+        print("Page not found (404), stopping pagination.", file=sys.stderr)
+        return None
+
+    if response.status_code != 200:
+        return None
+
+    metrics = get_metrics()
+    derived_key = SALON_DERIVED_KEY if include_menus else DERIVED_KEY
+    if cache is not None:
+        page = cache.get_derived(response, derived_key)
+        if page is not None:
+            metrics.observe("hpb_page_rows", len(page["rows"]), kind="coupon")
+            return page
+
+    markup = decode_response(response)
+    parse_only = None
+    if targeted:
+        if include_menus:
+            markup = mark_menu_region(markup)
+        parse_only = region_filter(is_salon_region if include_menus else is_coupon_region)
+    soup = make_soup(markup, parser, parse_only=parse_only)
+    with metrics.timer("extract"):
+        page = parse_coupon_page(soup)
+        if include_menus:
+            page["menus"] = parse_menu_page(soup) or []
+    metrics.observe("hpb_page_rows", len(page["rows"]), kind="coupon")
+
+    if cache is not None:
+        cache.put_derived(response, derived_key, page)
+    return page
+
+def parse_coupon_page(soup):
+    """
+    Extracts everything the scraper needs from one parsed coupon page.
+
+    Returns:
+        dict: salon_name, rows (coupon dicts), has_next (bool), page_count (int or None).
+    """
+    salon_name = extract_salon_name(soup)
+    rows = parse_coupon_rows(soup, salon_name)
+    return {
+        "salon_name": salon_name,
+        "rows": rows,
+        "has_next": has_next_page(soup),
+        "page_count": get_page_count(soup, len(rows)),
+    }
+
+def _field_text(tag):
+    return clean_text(tag.get_text())
+
+def _icons_text(icon_list):
+    return ", ".join(clean_text(li.get_text()) for li in icon_list.find_all('li'))
+
+def _conditions_text(cond_list):
+    pairs = []
+    dts = cond_list.find_all('dt')
+    dds = cond_list.find_all('dd')
+
+    if len(dts) != len(dds):
+        return clean_text(cond_list.get_text())
+
+    for dt, dd in zip(dts, dds):
+         k = clean_text(dt.get_text())
+         v = clean_text(dd.get_text())
+         if not k.endswith('：') and not k.endswith(':'):
+             k += '：'
+         pairs.append(f"{k} {v}")
+
+    # Use newline for display/excel
+    return "\n".join(pairs)
+
+# Fields of a coupon row, matched in a single walk over each <tr>.
+# Field order is the key order of the resulting dicts (after salon_name).
+COUPON_SPEC = RecordSpec([
+    # 1. Eligibility: any class starting with couponLabel (New, All, Step-up, etc.)
+    # Coupons ALWAYS have a label; a row with NO label class is a Standard Menu row and is skipped.
+    Field('eligibility', 'couponLabel', prefix=True, value=_field_text, required=True),
+    # 2. Menu Icons
+    Field('icons', 'couponMenuIcons', tag='ul', value=_icons_text),
+    # 3. Name: identifies the row as a menu/coupon row
+    Field('name', 'couponMenuName', tag='p', value=_field_text, required=True),
+    # 4. Price
+    Field('price', 'couponMenuPrice', tag='p', value=_field_text),
+    # 5. Conditions
+    Field('conditions', 'couponConditionsList', tag='dl', value=_conditions_text),
+])
+
+def parse_coupon_rows(soup, salon_name):
+    # Find coupon list block
+    # Coupons are usually in div.couponList > ul > li OR just sequential elements
+    # Based on user description: td class="couponLabelCT01" suggests a table structure?
+    # Actually HPB coupons are often in tables (class="couponListTbl") or divs based on newer designs.
+    # User snippet shows: <p class="couponMenuName"> etc.
+
+    # Strategy: Coupons are often in a table structure.
+    # Look for all 'tr' that might contain a coupon.
+    # Structure: <tr> <td class="couponLabelCT01">...</td> <td class="bgWhite"> ... <p class="couponMenuName">...</td> </tr>
+    coupons = []
+    # Repeated on every row: one shared string each (see hpb_rows)
+    salon_name = intern_value(salon_name)
+
+    for tr in soup.find_all('tr'):
+        values = COUPON_SPEC.extract(tr)
+        if values is None:
+            continue
+
+        values["eligibility"] = intern_value(values["eligibility"])
+        values["icons"] = intern_value(values["icons"])
+        coupons.append({"salon_name": salon_name, **values})
+
+    return coupons
+
+def has_next_page(soup):
+    # Method 1: Check for "next" link class
+    # Common pattern: <li class="next"><a ...></a></li> or <a ... class="next"></a>
+    if soup.select_one('li.next > a') or soup.select_one('a.next') or soup.find(class_='arrowPagingR'):
+        return True
+
+    # Method 2: Check if "paging" exists and we are not at end (heuristic)
+    # Check for explicit paging list
+    paging_ul = soup.find(class_='paging') or soup.find(class_='jscPagingParents')
+    if paging_ul and paging_ul.find('span', class_='current'):
+        # User showed: <li class="pa top0 right0 afterPage"><a ...><span class="iS arrowPagingR">次の25件</span></a></li>
+        # "afterPage" class seems key.
+        if soup.find(class_='afterPage'):
+            return True
+
+    return False
+
+def get_page_count(soup, rows_per_page=0):
+    """
+    Reads the total number of coupon pages from the paging block of page 1.
+
+    Args:
+        soup (BeautifulSoup): Parsed first page.
+        rows_per_page (int): Coupon rows found on the first page, used to derive
+            the page count from the total coupon count when "n/Nページ" is absent.
+
+    Returns:
+        int or None: Number of pages, or None if it cannot be determined.
+    """
+    # "1/3ページ"
+    page_text = soup.find(string=PAGE_OF_RE)
+    if page_text:
+        return int(PAGE_OF_RE.search(page_text).group(2))
+
+    # <span class="numberOfResult">73</span>件
+    count_tag = soup.find(class_='numberOfResult')
+    if count_tag and rows_per_page:
+        digits = re.sub(r'[^\d]', '', count_tag.get_text())
+        if digits:
+            return -(-int(digits) // rows_per_page)
+
+    return None
+
+def scrape_hpb_coupon(base_url, max_pages=10, client=None, page_workers=DEFAULT_PAGE_WORKERS, parser=None, targeted=True):
+    with get_metrics().timer("scrape_coupon"):
+        return list(iter_coupons(base_url, max_pages, client, page_workers, parser, targeted))
+
+def iter_coupons(base_url, max_pages=10, client=None, page_workers=DEFAULT_PAGE_WORKERS, parser=None, targeted=True, batches=False):
+    """
+    Yields coupon rows as soon as each page has been parsed.
+
+    Takes the same arguments as scrape_hpb_coupon. With batches=True one list
+    of rows is yielded per page instead of individual rows.
+
+    A missing page 1 (or one that fails to load) yields nothing, and a
+    missing (404) later page ends the list.
+
+    Raises:
+        ThrottledError: A page was still refused after the rate limiter's
+            retries. The rows already yielded are not the whole list.
+        IncompleteScrapeError: A page after page 1 failed to load for another
+            reason (network error, timeout, ...); same.
+        ValueError: The parser backend (parser or HPB_PARSER) is unknown or
+            not installed; raised before anything is fetched.
+    """
+    parser = resolve_backend(parser)
+    base_url = normalize_coupon_url(base_url)
+
+    # Page 1 is always fetched alone: it gives the salon name and the page count.
+    try:
+        page = load_coupon_page(base_url, client=client, parser=parser, targeted=targeted)
+    except ThrottledError:
+        raise
+    except Exception as e:
+        print(f"Error on page 1: {e}", file=sys.stderr)
+        return
+    if page is None:
+        return
+
+    for rows in iter_coupon_pages(base_url, page, max_pages, client, page_workers, parser, targeted):
+        if batches:
+            yield rows
         else:
-            target_url = f"{base_url}PN{page_num}.html"
-            
-        print(f"Fetching: {target_url}", file=sys.stderr)
-        
-        try:
-            # Add User-Agent to mimic a real browser
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(target_url, headers=headers)
-            response.encoding = response.apparent_encoding
-            
-            # Additional Logging for debugging
-            if response.status_code != 200:
-                print(f"Warning: Failed to fetch {target_url}. Status: {response.status_code}", file=sys.stderr)
-                # If blocked (403/503), this will show in logs
-            
-            # If page doesn't exist (e.g. 404), we stop
-            if response.status_code == 404:
-                print("Page not found (404), stopping pagination.", file=sys.stderr)
-                break
-            
-            if response.status_code != 200:
-                break
+            yield from rows
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract info primarily from the first page? Or update per page?
-            # Usually salon name is same.
-            if page_num == 1:
-                salon_name = extract_salon_name(soup)
-            
-            # Find coupon list block
-            # Coupons are usually in div.couponList > ul > li OR just sequential elements
-            # Based on user description: td class="couponLabelCT01" suggests a table structure?
-            # Actually HPB coupons are often in tables (class="couponListTbl") or divs based on newer designs.
-            # User snippet shows: <p class="couponMenuName"> etc.
-            # Let's look for the container. Usually "div.couponDetail" or "table.couponListTbl"
-            
-            # Strategy: Coupons are often in a table structure.
-            # Look for all 'tr' that might contain a coupon.
-            # Structure: <tr> <td class="couponLabelCT01">...</td> <td class="bgWhite"> ... <p class="couponMenuName">...</td> </tr>
-            
-            trs = soup.find_all('tr')
-            if not trs and page_num == 1:
-                # Try finding div structure if table fails, though debug showed table parts
-                coupon_blocks = soup.find_all('div', class_='couponDetail')
-                # (Previous logic for div blocks could represent fallback, but let's stick to TR for now based on debug)
-            
-            # If no TRs found, might be odd. But let's proceed.
-            
-            for tr in trs:
-                # Check if this TR is a coupon row
-                # Must have couponMenuName or couponLabelCT01
-                name_tag = tr.find('p', class_='couponMenuName')
-                if not name_tag:
-                    continue
-
-                # 1. Eligibility
-                eligibility = ""
-                # Look for any class starting with couponLabel
-                el_tag = tr.find(class_=re.compile(r'couponLabel.*'))
-                if el_tag:
-                    eligibility = clean_text(el_tag.get_text())
-                else:
-                    # User wants ALL coupons, but we must exclude "Menu" items that appear on the same page.
-                    # Coupons usually ALWAYS have a label (New, All, Step-up, etc.)
-                    # If this row has NO label class, it is likely a Standard Menu row. Use continue to skip.
-                    continue
-                
-                # Removed the "continue" skip. We want ALL coupons.
-                # The primary check is 'name_tag' existence which identifies it as a menu/coupon row.
-
-                # 2. Menu Icons
-                icons = []
-                # Search within the TR
-                icon_list = tr.find('ul', class_='couponMenuIcons')
-                if icon_list:
-                    for li in icon_list.find_all('li'):
-                        icons.append(clean_text(li.get_text()))
-                icons_str = ", ".join(icons)
-
-                # 3. Name
-                name = clean_text(name_tag.get_text())
-
-                # 4. Price
-                price = ""
-                price_tag = tr.find('p', class_='couponMenuPrice')
-                if price_tag:
-                    price = clean_text(price_tag.get_text())
-
-                # 5. Conditions
-                conditions_str = ""
-                cond_list = tr.find('dl', class_='couponConditionsList')
-                if cond_list:
-                    pairs = []
-                    dts = cond_list.find_all('dt')
-                    dds = cond_list.find_all('dd')
-                    
-                    if len(dts) == len(dds):
-                        for dt, dd in zip(dts, dds):
-                             k = clean_text(dt.get_text())
-                             v = clean_text(dd.get_text())
-                             if not k.endswith('：') and not k.endswith(':'):
-                                 k += '：'
-                             pairs.append(f"{k} {v}")
-                    else:
-                        conditions_str = clean_text(cond_list.get_text())
-                    
-                    if pairs:
-                        # Use newline for display/excel
-                        conditions_str = "\n".join(pairs)
-
-                all_coupons.append({
-                    "salon_name": salon_name,
-                    "eligibility": eligibility,
-                    "icons": icons_str,
-                    "name": name,
-                    "price": price,
-                    "conditions": conditions_str
-                })
-
-            # Pagination Check
-            has_next = False
-            
-            # Method 1: Check for "next" link class
-            # Common pattern: <li class="next"><a ...></a></li> or <a ... class="next"></a>
-            next_link = soup.select_one('li.next > a') or soup.select_one('a.next') or soup.find(class_='arrowPagingR')
-            
-            if next_link:
-                has_next = True
-            
-            # Method 2: Check if "paging" exists and we are not at end (heuristic)
-            if not has_next:
-                # Check for explicit paging list
-                paging_ul = soup.find(class_='paging') or soup.find(class_='jscPagingParents')
-                if paging_ul:
-                    # Check if there is a link for next page number
-                    # e.g. current is span, next is a
-                    current_span = paging_ul.find('span', class_='current')
-                    if current_span:
-                        current_page_idx = -1
-                        # Find index of current span in children
-                        try:
-                             # This is brittle. Better to trust the loop:
-                             # If we found coupons, and we are not at max_pages, let's try next.
-                             # BUT that triggers 404s. 
-                             # User showed: <li class="pa top0 right0 afterPage"><a ...><span class="iS arrowPagingR">次の25件</span></a></li>
-                             # "afterPage" class seems key.
-                             if soup.find(class_='afterPage'):
-                                 has_next = True
-                        except:
-                            pass
-
-            if not has_next:
-                 # If we can't find a next link, stop.
-                 break
+def iter_coupon_pages(base_url, first_page, max_pages=10, client=None, page_workers=DEFAULT_PAGE_WORKERS, parser=None, targeted=True):
+    """
+    Yields the coupon rows of an already loaded page 1, then of each following page.
+
+    Args:
+        base_url (str): Normalized .../coupon/ URL.
+        first_page (dict): Result of load_coupon_page for page 1.
+
+    Yields:
+        list: Coupon dicts of one page, in page order.
+
+    Raises:
+        ThrottledError, IncompleteScrapeError: As iter_coupons.
+    """
+    # Usually salon name is same on every page, so page 1's is used throughout.
+    salon_name = intern_value(first_page["salon_name"])
+    yield first_page["rows"]
+
+    def page_rows(page):
+        for row in page["rows"]:
+            row["salon_name"] = salon_name
+        return page["rows"]
+
+    if max_pages < 2 or not first_page["has_next"]:
+        return
+
+    page_count = first_page["page_count"] if page_workers > 1 else None
+
+    if page_count:
+        # Speculative mode: the page count is known, so PN2..PNk are fetched
+        # concurrently and yielded in page order.
+        page_nums = list(range(2, min(page_count, max_pages) + 1))
+        if not page_nums:
+            return
 
+        with ThreadPoolExecutor(max_workers=min(page_workers, len(page_nums))) as executor:
+            futures = [executor.submit(load_coupon_page, coupon_page_url(base_url, n), client, parser, targeted) for n in page_nums]
+            try:
+                for page_num, future in zip(page_nums, futures):
+                    try:
+                        page = future.result()
+                    except ThrottledError:
+                        raise
+                    except Exception as e:
+                        raise IncompleteScrapeError(f"Error on page {page_num}: {e}") from e
+
+                    if page is None:
+                        # Keep sequential semantics: nothing after a missing page.
+                        break
+
+                    yield page_rows(page)
+            finally:
+                # Also reached when the consumer stops iterating early
+                for pending in futures:
+                    pending.cancel()
+        return
+
+    # Sequential fallback: follow the "next" links one page at a time.
+    for page_num in range(2, max_pages + 1):
+        try:
+            page = load_coupon_page(coupon_page_url(base_url, page_num), client=client, parser=parser, targeted=targeted)
+        except ThrottledError:
+            raise
         except Exception as e:
-            print(f"Error on page {page_num}: {e}", file=sys.stderr)
+            raise IncompleteScrapeError(f"Error on page {page_num}: {e}") from e
+
+        if page is None:
             break
-            
-    return all_coupons
+
+        yield page_rows(page)
+
+        if not page["has_next"]:
+             # If we can't find a next link, stop.
+             break
 
 if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
     target_url = "https://beauty.hotpepper.jp/slnH000122973/coupon/"
-    if len(sys.argv) > 1:
-        target_url = sys.argv[1]
-    
-    data = scrape_hpb_coupon(target_url)
-    print(json.dumps(data, ensure_ascii=False, indent=2))
+    if args:
+        target_url = args[0]
+
+    if '--ndjson' in sys.argv:
+        # One JSON object per line, written as soon as each page is parsed
+        for row in iter_coupons(target_url):
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+    else:
+        data = scrape_hpb_coupon(target_url)
+        print(json.dumps(data, ensure_ascii=False, indent=2))
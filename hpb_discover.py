@@ -0,0 +1,351 @@
+"""
+Discovery crawler: walks HPB area / station / search listing pages and
+collects the salon IDs they link to, so whole areas can be fed to the batch
+scraper instead of pasting salon URLs by hand.
+
+Seeds are listing URLs such as https://beauty.hotpepper.jp/svcSA/macAA/salon/
+(page 1); their pages PN2.html, PN3.html ... are walked until the paging
+block says there are no more. Salon IDs are taken from the links in the
+page's result cassettes (li.searchListCassette) only, not from rankings,
+"recently viewed" blocks or ads around them; only the cassettes are built
+into a tree (hpb_parser.region_filter).
+
+Salons already seen are skipped through a SalonIdSet, a bitmap with one bit
+per numeric salon ID (slnH000306271 -> bit 306271 of the "slnH" bitmap):
+a million IDs take 125 KB instead of a set of strings.
+
+Crawl state (bitmap, next page per listing, offset of the output file) is
+saved atomically next to the output every few seconds and at the end.
+Re-running the same command resumes: finished listings are skipped, the
+others continue from their next page, and salons written after the last
+save are cut off the output and found again. --shard i/n only crawls the
+seeds whose hash falls in shard i, so n processes can split a seed list;
+each shard has its own output and state (read_salons dedupes on merge).
+
+Usage:
+    python hpb_discover.py seeds.txt --out salons.txt [--shard 0/4] [--max-pages 500]
+                           [--workers 8] [--per-host 4] [--scrape-out out/]
+
+The output has one salon ID per line, the input format of hpb_batch_cli.py;
+--scrape-out runs the batch scraper on it once discovery is done.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zlib
+
+from hpb_batch import DEFAULT_MAX_WORKERS, DEFAULT_PER_HOST, iter_many
+from hpb_coupon_scraper import PAGE_OF_RE
+from hpb_http import decode_response, fetch
+from hpb_parser import make_soup, region_filter, resolve_backend, tag_classes
+
+# One search result of a listing page
+LISTING_CASSETTE_CLASS = "searchListCassette"
+# Salon link hrefs: /slnH000306271/ and its subpages
+SALON_LINK_RE = re.compile(r'/(sln[A-Z]\d+)(?:[/?#]|$)')
+_SALON_ID_PARTS_RE = re.compile(r'^(sln[A-Z])(\d+)$')
+# Listing page suffix, stripped from seeds to get page 1
+_LISTING_PAGE_RE = re.compile(r'PN\d+\.html$')
+# "次の20件" link of the paging block
+_NEXT_PAGE_RE = re.compile(r'class="[^"]*\bafterPage\b')
+
+DEFAULT_MAX_PAGES = 500
+# IDs numbered from here on are kept in a plain set, so one stray huge ID
+# cannot grow a bitmap past 16 MB
+BITMAP_LIMIT = 1 << 27
+SAVE_INTERVAL = 5.0  # seconds between state saves
+
+
+class SalonIdSet:
+    """
+    Set of salon IDs stored as bitmaps, one per ID prefix and digit count.
+
+    add() and `in` work on ID strings (slnH000306271). IDs not of the
+    sln<letter><digits> form are rejected with ValueError. IDs numbered
+    BITMAP_LIMIT or more are stored as strings in a plain set.
+    """
+
+    def __init__(self):
+        self._bits = {}  # "slnH:9" -> bytearray
+        self._large = set()  # IDs beyond BITMAP_LIMIT
+        self._count = 0
+
+    @staticmethod
+    def _locate(salon_id):
+        match = _SALON_ID_PARTS_RE.match(salon_id)
+        if not match:
+            raise ValueError(f"Not a salon ID: {salon_id!r}")
+        prefix, digits = match.groups()
+        return f"{prefix}:{len(digits)}", int(digits)
+
+    def add(self, salon_id):
+        """Adds salon_id. Returns True if it was not in the set yet."""
+        key, number = self._locate(salon_id)
+        if number >= BITMAP_LIMIT:
+            if salon_id in self._large:
+                return False
+            self._large.add(salon_id)
+            self._count += 1
+            return True
+        bits = self._bits.get(key)
+        if bits is None:
+            bits = self._bits[key] = bytearray()
+        byte, mask = number >> 3, 1 << (number & 7)
+        if byte >= len(bits):
+            # Grow in 4 KB steps
+            bits.extend(bytes((byte // 4096 + 1) * 4096 - len(bits)))
+        if bits[byte] & mask:
+            return False
+        bits[byte] |= mask
+        self._count += 1
+        return True
+
+    def __contains__(self, salon_id):
+        try:
+            key, number = self._locate(salon_id)
+        except ValueError:
+            return False
+        if number >= BITMAP_LIMIT:
+            return salon_id in self._large
+        bits = self._bits.get(key)
+        byte = number >> 3
+        return bits is not None and byte < len(bits) and bool(bits[byte] & (1 << (number & 7)))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for key, bits in self._bits.items():
+            prefix, width = key.split(":")
+            for byte, value in enumerate(bits):
+                if value:
+                    for bit in range(8):
+                        if value & (1 << bit):
+                            yield f"{prefix}{byte * 8 + bit:0{int(width)}d}"
+        yield from self._large
+
+    def nbytes(self):
+        return sum(len(bits) for bits in self._bits.values())
+
+    def to_json(self):
+        """JSON-compatible form: zlib-compressed, base64-encoded bitmaps, and the large IDs."""
+        return {"count": self._count,
+                "bitmaps": {key: base64.b64encode(zlib.compress(bytes(bits))).decode("ascii")
+                            for key, bits in self._bits.items()},
+                "large": sorted(self._large)}
+
+    @classmethod
+    def from_json(cls, data):
+        ids = cls()
+        ids._count = data["count"]
+        ids._bits = {key: bytearray(zlib.decompress(base64.b64decode(value)))
+                     for key, value in data["bitmaps"].items()}
+        ids._large = set(data.get("large", ()))
+        return ids
+
+
+def listing_url(seed):
+    """Page 1 URL of a listing seed: trailing PNn.html removed, ending with '/'."""
+    url = _LISTING_PAGE_RE.sub("", seed.strip())
+    return url if url.endswith("/") else url + "/"
+
+
+def listing_page_url(base_url, page_num):
+    if page_num == 1:
+        return base_url
+    return f"{base_url}PN{page_num}.html"
+
+
+def is_listing_region(name, attrs):
+    return name == "li" and LISTING_CASSETTE_CLASS in tag_classes(attrs)
+
+
+def parse_listing(html, page_num, parser=None):
+    """
+    Salon IDs and paging info of one listing page.
+
+    Returns:
+        tuple: (salon_ids, has_next, page_count). salon_ids are the salons
+            linked from the result cassettes, in page order without repeats;
+            page_count is None when the page does not show "n/Nページ".
+    """
+    soup = make_soup(html, parser, parse_only=region_filter(is_listing_region))
+    salon_ids = []
+    # html5lib ignores parse_only, so the cassettes are looked up in either tree
+    for cassette in soup.find_all("li", class_=LISTING_CASSETTE_CLASS):
+        for link in cassette.find_all("a", href=True):
+            match = SALON_LINK_RE.search(link["href"])
+            if match:
+                salon_ids.append(match.group(1))
+    salon_ids = list(dict.fromkeys(salon_ids))
+    match = PAGE_OF_RE.search(html)
+    page_count = int(match.group(2)) if match else None
+    if page_count is not None:
+        has_next = page_num < page_count
+    else:
+        has_next = bool(_NEXT_PAGE_RE.search(html)) or f"PN{page_num + 1}.html" in html
+    return salon_ids, has_next, page_count
+
+
+def shard_of(seed, shards):
+    # Stable across processes and runs, unlike hash()
+    return int(hashlib.sha1(listing_url(seed).encode("utf-8")).hexdigest(), 16) % shards
+
+
+class DiscoveryState:
+    """
+    Resumable crawl state, saved as JSON at path.
+
+    Attributes:
+        seen (SalonIdSet): Salons already written to the output.
+        listings (dict): listing URL -> {"next_page", "page_count", "done"}.
+        out_offset (int): Size of the output file when the state was saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.seen = SalonIdSet()
+        self.listings = {}
+        self.out_offset = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.seen = SalonIdSet.from_json(data["seen"])
+            self.listings = data["listings"]
+            self.out_offset = data["out_offset"]
+
+    def listing(self, url):
+        return self.listings.setdefault(url, {"next_page": 1, "page_count": None, "done": False})
+
+    def save(self, out_offset):
+        self.out_offset = out_offset
+        data = json.dumps({"seen": self.seen.to_json(), "listings": self.listings, "out_offset": out_offset,
+                           "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, ensure_ascii=False)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def state_path(out_path):
+    return f"{out_path}.state.json"
+
+
+def discover(seeds, out_path, max_pages=DEFAULT_MAX_PAGES, max_workers=DEFAULT_MAX_WORKERS,
+             per_host=DEFAULT_PER_HOST, client=None, parser=None):
+    """
+    Crawls the listing seeds and appends new salon IDs to out_path, resumably.
+
+    Listings are walked concurrently (iter_many), pages of one listing in
+    order. A listing stops at its last page, at max_pages, or at a page that
+    fails to load (it is retried by the next run). parser is the hpb_parser
+    backend of parse_listing; a bad one raises ValueError before any fetch.
+
+    Returns:
+        dict: Counts: listings crawled, pages read, new salons, salons seen in total.
+    """
+    parser = resolve_backend(parser)
+    state = DiscoveryState(state_path(out_path))
+    # Anything written after the last save is not in the saved bitmap
+    with open(out_path, "a+b") as f:
+        f.truncate(state.out_offset)
+
+    urls = list(dict.fromkeys(listing_url(seed) for seed in seeds))
+    todo = [url for url in urls if not state.listing(url)["done"]]
+    start_pages = {url: state.listing(url)["next_page"] for url in todo}
+    print(f"{len(urls)} listings, {len(urls) - len(todo)} already done, {len(state.seen)} salons known",
+          file=sys.stderr)
+
+    def iter_listing(url):
+        page_num = start_pages[url]
+        while page_num <= max_pages:
+            response = fetch(listing_page_url(url, page_num), client=client)
+            if response.status_code != 200:
+                print(f"Listing page {page_num} of {url}: status {response.status_code}", file=sys.stderr)
+                return
+            salon_ids, has_next, page_count = parse_listing(decode_response(response), page_num, parser)
+            yield page_num, salon_ids, has_next, page_count
+            if not has_next:
+                return
+            page_num += 1
+
+    stats = {"listings": len(todo), "pages": 0, "new": 0, "seen": 0}
+    last_save = time.monotonic()
+    with open(out_path, "a", encoding="utf-8") as out:
+        def save():
+            out.flush()
+            os.fsync(out.fileno())
+            state.save(out.tell())
+
+        try:
+            # Each page travels through iter_many as a one-item batch
+            for i, url, batch, finished in iter_many(todo, lambda url: ([page] for page in iter_listing(url)),
+                                                      max_workers, per_host):
+                if finished:
+                    continue
+                page_num, salon_ids, has_next, page_count = batch[0]
+                new = [sid for sid in salon_ids if state.seen.add(sid)]
+                out.writelines(f"{sid}\n" for sid in new)
+
+                listing = state.listing(url)
+                listing["next_page"] = page_num + 1
+                listing["page_count"] = page_count or listing["page_count"]
+                listing["done"] = not has_next or page_num >= max_pages
+                stats["pages"] += 1
+                stats["new"] += len(new)
+                print(f"{url} page {page_num}/{page_count or '?'}: {len(salon_ids)} salons, {len(new)} new "
+                      f"({len(state.seen)} total)", file=sys.stderr)
+
+                if time.monotonic() - last_save > SAVE_INTERVAL:
+                    save()
+                    last_save = time.monotonic()
+        finally:
+            save()
+    stats["seen"] = len(state.seen)
+    return stats
+
+
+def read_seeds(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("seeds", help="file with one listing URL per line")
+    arg_parser.add_argument("--out", required=True, help="salon ID output file (state is kept next to it)")
+    arg_parser.add_argument("--shard", default="0/1", help="i/n: crawl only shard i of n of the seeds")
+    arg_parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="pages read per listing")
+    arg_parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="listings crawled concurrently")
+    arg_parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="concurrent listings per host")
+    arg_parser.add_argument("--scrape-out", help="then scrape the discovered salons into this directory "
+                                                 "(see hpb_batch_cli.py)")
+    args = arg_parser.parse_args()
+
+    try:
+        shard, shards = (int(n) for n in args.shard.split("/"))
+        if not 0 <= shard < shards:
+            raise ValueError
+    except ValueError:
+        arg_parser.error("--shard must be i/n with 0 <= i < n")
+
+    seeds = [seed for seed in read_seeds(args.seeds) if shard_of(seed, shards) == shard]
+    stats = discover(seeds, args.out, args.max_pages, args.workers, args.per_host)
+    print(f"Done: {stats['pages']} pages of {stats['listings']} listings, {stats['new']} new salons "
+          f"({stats['seen']} total)", file=sys.stderr)
+
+    if args.scrape_out:
+        from hpb_batch_cli import read_salons, run
+        run(read_salons(args.out), args.scrape_out, max_workers=args.workers, per_host=args.per_host)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
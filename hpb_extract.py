@@ -0,0 +1,94 @@
+from bs4 import Tag
+
+
+class Field:
+    """
+    One field of a record spec.
+
+    The field is taken from the first element inside the record (in document
+    order) that carries class_ and, if given, is a tag_ element.
+
+    Args:
+        name (str): Key of the field in the extracted dict.
+        class_ (str): CSS class to match.
+        tag (str): Optional tag name the element must have.
+        prefix (bool): Match any class containing class_ (like re.compile(class_ + '.*')).
+        value (callable): value(element) -> field value. Defaults to the element itself.
+        default: Value used when no element matches.
+        required (bool): Records missing this field are skipped (extract returns None).
+    """
+
+    def __init__(self, name, class_, tag=None, prefix=False, value=None, default="", required=False):
+        self.name = name
+        self.class_ = class_
+        self.tag = tag
+        self.prefix = prefix
+        self.value = value
+        self.default = default
+        self.required = required
+
+
+class RecordSpec:
+    """
+    A set of Fields compiled into class lookup tables.
+
+    match() walks the record subtree once, checking each element's classes
+    against the tables, and stops as soon as every field has been found.
+    This replaces one find() per field, each of which re-walks the subtree.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._exact = {}
+        self._prefix = []
+        for i, field in enumerate(self.fields):
+            if field.prefix:
+                self._prefix.append((i, field.class_, field.tag))
+            else:
+                self._exact.setdefault(field.class_, []).append((i, field.tag))
+
+    def match(self, record):
+        """Returns a list with the first matching element per field (None if missing)."""
+        found = [None] * len(self.fields)
+        remaining = len(self.fields)
+        exact = self._exact
+        prefix = self._prefix
+
+        for el in record.descendants:
+            if not isinstance(el, Tag):
+                continue
+            classes = el.get('class')
+            if not classes:
+                continue
+
+            for c in classes:
+                for i, tag in exact.get(c, ()):
+                    if found[i] is None and (tag is None or tag == el.name):
+                        found[i] = el
+                        remaining -= 1
+                for i, substring, tag in prefix:
+                    if found[i] is None and substring in c and (tag is None or tag == el.name):
+                        found[i] = el
+                        remaining -= 1
+
+            if not remaining:
+                break
+
+        return found
+
+    def extract(self, record):
+        """
+        Extracts all fields of one record.
+
+        Returns:
+            dict or None: Field values keyed by name, or None if a required field is missing.
+        """
+        values = {}
+        for field, el in zip(self.fields, self.match(record)):
+            if el is None:
+                if field.required:
+                    return None
+                values[field.name] = field.default
+            else:
+                values[field.name] = field.value(el) if field.value else el
+        return values
@@ -0,0 +1,236 @@
+import codecs
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from hpb_cache import cache_from_env
+from hpb_metrics import get_metrics
+from hpb_ratelimit import limiter_from_env
+
+# Site the scripts build salon URLs on. HPB_SITE points them at another
+# host, e.g. a local hpb_mock server.
+HPB_SITE = os.environ.get("HPB_SITE", "https://beauty.hotpepper.jp").rstrip("/")
+
+# Headers sent with every request. Set once on the session instead of being
+# rebuilt for each page.
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
+    "Referer": "https://beauty.hotpepper.jp/",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (10, 30)
+
+# Connection pool sizing. HPB is a single host, so pool_maxsize is what limits
+# how many keep-alive connections parallel scrapes can reuse.
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+
+
+# How much of the body is searched for <meta charset>. HPB declares it in the
+# first few hundred bytes of <head>.
+SNIFF_BYTES = 4096
+
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([A-Za-z0-9._:\-]+)', re.I)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([A-Za-z0-9._:\-]+)', re.I)
+
+# Declared charsets decoded with a more lenient superset, as browsers do.
+_ENCODING_ALIASES = {
+    "shift_jis": "cp932",
+    "shift-jis": "cp932",
+    "sjis": "cp932",
+    "x-sjis": "cp932",
+    "windows-31j": "cp932",
+}
+
+
+def _accept_encoding():
+    # urllib3 only decodes brotli when a brotli package is installed,
+    # so only advertise "br" in that case.
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+        except ImportError:
+            return "gzip, deflate"
+    return "gzip, deflate, br"
+
+
+class HpbClient:
+    """
+    Pooled HTTP client shared by the scrapers and the debug scripts.
+
+    Keeps one requests.Session with keep-alive connection pooling, so a
+    multi-page crawl reuses the same TCP+TLS connection instead of paying a
+    handshake per page.
+
+    Args:
+        headers (dict): Extra headers merged over DEFAULT_HEADERS.
+        timeout (float or tuple): Default timeout for each request.
+        pool_connections (int): Number of per-host pools to cache.
+        pool_maxsize (int): Maximum connections kept alive per host.
+        cache (HttpCache): Optional on-disk response cache (see hpb_cache).
+        rate_limiter (AdaptiveRateLimiter): Optional per-host rate limit with
+            retries of throttled responses (see hpb_ratelimit). Cache hits
+            do not count against it.
+    """
+
+    def __init__(self, headers=None, timeout=DEFAULT_TIMEOUT,
+                 pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, cache=None,
+                 rate_limiter=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        self.session.headers["Accept-Encoding"] = _accept_encoding()
+        if headers:
+            self.session.headers.update(headers)
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _send(self, url, **kwargs):
+        # Everything that actually goes over the network passes here
+        start = time.perf_counter()
+        if self.rate_limiter is None:
+            response = self.session.get(url, **kwargs)
+        else:
+            response = self.rate_limiter.send(self.session.get, urlsplit(url).netloc, url, **kwargs)
+
+        metrics = get_metrics()
+        metrics.stage("fetch", time.perf_counter() - start)
+        metrics.inc("hpb_requests_total", status=response.status_code)
+        # Bytes on the wire when the server says so (compressed), else the body size
+        metrics.inc("hpb_response_bytes_total", int(response.headers.get("Content-Length") or len(response.content)))
+        if getattr(response, "retries", 0):
+            metrics.inc("hpb_retries_total", response.retries)
+        return response
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        if self.cache is not None:
+            response = self.cache.fetch(self._send, url, **kwargs)
+        else:
+            response = self._send(url, **kwargs)
+        source = "cache" if getattr(response, "from_cache", False) and not response.not_modified else "network"
+        get_metrics().observe("hpb_request_seconds", time.perf_counter() - start, source=source)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide shared client, creating it on first use.
+
+    The on-disk cache is enabled when HPB_CACHE_DIR is set (see hpb_cache.cache_from_env).
+    Requests are rate limited per host unless HPB_RATE=0 (see hpb_ratelimit.limiter_from_env).
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = HpbClient(cache=cache_from_env(), rate_limiter=limiter_from_env())
+    return _default_client
+
+
+def configure(**kwargs):
+    """
+    Replaces the shared client with one built from kwargs (see HpbClient).
+
+    Returns:
+        HpbClient: The new shared client.
+    """
+    global _default_client
+    with _default_lock:
+        old = _default_client
+        _default_client = HpbClient(**kwargs)
+    if old is not None:
+        old.close()
+    return _default_client
+
+
+def _usable_encoding(name):
+    if not name:
+        return None
+    name = _ENCODING_ALIASES.get(name.lower(), name)
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return None
+    return name
+
+
+def detect_encoding(response):
+    """
+    Picks the charset for a response without scanning the whole body.
+
+    Trusts an explicit charset in the Content-Type header, then a <meta charset>
+    (or http-equiv) in the first SNIFF_BYTES of the body, and only falls back to
+    statistical detection (response.apparent_encoding) when neither is usable.
+
+    Returns:
+        tuple: (encoding, source) where source is "header", "meta" or "detected".
+    """
+    match = _HEADER_CHARSET_RE.search(response.headers.get("Content-Type", ""))
+    encoding = _usable_encoding(match.group(1)) if match else None
+    if encoding:
+        return encoding, "header"
+
+    match = _META_CHARSET_RE.search(response.content[:SNIFF_BYTES])
+    encoding = _usable_encoding(match.group(1).decode("ascii", "ignore")) if match else None
+    if encoding:
+        return encoding, "meta"
+
+    return response.apparent_encoding or "utf-8", "detected"
+
+
+def decode_response(response):
+    """
+    Decodes the body of response to text using detect_encoding.
+
+    Sets response.encoding, and records the time spent (detection + decode) on
+    response.decode_seconds and the charset source on response.decode_source.
+    The timing also goes to the "decode" stage of hpb_metrics.
+
+    Returns:
+        str: The decoded body.
+    """
+    start = time.perf_counter()
+    encoding, source = detect_encoding(response)
+    response.encoding = encoding
+    text = response.text
+    elapsed = time.perf_counter() - start
+
+    response.decode_seconds = elapsed
+    response.decode_source = source
+    get_metrics().stage("decode", elapsed)
+    return text
+
+
+def site_url(path):
+    """URL of path (e.g. "/slnH000306271/coupon/") on HPB_SITE."""
+    return HPB_SITE + path
+
+
+def fetch(url, client=None, **kwargs):
+    """GETs url through client, or through the shared client if none is given."""
+    return (client or get_client()).get(url, **kwargs)
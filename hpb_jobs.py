@@ -0,0 +1,265 @@
+"""
+Background scrape jobs and a shared per-URL result cache for the Streamlit apps.
+
+A Streamlit script run should not block on a scrape: the apps submit a
+ScrapeJob to the process-wide JobManager (held with st.cache_resource, so
+every session sees the same one), remember its id in session state and poll
+its progress. The job scrapes, applies change tracking, and saves the run in
+the result store; the page then shows that run.
+
+Salon results are kept in a ResultCache for ttl seconds, shared by all
+sessions and jobs. A salon asked for by two users at the same time is
+scraped once: the second job waits for the first one's result.
+"""
+import itertools
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from hpb_batch import iter_many
+from hpb_cache import canonical_url
+from hpb_changes import COUPON_KEY, MENU_KEY, ChangeTracker, delta_rows, state_path
+from hpb_coupon_scraper import iter_coupons, normalize_coupon_url
+from hpb_menu_scraper import iter_menus
+from hpb_rows import RowTable
+from hpb_store import TABLES
+
+DEFAULT_RESULT_TTL = 10 * 60  # seconds a salon's rows are reused across sessions
+DEFAULT_KEEP_JOBS = 50  # finished jobs kept for polling
+
+
+def _scrape_menus(url, client=None):
+    return iter_menus(url, client=client, batches=True)
+
+
+def _scrape_coupons(url, client=None):
+    # Max pages 20 just to be safe, though usually fewer
+    return iter_coupons(url, client=client, max_pages=20, batches=True)
+
+
+# Per kind: batch iterator for one salon, and the change tracking key
+KINDS = {
+    "menu": (_scrape_menus, MENU_KEY),
+    "coupon": (_scrape_coupons, COUPON_KEY),
+}
+
+
+class ResultCache:
+    """
+    Thread-safe in-memory cache of salon rows, keyed by kind and salon URL.
+
+    Rows are held in RowTables (see hpb_rows), so cached salons cost a list
+    per column rather than a dict per row.
+
+    Args:
+        ttl (float): Seconds an entry is served.
+    """
+
+    def __init__(self, ttl=DEFAULT_RESULT_TTL):
+        self.ttl = ttl
+        self._entries = {}  # key -> (stored_at, rows)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, url):
+        return kind, canonical_url(normalize_coupon_url(url.strip()))
+
+    def get(self, key):
+        """Returns a copy of the fresh rows under key (a RowTable), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl:
+                del self._entries[key]
+                return None
+            rows = entry[1]
+        # Consumers add columns (change) and may edit values
+        return RowTable(rows.columns, rows)
+
+    def put(self, key, rows):
+        table = RowTable(TABLES[key[0]][1], rows)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), table)
+
+    def key_lock(self, key):
+        """Lock held while key is being scraped, so concurrent requests wait for one scrape."""
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def iter_fn(self, kind, scrape):
+        """
+        Wraps scrape(url) (a batch iterator) for iter_many, going through the cache.
+
+        Cached salons are yielded as a single batch. Salons that return no
+        rows are not cached, a failed scrape is retried on the next request.
+        """
+        def iter_salon(url):
+            key = self.key(kind, url)
+            with self.key_lock(key):
+                rows = self.get(key)
+                if rows is not None:
+                    if rows:
+                        yield rows
+                    return
+                collected = RowTable(TABLES[kind][1])
+                for batch in scrape(url):
+                    collected.extend(batch)
+                    yield batch
+                if collected:
+                    self.put(key, collected)
+        return iter_salon
+
+
+class ScrapeJob:
+    """
+    One scrape running in a background thread. Attributes read by the UI:
+
+        status: "running", "done" or "failed"
+        done, total: salons scraped / submitted
+        failures: error message per salon URL that failed; their rows are
+            left out of the saved run
+        salon_rows: rows per salon so far (a RowTable per input URL)
+        run_id: store run id once saved
+        found: rows in the saved run (changes only when tracking)
+        error: message when failed
+        version: incremented on every update, for cheap polling
+    """
+
+    def __init__(self, job_id, kind, urls, changes_only):
+        self.id = job_id
+        self.kind = kind
+        self.urls = urls
+        self.changes_only = changes_only
+        self.status = "running"
+        self.done = 0
+        self.total = len(urls)
+        self.failures = {}
+        self.current_url = None
+        self.salon_rows = [RowTable(TABLES[kind][1]) for _ in urls]
+        self.run_id = None
+        self.found = 0
+        self.error = None
+        self.version = 0
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.status == "running"
+
+    @property
+    def processed(self):
+        """Salons finished, scraped or failed."""
+        return self.done + len(self.failures)
+
+    def frame(self):
+        """DataFrame of the rows collected so far, in input order."""
+        with self.lock:
+            frames = [part.to_frame() for part in self.salon_rows if part]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+class JobManager:
+    """
+    Runs ScrapeJobs in background threads and keeps them for polling.
+
+    Args:
+        store (ResultStore): Where finished runs are saved.
+        result_cache (ResultCache): Salon results shared by all jobs.
+        keep_jobs (int): Finished jobs kept before the oldest are dropped.
+    """
+
+    def __init__(self, store, result_cache=None, keep_jobs=DEFAULT_KEEP_JOBS):
+        self.store = store
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.keep_jobs = keep_jobs
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Runs against the same change tracking state must not overlap
+        self._tracker_locks = {kind: threading.Lock() for kind in KINDS}
+
+    def submit(self, kind, urls, changes_only=False):
+        job = ScrapeJob(next(self._ids), kind, list(urls), changes_only)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if not j.running]
+            for old in finished[:max(0, len(finished) - self.keep_jobs)]:
+                del self._jobs[old.id]
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        scrape, key_fields = KINDS[job.kind]
+        try:
+            if job.changes_only:
+                with self._tracker_locks[job.kind]:
+                    tracker = ChangeTracker(state_path(job.kind), key_fields)
+                    self._scrape(job, scrape, tracker)
+                    tracker.save()
+            else:
+                self._scrape(job, scrape, None)
+
+            if job.failures and not job.done:
+                raise RuntimeError(f"all {job.total} salons failed")
+
+            # One bulk insert for the whole run, without the failed salons
+            salon_rows = [(url, rows) for url, rows in zip(job.urls, job.salon_rows) if url not in job.failures]
+            run_id = self.store.save_run(job.kind, salon_rows, started_at=job.started_at,
+                                         changes_only=job.changes_only)
+            with job.lock:
+                job.run_id = run_id
+                job.found = sum(len(part) for part in job.salon_rows)
+                job.status = "done"
+        except Exception as e:
+            print(f"Scrape job {job.id} failed: {e}", file=sys.stderr)
+            with job.lock:
+                job.error = str(e)
+                job.status = "failed"
+        finally:
+            with job.lock:
+                job.finished_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+                job.version += 1
+
+    def _scrape(self, job, scrape, tracker):
+        if tracker:
+            # Unchanged pages skip parsing; the result cache still serves repeat requests
+            client = tracker.client()
+            iter_fn = self.result_cache.iter_fn(job.kind, lambda url: scrape(url, client=client))
+        else:
+            iter_fn = self.result_cache.iter_fn(job.kind, scrape)
+
+        # Salons are scraped concurrently; each one's rows arrive as soon as it is parsed.
+        for i, url, rows, finished in iter_many(job.urls, iter_fn):
+            with job.lock:
+                job.salon_rows[i].extend(rows)
+                if finished is True:
+                    if tracker:
+                        # Keep only what changed since the previous run of this salon
+                        delta = tracker.diff(url, job.salon_rows[i])
+                        job.salon_rows[i] = RowTable(TABLES[job.kind][1], delta_rows(delta))
+                    job.done += 1
+                    job.current_url = url
+                elif finished:
+                    # finished is the error: the rows so far are incomplete, and the
+                    # tracker keeps comparing this salon with its last good run
+                    job.salon_rows[i] = RowTable(TABLES[job.kind][1])
+                    job.failures[url] = str(finished)
+                    job.current_url = url
+                job.version += 1
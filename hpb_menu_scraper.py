@@ -1,5 +1,11 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import NavigableString, Tag
+
+from hpb_extract import Field, RecordSpec
+from hpb_http import decode_response, fetch, get_client
+from hpb_metrics import get_metrics
+from hpb_parser import make_soup, region_filter, resolve_backend, tag_classes
+from hpb_ratelimit import THROTTLE_STATUSES, ThrottledError
+from hpb_rows import intern_value
 import re
 import json
 import sys
@@ -8,14 +14,82 @@ import sys
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Name of the parsed page result stored in the HTTP cache. Bump the version
+# whenever parse_menu_page changes its output.
+DERIVED_KEY = "menu_page/v2"
+
+# Attribute mark_menu_region gives the element holding #menuList
+MENU_REGION_ATTR = 'data-hpb-menu-region'
+
+# Start tag of #menuList, and any <div> / </div> tag
+MENU_LIST_TAG_RE = re.compile(r'<\w+[^>]*?\sid=["\']?menuList["\'\s/>]')
+DIV_TAG_RE = re.compile(r'<(/?)div\b', re.IGNORECASE)
+
+def mark_menu_region(markup):
+    """
+    Marks the <div> holding #menuList so that targeted parsing keeps it whole.
+
+    Call it on the markup before parsing it with is_menu_region. The
+    container then keeps its real structure, so #menuList's siblings are the
+    same as in a full parse, and menu blocks elsewhere on the page (e.g.
+    recommendations) are not among them. Found with a backward scan over
+    <div> tags; markup is returned unchanged when there is no such <div>.
+    """
+    menu_list = MENU_LIST_TAG_RE.search(markup)
+    if menu_list is None:
+        return markup
+
+    depth = 0
+    for tag in reversed(list(DIV_TAG_RE.finditer(markup, 0, menu_list.start()))):
+        if tag.group(1):
+            depth += 1
+        elif depth:
+            depth -= 1
+        else:
+            at = tag.end()
+            return f'{markup[:at]} {MENU_REGION_ATTR}=""{markup[at:]}'
+    return markup
+
+def is_menu_region(name, attrs):
+    # Targeted parsing keeps only what parse_menu_page reads: the container of
+    # #menuList (see mark_menu_region), and the title / JSON-LD used for the
+    # salon name. Without the mark, the #menuList heading, category headers and
+    # menu tables are kept instead and end up as siblings in document order.
+    if name == 'title' or MENU_REGION_ATTR in attrs or attrs.get('id') == 'menuList':
+        return True
+    if name == 'script':
+        return attrs.get('type') == 'application/ld+json'
+    classes = tag_classes(attrs)
+    return 'singleMenuHead' in classes or (name == 'table' and 'menuTbl' in classes)
+
+# Braces and their content: [], 【】, mixed pairs allowed
+# Matches starting with [ or 【, ending with ] or 】, non-greedy
+BRACKETS_RE = re.compile(r'[\[【].*?[\]】]', re.DOTALL)
+
 def clean_text(text):
     if not text:
         return ""
-    # Remove braces and their content: [], 【】, mixed pairs allowed
-    # Matches starting with [ or 【, ending with ] or 】, non-greedy
-    cleaned = re.sub(r'[\[【].*?[\]】]', '', text, flags=re.DOTALL)
+    # Most fields have no brackets at all: skip the regex for them
+    if '[' in text or '【' in text:
+        text = BRACKETS_RE.sub('', text)
     # Remove extra whitespace
-    return " ".join(cleaned.split())
+    return " ".join(text.split())
+
+def _field_text(tag):
+    # Usually a single text node: read it without get_text's generator walk
+    contents = tag.contents
+    if len(contents) == 1 and type(contents[0]) is NavigableString:
+        return clean_text(contents[0].strip())
+    # Sometimes tags have children, we just want text
+    return clean_text(tag.get_text(strip=True))
+
+# Fields of a menu row; iter_menu_rows collects them for every <tr> of a menuTbl.
+MENU_SPEC = RecordSpec([
+    Field('cell', 'bgWhite', tag='td', required=True),
+    Field('name', 'couponMenuName', tag='p', value=_field_text),
+    Field('price', 'taR', tag='p', value=_field_text), # price is usually here
+    Field('description', 'wbba', tag='p', value=_field_text), # description usually here
+])
 
 def extract_salon_name(soup):
     try:
@@ -45,7 +119,131 @@ def extract_salon_name(soup):
         pass
     return "Unknown Salon"
 
-def scrape_hpb_menu(url):
+def parse_menu_page(soup):
+    """
+    Extracts the menu rows listed after #menuList on a parsed coupon page.
+
+    Returns:
+        list or None: Menu dicts, or None if the page has no #menuList.
+    """
+    # Extract Salon Name (interned, it is repeated on every row; see hpb_rows)
+    salon_name = intern_value(extract_salon_name(soup))
+    
+    menu_list_title = soup.find(id='menuList')
+
+    if not menu_list_title:
+        print("Error: Could not find #menuList element.", file=sys.stderr)
+        return None
+
+    menu_data = []
+    for category, name, price, description in iter_menu_rows(menu_list_title):
+        menu_data.append({
+            "salon_name": salon_name,
+            "category": category,
+            "name": name,
+            "price": price,
+            "description": description
+        })
+
+    return menu_data
+
+# Slot of each MENU_SPEC field in a row being collected, by class: (slot, tag)
+_MENU_SLOTS = {field.class_: (i, field.tag) for i, field in enumerate(MENU_SPEC.fields)}
+_CELL, _NAME, _PRICE, _DESCRIPTION = range(len(MENU_SPEC.fields))
+
+def iter_menu_rows(menu_list_title):
+    """
+    Yields (category, name, price, description) for each menu row after #menuList.
+
+    Walks the siblings of #menuList once in document order. A singleMenuHead
+    sibling sets the category of the rows after it; a div (or, after targeted
+    parsing, a table.menuTbl) sibling is streamed through once, collecting the
+    MENU_SPEC fields of every row of its menuTbl tables (see _block_rows).
+    Rows without a name are skipped.
+    """
+    current_category = "セットメニュー"
+    for sibling in menu_list_title.next_siblings:
+        if not isinstance(sibling, Tag):
+            continue
+        classes = sibling.get('class') or ()
+
+        # Check for Category Header
+        if 'singleMenuHead' in classes:
+            # Usually in p.b.fl inside the div
+            cat_p = sibling.find('p', class_='b')
+            if cat_p:
+                current_category = intern_value(clean_text(cat_p.get_text(strip=True)))
+
+        # Check for Menu Item Table Container
+        # The structure observed: div > table.menuTbl
+        # (after targeted parsing the tables themselves are the siblings)
+        elif sibling.name == 'div' or (sibling.name == 'table' and 'menuTbl' in classes):
+            for found in _block_rows(sibling):
+                if found[_CELL] is None or found[_NAME] is None:
+                    continue
+                name = _field_text(found[_NAME])
+                if not name:
+                    continue
+                price = _field_text(found[_PRICE]) if found[_PRICE] is not None else ""
+                description = _field_text(found[_DESCRIPTION]) if found[_DESCRIPTION] is not None else ""
+                yield current_category, name, price, description
+
+def _block_rows(block):
+    """
+    Field elements of each <tr> of the menuTbl tables in block, in one pass.
+
+    Returns:
+        list: Per row, in document order, the first element of each
+            MENU_SPEC field found inside the row (None if missing). An
+            element of a row nested in another counts for the inner row only.
+    """
+    rows = []
+    open_rows = {}  # id(tr) -> its fields, for rows of a menuTbl
+    for el in block.descendants:
+        name = el.name
+        if name is None:
+            # Text
+            continue
+
+        if name == 'tr':
+            # Only rows of a menuTbl table (the block itself, or inside it)
+            for parent in el.parents:
+                if parent.name == 'table' and 'menuTbl' in (parent.get('class') or ()):
+                    found = [None] * len(_MENU_SLOTS)
+                    open_rows[id(el)] = found
+                    rows.append(found)
+                    break
+                if parent is block:
+                    break
+            continue
+
+        classes = el.attrs.get('class')
+        if not classes or not open_rows:
+            continue
+        for c in classes:
+            slot = _MENU_SLOTS.get(c)
+            if slot is None or slot[1] != name:
+                continue
+            # First match wins, in the nearest menu row the element is inside of
+            for parent in el.parents:
+                if parent.name == 'tr':
+                    found = open_rows.get(id(parent))
+                    if found is not None:
+                        if found[slot[0]] is None:
+                            found[slot[0]] = el
+                        break
+                if parent is block:
+                    break
+    return rows
+
+def scrape_hpb_menu(url, client=None, parser=None, targeted=True):
+    with get_metrics().timer("scrape_menu"):
+        return _scrape_hpb_menu(url, client, parser, targeted)
+
+def _scrape_hpb_menu(url, client=None, parser=None, targeted=True):
+    # A bad parser backend is a configuration error, not a failed page: raised before fetching
+    parser = resolve_backend(parser)
+
     # URL Validation and Modification
     if not url.endswith('/coupon/'):
         if url.endswith('/'):
@@ -54,98 +252,93 @@ def scrape_hpb_menu(url):
             url += '/coupon/'
     
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
-            "Referer": "https://beauty.hotpepper.jp/",
-            "Upgrade-Insecure-Requests": "1"
-        }
-        response = requests.get(url, headers=headers)
-        response.encoding = response.apparent_encoding
-        if response.status_code != 200:
-            print(f"Error: Failed to fetch page. Status code: {response.status_code}", file=sys.stderr)
-            return []
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Extract Salon Name
-        salon_name = extract_salon_name(soup)
-        
-        menu_list_title = soup.find(id='menuList')
-
-        if not menu_list_title:
-            print("Error: Could not find #menuList element.", file=sys.stderr)
-            return []
-
-        menu_data = []
-        current_category = "セットメニュー"
-        
-        # Traverse siblings of #menuList
-        sibling = menu_list_title.find_next_sibling()
-        while sibling:
-            classes = sibling.get('class', [])
-            
-            # Check for Category Header
-            if 'singleMenuHead' in classes:
-                # Extract category name
-                # Usually in p.b.fl inside the div
-                cat_p = sibling.find('p', class_='b')
-                if cat_p:
-                    current_category = clean_text(cat_p.get_text(strip=True))
-            
-            # Check for Menu Item Table Container
-            # The structure observed: div > table.menuTbl
-            elif sibling.name == 'div':
-                tables = sibling.find_all('table', class_='menuTbl')
-                for table in tables:
-                    # Iterate items in the table
-                    for tr in table.find_all('tr'):
-                        td = tr.find('td', class_='bgWhite')
-                        if td:
-                            # Extract details
-                            name_tag = td.find('p', class_='couponMenuName')
-                            price_tag = td.find('p', class_='taR') # price is usually here
-                            desc_tag = td.find('p', class_='wbba') # description usually here
-
-                            # Name
-                            name = clean_text(name_tag.get_text(strip=True)) if name_tag else ""
-                            
-                            # Price
-                            price = ""
-                            if price_tag:
-                                # Sometimes price tag has children, we just want text
-                                price = clean_text(price_tag.get_text(strip=True))
-
-                            # Description
-                            description = clean_text(desc_tag.get_text(strip=True)) if desc_tag else ""
-
-                            if name: # Only add if name exists
-                                menu_data.append({
-                                    "salon_name": salon_name,
-                                    "category": current_category,
-                                    "name": name,
-                                    "price": price,
-                                    "description": description
-                                })
-            
-            sibling = sibling.find_next_sibling()
+        client = client or get_client()
 
-        return menu_data
+        # Browser-like headers and connection reuse come from the shared client
+        response = fetch(url, client=client)
+        return menus_from_response(response, client.cache, parser, targeted)
 
+    except ThrottledError:
+        raise
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         return []
 
+def menus_from_response(response, cache=None, parser=None, targeted=True):
+    """
+    The parse half of scrape_hpb_menu, for a response fetched elsewhere
+    (e.g. by hpb_async). cache is the HttpCache the response came through, if any.
+
+    Returns:
+        list: Menu dicts; empty when the page failed to load or has no #menuList.
+
+    Raises:
+        ThrottledError: The page was still refused after the rate limiter's
+            retries; unlike a missing page, the salon's menus are unknown.
+    """
+    if response.status_code in THROTTLE_STATUSES:
+        raise ThrottledError(response.url, response.status_code, getattr(response, 'retries', 0))
+    if response.status_code != 200:
+        print(f"Error: Failed to fetch page. Status code: {response.status_code}", file=sys.stderr)
+        return []
+
+    # Pages served unchanged by the HTTP cache reuse the stored result
+    metrics = get_metrics()
+    if cache is not None:
+        menu_data = cache.get_derived(response, DERIVED_KEY)
+        if menu_data is not None:
+            metrics.observe("hpb_page_rows", len(menu_data), kind="menu")
+            return menu_data
+
+    # targeted builds the tree only for the regions in is_menu_region
+    markup = decode_response(response)
+    parse_only = None
+    if targeted:
+        markup = mark_menu_region(markup)
+        parse_only = region_filter(is_menu_region)
+    soup = make_soup(markup, parser, parse_only=parse_only)
+    with metrics.timer("extract"):
+        menu_data = parse_menu_page(soup)
+    if menu_data is None:
+        return []
+    metrics.observe("hpb_page_rows", len(menu_data), kind="menu")
+
+    if cache is not None:
+        cache.put_derived(response, DERIVED_KEY, menu_data)
+    return menu_data
+
+def iter_menus(url, client=None, parser=None, targeted=True, batches=False):
+    """
+    Generator counterpart of scrape_hpb_menu, for symmetry with iter_coupons.
+
+    All menus are on page 1, so rows become available together once that page
+    is parsed; with batches=True they are yielded as a single list. A throttled
+    page raises ThrottledError (see menus_from_response).
+    """
+    rows = scrape_hpb_menu(url, client=client, parser=parser, targeted=targeted)
+    if batches:
+        if rows:
+            yield rows
+    else:
+        yield from rows
+
 if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+
     # Default URL if not provided (for testing/demo)
     target_url = "https://beauty.hotpepper.jp/slnH000306271/coupon/"
     
     # Allow command line argument
-    if len(sys.argv) > 1:
-        target_url = sys.argv[1]
+    if args:
+        target_url = args[0]
 
-    result = scrape_hpb_menu(target_url)
+    if '--ndjson' in sys.argv:
+        # One JSON object per line, written as rows become available
+        for row in iter_menus(target_url):
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+    else:
+        result = scrape_hpb_menu(target_url)
     
-    # Output JSON to stdout
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+        # Output JSON to stdout
+        print(json.dumps(result, ensure_ascii=False, indent=2))
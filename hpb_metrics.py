@@ -0,0 +1,165 @@
+"""
+Process-wide timings and counters for scrapes and exports.
+
+The scrapers record into the shared registry (get_metrics()):
+
+    hpb_stage_seconds{stage=...}    time per stage: fetch (network), decode,
+                                    parse (tree building), extract (rows),
+                                    scrape_coupon / scrape_menu (a whole
+                                    salon), wp_convert, excel_export,
+                                    csv_export, parquet_export, arrow_export
+    hpb_request_seconds{source=...} per request, network or cache
+    hpb_response_bytes_total        bytes of response bodies
+    hpb_requests_total{status=...}  responses per HTTP status
+    hpb_retries_total               retries of throttled requests
+    hpb_page_rows{kind=...}         rows extracted per page
+
+Timings are summaries (count, sum, max). snapshot() / to_json() and
+to_prometheus() export them; the Streamlit apps show them in a panel.
+Work done in other processes (hpb_pipeline parse workers) is not included.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Help text per metric, for the Prometheus export
+METRIC_HELP = {
+    "hpb_stage_seconds": "Seconds spent per scrape/export stage",
+    "hpb_request_seconds": "Seconds per HTTP request",
+    "hpb_response_bytes_total": "Bytes of response bodies",
+    "hpb_requests_total": "HTTP responses per status",
+    "hpb_retries_total": "Retries of throttled requests",
+    "hpb_page_rows": "Rows extracted per page",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_text(key):
+    if not key:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and summaries, keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}  # (name, labels) -> value
+            self._summaries = {}  # (name, labels) -> [count, sum, max]
+            self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = max(summary[2], value)
+
+    def stage(self, stage, seconds):
+        self.observe("hpb_stage_seconds", seconds, stage=stage)
+
+    @contextmanager
+    def timer(self, stage):
+        """Times the with block as one observation of hpb_stage_seconds{stage=stage}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {"started_at", "counters": [{name, labels, value}],
+                "summaries": [{name, labels, count, sum, max}]}.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted((k, list(v)) for k, v in self._summaries.items())
+            started_at = self.started_at
+        return {
+            "started_at": started_at,
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in counters],
+            "summaries": [{"name": name, "labels": dict(labels), "count": count, "sum": total, "max": peak}
+                          for (name, labels), (count, total, peak) in summaries],
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (summaries as _count/_sum plus a _max gauge)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted((k, list(v)) for k, v in self._summaries.items())
+
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_label_text(labels)} {value}")
+        for (name, labels), (count, total, peak) in summaries:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} summary")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total:.6f}")
+        for (name, labels), (count, total, peak) in summaries:
+            if f"{name}_max" not in declared:
+                declared.add(f"{name}_max")
+                lines.append(f"# TYPE {name}_max gauge")
+            lines.append(f"{name}_max{_label_text(labels)} {peak:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def stage_rows(self):
+        """One row per summary, for display: metric, labels, count, total, mean, max (mean/max of timings in ms)."""
+        rows = []
+        for s in self.snapshot()["summaries"]:
+            seconds = s["name"].endswith("_seconds")
+            scale = 1000 if seconds else 1
+            rows.append({
+                "metric": s["name"],
+                "labels": ", ".join(f"{k}={v}" for k, v in s["labels"].items()),
+                "count": s["count"],
+                "total": round(s["sum"], 3),
+                "mean": round(s["sum"] / s["count"] * scale, 2),
+                "max": round(s["max"] * scale, 2),
+            })
+        return rows
+
+    def counter_rows(self):
+        """One row per counter, for display: metric, labels, value."""
+        return [{"metric": c["name"], "labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                 "value": c["value"]} for c in self.snapshot()["counters"]]
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Returns the process-wide registry the scrapers record into."""
+    return _metrics
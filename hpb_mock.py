@@ -0,0 +1,394 @@
+"""
+Local stand-in for beauty.hotpepper.jp, with record/replay of salon pages.
+
+Load tests of concurrency, caching and rate limiting must not run against
+the live site. This module records salon coupon pages once and serves them
+back offline:
+
+    record   RecordingClient wraps a client and saves every salon coupon
+             page it fetches; record() does that for a list of salons.
+             Pages are stored as ROOT/<salon_id>/coupon/index.html (page 1)
+             and ROOT/<salon_id>/coupon/PN<n>.html, the layout of
+             benchmarks/corpus/, with a manifest.json of page / row counts.
+    replay   ReplayClient serves a ROOT in-process (no sockets), in place of
+             an HpbClient. MockHpbServer serves it over HTTP, like the site:
+             /<salon_id>/coupon/ and PN<n>.html, 404 past the last page.
+
+MockHpbServer can add latency (time to first byte, plus random jitter),
+answer a share of requests with 403 / 503 (with Retry-After if set), limit
+the bandwidth of each response, and gzip bodies. With alias=True any
+unknown salon ID is served one of the recorded salons (chosen by a hash of
+the ID), so a few recorded salons stand in for thousands of distinct URLs.
+
+Scripts and CLIs that build site URLs take the host from HPB_SITE (see
+hpb_http.site_url), so they can be pointed at a running mock.
+
+Usage:
+    python hpb_mock.py record slnH000306271 https://beauty.hotpepper.jp/slnH000122973/ --out recorded/
+    python hpb_mock.py serve recorded/ [--port 8765] [--latency 0.05] [--jitter 0.05]
+                       [--fail 503=0.05 --fail 403=0.01] [--retry-after 1] [--bandwidth 200000]
+                       [--gzip] [--alias]
+    HPB_SITE=http://127.0.0.1:8765 python verify_coupon_count.py
+"""
+import argparse
+import gzip
+import http.server
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit
+
+from hpb_cache import build_response
+
+# /<salon_id>/coupon/ or /<salon_id>/coupon/PN<n>.html
+_PAGE_PATH_RE = re.compile(r'^/(sln[A-Z]\d+)/coupon/(?:PN(\d+)\.html)?$')
+
+MANIFEST_NAME = "manifest.json"
+CHUNK_BYTES = 16 * 1024  # write size when the bandwidth is limited
+
+
+def page_file(root, url):
+    """
+    File of a salon coupon page URL under root.
+
+    Returns:
+        tuple or None: (salon_id, path), or None when url is not a coupon page.
+    """
+    match = _PAGE_PATH_RE.match(urlsplit(url).path)
+    if not match:
+        return None
+    salon_id, page_num = match.groups()
+    name = "index.html" if page_num in (None, "1") else f"PN{page_num}.html"
+    return salon_id, os.path.join(root, salon_id, "coupon", name)
+
+
+class ReplayClient:
+    """Stands in for hpb_http.HpbClient, serving recorded pages (404 for anything else)."""
+
+    cache = None
+
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, url, **kwargs):
+        located = page_file(self.root, url)
+        if located is None:
+            return build_response(url, 404)
+        try:
+            with open(located[1], "rb") as f:
+                return build_response(url, 200, {"Content-Type": "text/html"}, f.read())
+        except OSError:
+            return build_response(url, 404)
+
+
+class RecordingClient:
+    """
+    Wraps client and saves every 200 salon coupon page it returns under root.
+
+    Args:
+        client: HpbClient (or any client with get(url)) doing the fetching.
+        root (str): Recording directory.
+    """
+
+    def __init__(self, client, root):
+        self.client = client
+        self.root = root
+
+    @property
+    def cache(self):
+        # The scrapers reuse the wrapped client's HTTP cache
+        return getattr(self.client, "cache", None)
+
+    def get(self, url, **kwargs):
+        response = self.client.get(url, **kwargs)
+        located = page_file(self.root, url)
+        if response.status_code == 200 and located is not None:
+            path = located[1]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(response.content)
+            os.replace(tmp, path)
+        return response
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def record(salons, root, max_pages=20, client=None):
+    """
+    Records the coupon pages of salons under root and updates its manifest.
+
+    The pages are fetched by the coupon scraper through a RecordingClient,
+    then scraped again from the recording (ReplayClient) for the manifest
+    counts, which checks the replay gives the same rows.
+
+    Args:
+        salons (list): Salon IDs or URLs.
+
+    Returns:
+        dict: The manifest entries of the recorded salons.
+    """
+    from hpb_batch_cli import salon_url
+    from hpb_coupon_scraper import scrape_hpb_coupon
+    from hpb_http import get_client
+    from hpb_menu_scraper import scrape_hpb_menu
+    from hpb_store import salon_id
+
+    recorder = RecordingClient(client or get_client(), root)
+    replay = ReplayClient(root)
+    manifest = load_manifest(root)
+    recorded = {}
+    for entry in salons:
+        url = salon_url(entry)
+        live = scrape_hpb_coupon(url, max_pages=max_pages, client=recorder, page_workers=1)
+        replayed = scrape_hpb_coupon(url, max_pages=max_pages, client=replay, page_workers=1)
+        if replayed != live:
+            print(f"Warning: replay of {url} gives {len(replayed)} coupons, live gave {len(live)}", file=sys.stderr)
+
+        sid = salon_id(url)
+        page_dir = os.path.join(root, sid, "coupon")
+        pages = len([n for n in os.listdir(page_dir) if n.endswith(".html")]) if os.path.isdir(page_dir) else 0
+        recorded[sid] = {"pages": pages, "coupons": len(replayed),
+                         "menus": len(scrape_hpb_menu(url, client=replay))}
+        print(f"Recorded {sid}: {recorded[sid]}", file=sys.stderr)
+
+    manifest.update(recorded)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return recorded
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive, as pooled clients expect
+    protocol_version = "HTTP/1.1"
+    server_version = "HpbMock"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        mock = self.server.mock
+        status, body, headers = mock.respond(self.path, self.headers.get("Accept-Encoding", ""))
+        # Latency is time to first byte
+        delay = mock.delay()
+        if delay:
+            time.sleep(delay)
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        mock.count(status, len(body))
+
+        if not mock.bandwidth:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), CHUNK_BYTES):
+            chunk = body[start:start + CHUNK_BYTES]
+            # Each chunk arrives once its share of the bandwidth has passed
+            time.sleep(len(chunk) / mock.bandwidth)
+            self.wfile.write(chunk)
+            self.wfile.flush()
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once
+    request_queue_size = 256
+
+
+class MockHpbServer:
+    """
+    HTTP server serving a recording (see record) the way the site serves salon pages.
+
+    Args:
+        root (str): Recording directory.
+        host (str), port (int): Address to listen on; port 0 picks a free one.
+        latency (float): Seconds before each response.
+        jitter (float): Up to this many extra seconds, at random, per response.
+        fail_rates (dict): Status -> share of requests answered with it, e.g.
+            {503: 0.05, 403: 0.01}.
+        retry_after (float): Retry-After seconds sent with injected failures.
+        bandwidth (float): Bytes per second per response (None: unlimited).
+        gzip (bool): Gzip bodies for clients that accept it.
+        alias (bool): Serve unknown salon IDs one of the recorded salons.
+        seed (int): Seed of the latency / failure randomness.
+    """
+
+    def __init__(self, root, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, fail_rates=None, retry_after=None,
+                 bandwidth=None, gzip=False, alias=False, seed=None):
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rates = dict(fail_rates or {})
+        self.retry_after = retry_after
+        self.bandwidth = bandwidth
+        self.gzip = gzip
+        self.alias = alias
+        self.salons = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name, "coupon")))
+        self.stats = {"requests": 0, "bytes": 0, "statuses": {}}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._bodies = {}  # (path, gzip) -> bytes
+
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def salon_url(self, salon_id):
+        return f"{self.base_url}/{salon_id}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def delay(self):
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._rng.uniform(0, self.jitter)
+
+    def count(self, status, nbytes):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += nbytes
+            self.stats["statuses"][status] = self.stats["statuses"].get(status, 0) + 1
+
+    def _injected_failure(self):
+        if not self.fail_rates:
+            return None
+        with self._lock:
+            roll = self._rng.random()
+        for status, rate in self.fail_rates.items():
+            if roll < rate:
+                return status
+            roll -= rate
+        return None
+
+    def _salon_dir(self, salon_id):
+        if salon_id in self.salons or not self.alias or not self.salons:
+            return salon_id
+        # Same recorded salon for the same ID on every request
+        return self.salons[zlib.crc32(salon_id.encode("ascii")) % len(self.salons)]
+
+    def respond(self, path, accept_encoding=""):
+        """
+        Returns:
+            tuple: (status, body, headers) for a GET of path.
+        """
+        failure = self._injected_failure()
+        if failure is not None:
+            headers = {"Content-Type": "text/html"}
+            if self.retry_after is not None:
+                headers["Retry-After"] = str(int(self.retry_after))
+            return failure, b"", headers
+
+        match = _PAGE_PATH_RE.match(urlsplit(path).path)
+        if not match:
+            return 404, b"", {"Content-Type": "text/html"}
+        salon_id, page_num = match.groups()
+        name = "index.html" if page_num in (None, "1") else f"PN{page_num}.html"
+        file_path = os.path.join(self.root, self._salon_dir(salon_id), "coupon", name)
+
+        compress = self.gzip and "gzip" in accept_encoding
+        key = (file_path, compress)
+        body = self._bodies.get(key)
+        if body is None:
+            try:
+                with open(file_path, "rb") as f:
+                    body = f.read()
+            except OSError:
+                # Past the last page, or a salon that was not recorded
+                return 404, b"", {"Content-Type": "text/html"}
+            if compress:
+                body = gzip.compress(body, mtime=0)
+            self._bodies[key] = body
+
+        headers = {"Content-Type": "text/html"}
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+        return 200, body, headers
+
+
+def parse_fail_rate(value):
+    """argparse type of --fail: "503=0.05" -> (503, 0.05)."""
+    status, _, rate = value.partition("=")
+    try:
+        return int(status), float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected STATUS=RATE, got {value!r}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    record_cmd = commands.add_parser("record", help="record salon coupon pages from the site")
+    record_cmd.add_argument("salons", nargs="+", help="salon IDs or URLs")
+    record_cmd.add_argument("--out", required=True, help="recording directory")
+    record_cmd.add_argument("--max-pages", type=int, default=20, help="coupon pages recorded per salon")
+
+    serve_cmd = commands.add_parser("serve", help="serve a recording over HTTP")
+    serve_cmd.add_argument("root", help="recording directory (benchmarks/corpus works too)")
+    serve_cmd.add_argument("--host", default="127.0.0.1")
+    serve_cmd.add_argument("--port", type=int, default=8765)
+    serve_cmd.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    serve_cmd.add_argument("--jitter", type=float, default=0.0, help="random extra latency, up to this many seconds")
+    serve_cmd.add_argument("--fail", type=parse_fail_rate, action="append", default=[], metavar="STATUS=RATE",
+                           help="answer this share of requests with STATUS (e.g. 503=0.05); repeatable")
+    serve_cmd.add_argument("--retry-after", type=float, help="Retry-After seconds sent with injected failures")
+    serve_cmd.add_argument("--bandwidth", type=float, help="bytes per second per response")
+    serve_cmd.add_argument("--gzip", action="store_true", help="gzip bodies for clients that accept it")
+    serve_cmd.add_argument("--alias", action="store_true", help="serve unknown salon IDs a recorded salon")
+    serve_cmd.add_argument("--seed", type=int, help="seed of the latency / failure randomness")
+    args = arg_parser.parse_args()
+
+    if args.command == "record":
+        record(args.salons, args.out, args.max_pages)
+        return 0
+
+    server = MockHpbServer(args.root, args.host, args.port, args.latency, args.jitter, dict(args.fail),
+                           args.retry_after, args.bandwidth, args.gzip, args.alias, args.seed)
+    print(f"Serving {len(server.salons)} salons from {args.root} at {server.base_url} "
+          f"(set HPB_SITE={server.base_url} to point the scripts here)", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Served {server.stats}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
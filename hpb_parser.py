@@ -0,0 +1,104 @@
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from hpb_metrics import get_metrics
+
+# BeautifulSoup tree builders the scrapers are known to produce identical rows
+# with (see test_hpb_parser.py). lxml is a C parser and several times faster
+# than the pure-Python html.parser.
+PARSER_BACKENDS = ("lxml", "html.parser", "html5lib")
+
+# "auto" picks the first installed backend from PARSER_BACKENDS.
+DEFAULT_BACKEND = "auto"
+
+# Environment variable selecting the backend when none is passed explicitly.
+PARSER_ENV_VAR = "HPB_PARSER"
+
+_REQUIRED_MODULE = {"lxml": "lxml", "html.parser": None, "html5lib": "html5lib"}
+
+
+def backend_available(backend):
+    module = _REQUIRED_MODULE.get(backend)
+    if module is None:
+        return backend in _REQUIRED_MODULE
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def available_backends():
+    """Returns the installed backends, fastest first."""
+    return [b for b in PARSER_BACKENDS if backend_available(b)]
+
+
+def resolve_backend(backend=None):
+    """
+    Resolves the parser backend to use.
+
+    Args:
+        backend (str): "lxml", "html.parser", "html5lib" or "auto". When None, the
+            HPB_PARSER environment variable is used, then DEFAULT_BACKEND.
+
+    Returns:
+        str: A concrete, installed backend name.
+    """
+    backend = backend or os.environ.get(PARSER_ENV_VAR) or DEFAULT_BACKEND
+
+    if backend == "auto":
+        return available_backends()[0]
+
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend!r} (expected one of {PARSER_BACKENDS} or 'auto')")
+    if not backend_available(backend):
+        raise ValueError(f"Parser backend {backend!r} is not installed")
+    return backend
+
+
+def tag_classes(attrs):
+    """Returns the class list from a raw attribute dict seen at parse time."""
+    classes = attrs.get("class") or ()
+    if isinstance(classes, str):
+        return classes.split()
+    return classes
+
+
+def region_filter(match):
+    """
+    Builds a parse_only filter that keeps only some regions of a page.
+
+    match(name, attrs) is asked about every element that is not inside an
+    already kept element; kept elements are built with their whole subtree, and
+    nothing else (including loose text) is turned into tree objects. This cuts
+    parse time and peak memory on pages where the scraper only needs a few
+    blocks. html5lib ignores parse_only and always builds the full tree.
+    """
+    try:
+        from bs4.filter import ElementFilter
+    except ImportError:
+        # bs4 < 4.13: SoupStrainer calls a name function with (name, attrs)
+        from bs4 import SoupStrainer
+        return SoupStrainer(lambda name, attrs: match(name, attrs or {}))
+
+    class _RegionFilter(ElementFilter):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return match(name, attrs or {})
+
+        def allow_string_creation(self, string):
+            return False
+
+    return _RegionFilter()
+
+
+def make_soup(markup, backend=None, parse_only=None):
+    """Parses markup with the selected backend (see resolve_backend)."""
+    backend = resolve_backend(backend)
+    if backend == "html5lib":
+        parse_only = None
+    start = time.perf_counter()
+    soup = BeautifulSoup(markup, backend, parse_only=parse_only)
+    get_metrics().stage("parse", time.perf_counter() - start)
+    return soup
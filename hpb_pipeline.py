@@ -0,0 +1,322 @@
+"""
+Staged scrape pipeline: fetch threads -> bounded queue -> parse processes.
+
+Fetching is I/O-bound, while tree building and extraction are CPU-bound and
+hold the GIL. iter_pipeline() therefore runs them in separate stages:
+
+    fetch stage   fetch_workers threads GET pages through the shared client
+                  (pooling, rate limiting and the HTTP cache apply as usual)
+    html queue    at most queue_size raw pages waiting to be parsed
+    parse stage   parse_workers processes decode, parse and extract pages
+
+The queue and a cap on pages in flight in the process pool give
+backpressure: when parsing falls behind, fetchers block instead of piling up
+HTML in memory. Pages 2+ of a coupon list are scheduled from the parse
+result of page 1, exactly as iter_coupon_pages does.
+
+Each stage records its busy time; PipelineStats.report() gives per-stage
+utilization (busy time / (workers x wall time)) and how long fetchers were
+blocked on a full queue, to size both stages to the machine.
+"""
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from hpb_cache import build_response
+from hpb_coupon_scraper import DERIVED_KEY as COUPON_DERIVED_KEY
+from hpb_coupon_scraper import coupon_page_url, is_coupon_region, normalize_coupon_url, parse_coupon_page
+from hpb_http import decode_response, fetch, get_client
+from hpb_menu_scraper import DERIVED_KEY as MENU_DERIVED_KEY
+from hpb_menu_scraper import is_menu_region, mark_menu_region, parse_menu_page
+from hpb_parser import make_soup, region_filter, resolve_backend
+from hpb_ratelimit import THROTTLE_STATUSES, ThrottledError
+
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_PARSE_WORKERS = max(1, (multiprocessing.cpu_count() or 2) - 1)
+DEFAULT_QUEUE_SIZE = 16
+
+
+class PipelineStats:
+    """Per-stage counters of one iter_pipeline run."""
+
+    def __init__(self):
+        self.fetch = {"workers": 0, "items": 0, "busy_s": 0.0, "blocked_s": 0.0}
+        self.parse = {"workers": 0, "items": 0, "busy_s": 0.0}
+        self.max_queue = 0
+        self.wall_s = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, stage, **amounts):
+        with self._lock:
+            for key, value in amounts.items():
+                stage[key] += value
+
+    def utilization(self):
+        """{"fetch": share, "parse": share} of each stage's capacity that was busy."""
+        wall = self.wall_s or 1e-9
+        return {
+            "fetch": self.fetch["busy_s"] / (max(1, self.fetch["workers"]) * wall),
+            "parse": self.parse["busy_s"] / (max(1, self.parse["workers"]) * wall),
+        }
+
+    def as_dict(self):
+        return {"wall_s": self.wall_s, "fetch": dict(self.fetch), "parse": dict(self.parse),
+                "max_queue": self.max_queue, "utilization": self.utilization()}
+
+    def report(self):
+        use = self.utilization()
+        return (f"pipeline {self.wall_s:.2f}s | "
+                f"fetch: {self.fetch['items']} pages, {self.fetch['workers']} threads, {use['fetch']:.0%} busy, "
+                f"{self.fetch['blocked_s']:.2f}s blocked on full queue | "
+                f"parse: {self.parse['items']} pages, {self.parse['workers']} processes, {use['parse']:.0%} busy | "
+                f"queue peak {self.max_queue}")
+
+
+def parse_page(kind, url, content, content_type, parser=None, targeted=True):
+    """
+    Parse-stage work for one page, run in a worker process.
+
+    Returns:
+        tuple: (result, seconds). result is the parse_coupon_page dict for
+            "coupon", the parse_menu_page list (None without #menuList) for "menu".
+    """
+    start = time.perf_counter()
+    # Rebuilt in the parse process; only the body and its charset header travel
+    markup = decode_response(build_response(url, 200, {"Content-Type": content_type} if content_type else {}, content))
+    parse_only = None
+    if targeted:
+        if kind == "menu":
+            markup = mark_menu_region(markup)
+        parse_only = region_filter(is_coupon_region if kind == "coupon" else is_menu_region)
+    soup = make_soup(markup, parser, parse_only=parse_only)
+    result = parse_coupon_page(soup) if kind == "coupon" else parse_menu_page(soup)
+    return result, time.perf_counter() - start
+
+
+class _Salon:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.salon_name = None
+        self.pages = {}  # page_num -> rows, parsed but not yet yielded
+        self.next_page = 1  # next page to yield
+        self.outstanding = 0
+        self.last_page = None  # pages after this one are dropped (missing page, end of list)
+        self.error = None  # exception that cut the list short
+
+
+def iter_pipeline(urls, kind="coupon", max_pages=10, client=None, fetch_workers=DEFAULT_FETCH_WORKERS,
+                  parse_workers=DEFAULT_PARSE_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, parser=None, targeted=True,
+                  stats=None):
+    """
+    Scrapes coupons or menus of several salons through the staged pipeline.
+
+    Args:
+        urls (list): Salon URLs.
+        kind (str): "coupon" or "menu".
+        max_pages (int): Maximum coupon pages per salon.
+        client (HpbClient): Client for the fetch stage; the shared one by default.
+        fetch_workers (int): Fetch threads.
+        parse_workers (int): Parse processes.
+        queue_size (int): Raw pages allowed to wait between the stages.
+        parser, targeted: As for scrape_hpb_coupon.
+        stats (PipelineStats): Filled in during the run; the report is also
+            printed on stderr at the end.
+
+    Yields:
+        tuple: (index, url, rows, finished), the same events as
+            hpb_batch.iter_many with iter_coupons / iter_menus: one batch per
+            page in page order, then rows=[] with finished set to True, or to
+            the error (e.g. ThrottledError) that left the salon incomplete.
+    """
+    if kind not in ("coupon", "menu"):
+        raise ValueError(f"kind must be 'coupon' or 'menu', not {kind!r}")
+    # Checked here, not in the parse processes, so a bad backend fails the run instead of every salon
+    parser = resolve_backend(parser)
+    if not urls:
+        return
+
+    client = client or get_client()
+    stats = stats if stats is not None else PipelineStats()
+    stats.fetch["workers"] = fetch_workers
+    stats.parse["workers"] = parse_workers
+    derived_key = COUPON_DERIVED_KEY if kind == "coupon" else MENU_DERIVED_KEY
+
+    fetch_tasks = queue.Queue()
+    html_queue = queue.Queue(maxsize=queue_size)
+    results = queue.Queue()
+    stop = threading.Event()
+    # Pages handed to the process pool but not parsed yet
+    in_flight = threading.BoundedSemaphore(parse_workers * 2)
+
+    def fetch_worker():
+        while not stop.is_set():
+            task = fetch_tasks.get()
+            if task is None:
+                return
+            i, page_num, page_url = task
+            try:
+                item = fetch_page(i, page_num, page_url)
+            except Exception as e:
+                results.put((i, page_num, "error", e))
+                continue
+            if item is None:
+                continue
+
+            # Backpressure: wait here while the parse stage is behind
+            start = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    html_queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            stats.add(stats.fetch, blocked_s=time.perf_counter() - start)
+            stats.max_queue = max(stats.max_queue, html_queue.qsize())
+
+    def fetch_page(i, page_num, page_url):
+        # Returns the html_queue item, or None when the result is already posted
+        print(f"Fetching: {page_url}", file=sys.stderr)
+        start = time.perf_counter()
+        try:
+            response = fetch(page_url, client=client)
+        finally:
+            stats.add(stats.fetch, busy_s=time.perf_counter() - start, items=1)
+
+        if response.status_code != 200:
+            results.put((i, page_num, "status", response.status_code))
+            return None
+        # Unchanged pages already parsed once skip the parse stage
+        if client.cache is not None:
+            cached = client.cache.get_derived(response, derived_key)
+            if cached is not None:
+                results.put((i, page_num, "parsed", cached))
+                return None
+        return (i, page_num, response)
+
+    def dispatcher(pool):
+        while True:
+            item = html_queue.get()
+            if item is None:
+                return
+            i, page_num, response = item
+            in_flight.acquire()
+            if stop.is_set():
+                return
+            try:
+                future = pool.submit(parse_page, kind, response.url, response.content,
+                                     response.headers.get("Content-Type"), parser, targeted)
+            except RuntimeError:
+                return  # pool already shut down
+
+            def done(future, i=i, page_num=page_num, response=response):
+                in_flight.release()
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    results.put((i, page_num, "error", e))
+                    return
+                stats.add(stats.parse, busy_s=seconds, items=1)
+                if client.cache is not None and result is not None:
+                    client.cache.put_derived(response, derived_key, result)
+                results.put((i, page_num, "parsed", result))
+            future.add_done_callback(done)
+
+    salons = [_Salon(normalize_coupon_url(url)) for url in urls]
+    remaining = len(urls)
+    started = time.perf_counter()
+
+    # Spawned, not forked: the fetch threads are already running when the pool starts its processes
+    pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+    threads = [threading.Thread(target=fetch_worker, daemon=True) for _ in range(fetch_workers)]
+    threads.append(threading.Thread(target=dispatcher, args=(pool,), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    def schedule(i, page_num):
+        salons[i].outstanding += 1
+        fetch_tasks.put((i, page_num, coupon_page_url(salons[i].base_url, page_num)))
+
+    try:
+        for i in range(len(urls)):
+            schedule(i, 1)
+
+        while remaining:
+            i, page_num, status, value = results.get()
+            salon = salons[i]
+            salon.outstanding -= 1
+
+            if status == "parsed" and kind == "menu":
+                salon.pages[1] = value or []
+                salon.last_page = 1
+            elif status == "parsed":
+                page = value
+                if page_num == 1:
+                    salon.salon_name = page["salon_name"]
+                    page_count = page["page_count"]
+                    if max_pages < 2 or not page["has_next"]:
+                        salon.last_page = 1
+                    elif page_count:
+                        # Page count known: every page goes into the pipeline at once
+                        salon.last_page = min(page_count, max_pages)
+                        for n in range(2, salon.last_page + 1):
+                            schedule(i, n)
+                    else:
+                        schedule(i, 2)
+                else:
+                    # Usually salon name is same on every page, so page 1's is used throughout.
+                    for row in page["rows"]:
+                        row["salon_name"] = salon.salon_name
+                    if salon.last_page is None:
+                        # Following "next" links one page at a time
+                        if page["has_next"] and page_num < max_pages:
+                            schedule(i, page_num + 1)
+                        else:
+                            salon.last_page = page_num
+                salon.pages[page_num] = page["rows"]
+            else:
+                # Keep sequential semantics: nothing after a missing page. A
+                # throttled or failed page (unlike a 404) leaves the salon incomplete.
+                error = None
+                if status == "status" and value in THROTTLE_STATUSES:
+                    error = ThrottledError(coupon_page_url(salon.base_url, page_num), value)
+                elif status == "error":
+                    error = value
+                if error is not None:
+                    print(f"Error on page {page_num} of {urls[i]}: {error}", file=sys.stderr)
+                    salon.error = salon.error or error
+                salon.last_page = min(page_num - 1, salon.last_page or page_num - 1)
+                salon.pages.pop(page_num, None)
+
+            # Yield pages in order as soon as they are contiguous
+            while salon.next_page in salon.pages and (salon.last_page is None or salon.next_page <= salon.last_page):
+                yield (i, urls[i], salon.pages.pop(salon.next_page), False)
+                salon.next_page += 1
+
+            if salon.outstanding == 0:
+                salon.pages.clear()
+                remaining -= 1
+                yield (i, urls[i], [], salon.error or True)
+    finally:
+        stop.set()
+        for _ in range(fetch_workers):
+            fetch_tasks.put(None)
+        _wake_dispatcher(html_queue)
+        pool.shutdown(wait=True, cancel_futures=True)
+        stats.wall_s = time.perf_counter() - started
+        print(stats.report(), file=sys.stderr)
+
+
+def _wake_dispatcher(html_queue):
+    # Wakes the dispatcher; drops queued pages, nobody will read their results
+    while True:
+        try:
+            html_queue.put_nowait(None)
+            return
+        except queue.Full:
+            try:
+                html_queue.get_nowait()
+            except queue.Empty:
+                pass
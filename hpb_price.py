@@ -0,0 +1,88 @@
+"""
+Price strings as shown on HPB ("¥5,500", "¥11,000～", "¥5,500～¥8,800",
+"要問い合わせ"), parsed the same way for every output: the integer price of
+hpb_store, the price columns of arrow_export and the WP CSV of wp_export.
+
+Strings are NFKC-normalized first, so full-width forms ("￥１２，０００",
+"～") read like their ASCII counterparts. parse_prices is the column
+version, for pandas Series: the same rules as pandas string operations.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Amounts in a normalized price string: "5,500", "11000"
+AMOUNT_RE = re.compile(r'\d[\d,]*')
+# The first and the last amount, for parse_prices
+_FIRST_AMOUNT_PATTERN = rf'({AMOUNT_RE.pattern})'
+_LAST_AMOUNT_PATTERN = rf'({AMOUNT_RE.pattern})(?!\D*\d)'
+# "～" normalizes to "~"
+FLUCTUATION_MARK = "~"
+# Price on request: no amount, even if one is shown next to it
+INQUIRY = "要問い合わせ"
+
+
+def normalize_price(price):
+    return unicodedata.normalize("NFKC", price or "")
+
+
+def parse_price(price):
+    """
+    (price_min, price_max, fluctuates) of one price string.
+
+    price_min is the first amount, price_max the last one when the price is
+    a range, else None. fluctuates tells whether the price has "～" (open
+    ended or range). Both amounts are None without an amount or with 要問い合わせ.
+
+    >>> parse_price("¥5,500～¥8,800")
+    (5500, 8800, True)
+    >>> parse_price("￥１２，０００")
+    (12000, None, False)
+    >>> parse_price("要問い合わせ")
+    (None, None, False)
+    """
+    price = normalize_price(price)
+    fluctuates = FLUCTUATION_MARK in price
+    if INQUIRY in price:
+        return None, None, fluctuates
+    amounts = [int(a.replace(",", "")) for a in AMOUNT_RE.findall(price)]
+    if not amounts:
+        return None, None, fluctuates
+    return amounts[0], (amounts[-1] if len(amounts) > 1 else None), fluctuates
+
+
+def parse_prices(prices):
+    """
+    Column version of parse_price.
+
+    Args:
+        prices (pd.Series): Raw price strings; empty or missing values are allowed.
+
+    Returns:
+        pd.DataFrame: price_min and price_max (Int64), price_fluctuates (bool),
+            on the index of prices.
+    """
+    # Prices repeat a lot: parse each distinct value once
+    codes, uniques = pd.factorize(prices.fillna('').astype(str))
+    normalized = pd.Series(uniques, dtype=object).str.normalize("NFKC")
+
+    fluctuates = normalized.str.contains(FLUCTUATION_MARK, regex=False).to_numpy(dtype=bool)
+    priced = ~normalized.str.contains(INQUIRY, regex=False)
+    minimum = _amounts(normalized.str.extract(_FIRST_AMOUNT_PATTERN, expand=False).where(priced))
+    # A second amount makes a range; its last amount is the maximum
+    ranged = priced & (normalized.str.count(AMOUNT_RE.pattern) > 1)
+    maximum = _amounts(normalized.str.extract(_LAST_AMOUNT_PATTERN, expand=False).where(ranged))
+
+    codes = np.asarray(codes)
+    return pd.DataFrame({
+        "price_min": minimum.take(codes),
+        "price_max": maximum.take(codes),
+        "price_fluctuates": fluctuates[codes],
+    }, index=prices.index)
+
+
+def _amounts(matches):
+    # "5,500" -> 5500, missing -> <NA>
+    return pd.array(matches.str.replace(",", "", regex=False).astype("Int64"))
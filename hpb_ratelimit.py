@@ -0,0 +1,220 @@
+import email.utils
+import os
+import sys
+import threading
+import time
+
+# Statuses HPB (or a proxy in front of it) answers with when we go too fast
+THROTTLE_STATUSES = (429, 403, 503)
+
+DEFAULT_RATE = 5.0  # requests per second per host, when nothing is throttled
+DEFAULT_BURST = 5  # requests allowed back to back after an idle period
+DEFAULT_MIN_RATE = 0.2
+DEFAULT_BACKOFF = 0.5  # rate multiplier on each throttled response
+DEFAULT_RECOVERY = 0.1  # share of the full rate regained per successful response
+DEFAULT_BASE_DELAY = 1.0  # first pause after a throttled response without Retry-After
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_MAX_RETRIES = 5
+
+
+class ThrottledError(RuntimeError):
+    """A page is still refused (THROTTLE_STATUSES) after the limiter's retries."""
+
+    def __init__(self, url, status, retries=0):
+        super().__init__(f"Blocked ({status}) on {url} after {retries} retries")
+        self.url = url
+        self.status = status
+
+
+def is_success(status):
+    """Whether a response ramps the rate back up: 2xx or 304, not 404s or 5xx errors."""
+    return 200 <= status < 300 or status == 304
+
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class _Bucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+
+
+class AdaptiveRateLimiter:
+    """
+    Per-host token bucket whose rate follows the server's responses.
+
+    Every request takes a token; tokens refill at the host's current rate up
+    to burst. A throttled response (THROTTLE_STATUSES) halves the rate
+    (backoff) and pauses the host, for Retry-After seconds when the server
+    sends it, else for base_delay doubled on each consecutive throttle. Each
+    successful response (2xx or 304) gives back recovery * rate, so the rate climbs back
+    to the configured maximum once the server stops pushing back.
+
+    Args:
+        rate (float): Maximum requests per second per host.
+        burst (int): Bucket size.
+        min_rate (float): Floor for the backed-off rate.
+        backoff (float): Rate multiplier per throttled response.
+        recovery (float): Fraction of rate regained per successful response.
+        base_delay (float): First pause without Retry-After, in seconds.
+        max_delay (float): Cap on any single pause, Retry-After included.
+        max_retries (int): Retries of one request before its throttled
+            response is returned to the caller.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=DEFAULT_MIN_RATE, backoff=DEFAULT_BACKOFF,
+                 recovery=DEFAULT_RECOVERY, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.backoff = backoff
+        self.recovery = recovery
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(self.rate, self.burst)
+        return bucket
+
+    def current_rate(self, host):
+        with self._lock:
+            return self._bucket(host).rate
+
+    def try_acquire(self, host):
+        """
+        Takes a token for host if one is available, without blocking.
+
+        Returns:
+            float: 0 when the token was taken, else the seconds to wait before
+                trying again (asyncio callers sleep on this, see hpb_async).
+        """
+        with self._lock:
+            bucket = self._bucket(host)
+            now = time.monotonic()
+            wait = bucket.blocked_until - now
+            if wait > 0:
+                return wait
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+            bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0.0
+            return (1 - bucket.tokens) / bucket.rate
+
+    def acquire(self, host):
+        """Blocks until host may be sent one more request."""
+        while True:
+            wait = self.try_acquire(host)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def throttled(self, host, retry_after=None):
+        """
+        Records a throttled response and pauses the host.
+
+        Returns:
+            float: Seconds before the host is sent anything again.
+        """
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.rate = max(self.min_rate, bucket.rate * self.backoff)
+            if retry_after is None:
+                delay = self.base_delay * 2 ** bucket.failures
+            else:
+                delay = retry_after
+            delay = min(delay, self.max_delay)
+            bucket.failures += 1
+            bucket.tokens = 0.0
+            bucket.updated = time.monotonic()
+            bucket.blocked_until = max(bucket.blocked_until, bucket.updated + delay)
+            return delay
+
+    def succeeded(self, host):
+        """Records a successful response: the host's rate ramps back up."""
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.failures = 0
+            bucket.rate = min(self.rate, bucket.rate + self.rate * self.recovery)
+
+    def retry_delay(self, host, url, response, attempt):
+        """
+        Records the response to a request's attempt-th retry (0: first try).
+
+        Sets response.retries to attempt. Blocking and asyncio send loops
+        share this decision, so they retry alike.
+
+        Returns:
+            float or None: Seconds to wait before retrying a throttled
+                response, or None when response is final: not throttled, or
+                throttled with max_retries exhausted.
+        """
+        response.retries = attempt
+        if response.status_code not in THROTTLE_STATUSES:
+            if is_success(response.status_code):
+                self.succeeded(host)
+            return None
+
+        delay = self.throttled(host, retry_after_seconds(response))
+        if attempt >= self.max_retries:
+            print(f"Giving up on {url} after {self.max_retries} retries (status {response.status_code})",
+                  file=sys.stderr)
+            return None
+        print(f"Throttled ({response.status_code}) on {url}, retrying in {delay:.1f}s "
+              f"(rate now {self.current_rate(host):.2f}/s)", file=sys.stderr)
+        return delay
+
+    def send(self, send, host, url, **kwargs):
+        """
+        Calls send(url, **kwargs) within the host's rate, retrying throttled responses.
+
+        Returns:
+            requests.Response: The first non-throttled response, or the last
+                throttled one once max_retries is exhausted. response.retries
+                holds the number of retries made.
+        """
+        attempt = 0
+        while True:
+            self.acquire(host)
+            response = send(url, **kwargs)
+            if self.retry_delay(host, url, response, attempt) is None:
+                return response
+            attempt += 1
+
+def limiter_from_env():
+    """
+    Builds the limiter of the shared client, or returns None if disabled.
+
+    HPB_RATE sets the maximum requests per second per host (0 disables the
+    limiter and the retries), HPB_MAX_RETRIES the retries per request.
+    """
+    rate = float(os.environ.get("HPB_RATE", DEFAULT_RATE))
+    if rate <= 0:
+        return None
+    return AdaptiveRateLimiter(
+        rate=rate,
+        burst=max(1, int(rate)),
+        max_retries=int(os.environ.get("HPB_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+    )
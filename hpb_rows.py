@@ -0,0 +1,152 @@
+"""
+Columnar row accumulator for scrape results.
+
+Scrapers return one dict per row, each repeating the same keys and, for
+coupons, the same salon_name / eligibility / icons strings. Kept by the
+hundred thousand (batch runs, background jobs, the shared result cache) the
+dict overhead dominates memory. A RowTable keeps one list per column instead,
+with the low-cardinality columns interned so every row points at the same
+string object.
+
+Rows read back from a table are Row views: __slots__ objects that behave as
+mutable mappings (row["price"], row.get(), dict(row), {**row}, ==), so code
+written for the dicts keeps working. to_frame() / to_arrow() build pandas /
+Arrow data straight from the columns, without a list of dicts in between.
+"""
+import sys
+from collections.abc import Mapping, MutableMapping
+
+# Columns with few distinct values, stored interned
+INTERNED_COLUMNS = frozenset({"salon_name", "category", "eligibility", "icons", "change"})
+
+_MISSING = object()  # key absent from a row (not the same as a None value)
+
+
+def intern_value(value):
+    """sys.intern for strings, other values unchanged."""
+    return sys.intern(value) if type(value) is str else value
+
+
+class Row(MutableMapping):
+    """Dict-compatible view of one row of a RowTable."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        column = self._table._columns.get(key)
+        value = _MISSING if column is None else column[self._index]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._table._column(key)[self._index] = intern_value(value) if key in INTERNED_COLUMNS else value
+
+    def __delitem__(self, key):
+        self[key]  # KeyError when absent
+        self._table._columns[key][self._index] = _MISSING
+
+    def __iter__(self):
+        index = self._index
+        return (key for key, column in self._table._columns.items() if column[index] is not _MISSING)
+
+    def __len__(self):
+        index = self._index
+        return sum(column[index] is not _MISSING for column in self._table._columns.values())
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Row({dict(self)!r})"
+
+
+class RowTable:
+    """
+    Rows stored column-wise, appended as mappings and read back as Row views.
+
+    Args:
+        columns (list): Initial column order. Keys not listed yet are added as
+            new columns when a row carrying them is appended.
+        rows (iterable): Rows to append right away.
+    """
+
+    def __init__(self, columns=(), rows=()):
+        self._columns = {c: [] for c in columns}
+        self._len = 0
+        self.extend(rows)
+
+    def _column(self, key):
+        column = self._columns.get(key)
+        if column is None:
+            column = self._columns[key] = [_MISSING] * self._len
+        return column
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def append(self, row):
+        for key in row:
+            if key not in self._columns:
+                self._column(key)
+        for key, column in self._columns.items():
+            value = row.get(key, _MISSING)
+            column.append(intern_value(value) if key in INTERNED_COLUMNS else value)
+        self._len += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Row(self, i) for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+        return Row(self, index)
+
+    def __iter__(self):
+        return (Row(self, i) for i in range(self._len))
+
+    def column(self, key):
+        """Values of one column, None where a row has no such key."""
+        return [None if v is _MISSING else v for v in self._columns.get(key, [_MISSING] * self._len)]
+
+    def to_dicts(self):
+        """Plain dicts, for callers that need real ones (e.g. json.dumps)."""
+        return [dict(row) for row in self]
+
+    def to_frame(self, columns=None):
+        """
+        pandas DataFrame built from the columns, with missing keys as NaN.
+
+        Equal to pd.DataFrame(list_of_dicts) for the same rows.
+        """
+        import pandas as pd
+
+        columns = self.columns if columns is None else list(columns)
+        return pd.DataFrame({c: self.column(c) for c in columns}, columns=columns)
+
+    def to_arrow(self, columns=None):
+        """pyarrow Table built from the columns (pyarrow must be installed)."""
+        import pyarrow as pa
+
+        columns = self.columns if columns is None else list(columns)
+        return pa.table({c: self.column(c) for c in columns})
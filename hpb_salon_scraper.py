@@ -0,0 +1,60 @@
+from hpb_coupon_scraper import DEFAULT_PAGE_WORKERS, iter_coupon_pages, load_coupon_page, normalize_coupon_url
+from hpb_parser import resolve_backend
+from hpb_ratelimit import ThrottledError
+import json
+import sys
+
+# Force stdout to use utf-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+def scrape_hpb_salon(url, max_pages=10, client=None, page_workers=DEFAULT_PAGE_WORKERS, parser=None, targeted=True):
+    """
+    Scrapes menus and coupons of one salon, fetching and parsing each page once.
+
+    scrape_hpb_menu and scrape_hpb_coupon both read the same /coupon/ page;
+    here page 1 is parsed a single time for both, and the remaining coupon
+    pages are fetched as scrape_hpb_coupon does.
+
+    Args:
+        url (str): Salon URL (the /coupon/ suffix is added if missing).
+        max_pages (int): Maximum number of coupon pages to read.
+        client, page_workers, parser, targeted: As for scrape_hpb_coupon.
+
+    Returns:
+        dict: salon_name (str), menus (list of scrape_hpb_menu dicts) and
+            coupons (list of scrape_hpb_coupon dicts). Both lists are empty if
+            the salon could not be fetched.
+
+    Raises:
+        ThrottledError, IncompleteScrapeError: A coupon page could not be
+            loaded (see hpb_coupon_scraper.iter_coupons).
+        ValueError: The parser backend is unknown or not installed.
+    """
+    parser = resolve_backend(parser)
+    base_url = normalize_coupon_url(url)
+    result = {"salon_name": "", "menus": [], "coupons": []}
+
+    try:
+        first_page = load_coupon_page(base_url, client=client, parser=parser, targeted=targeted, include_menus=True)
+    except ThrottledError:
+        raise
+    except Exception as e:
+        print(f"Error on page 1: {e}", file=sys.stderr)
+        return result
+    if first_page is None:
+        return result
+
+    result["salon_name"] = first_page["salon_name"]
+    result["menus"] = first_page["menus"]
+    for rows in iter_coupon_pages(base_url, first_page, max_pages, client, page_workers, parser, targeted):
+        result["coupons"].extend(rows)
+    return result
+
+if __name__ == "__main__":
+    target_url = "https://beauty.hotpepper.jp/slnH000306271/coupon/"
+    if len(sys.argv) > 1:
+        target_url = sys.argv[1]
+
+    data = scrape_hpb_salon(target_url)
+    print(json.dumps(data, ensure_ascii=False, indent=2))
@@ -0,0 +1,228 @@
+import contextlib
+import os
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+from hpb_price import parse_price
+
+DEFAULT_STORE_PATH = "hpb_results.sqlite3"
+STORE_ENV_VAR = "HPB_STORE_PATH"
+
+# Scraped fields per kind, in export order. Every row also records the run,
+# the salon (ID and URL), the integer price and, for change-tracking runs,
+# the change (added/modified/removed, see hpb_changes).
+TABLES = {
+    "menu": ("menus", ["salon_name", "category", "name", "price", "description"]),
+    "coupon": ("coupons", ["salon_name", "eligibility", "icons", "name", "price", "conditions"]),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    salons INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    changes_only INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_kind ON runs (kind, started_at);
+
+CREATE TABLE IF NOT EXISTS menus (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    salon_id TEXT NOT NULL,
+    salon_url TEXT NOT NULL,
+    salon_name TEXT,
+    category TEXT,
+    name TEXT,
+    price TEXT,
+    price_value INTEGER,
+    description TEXT,
+    change TEXT
+);
+CREATE INDEX IF NOT EXISTS menus_run ON menus (run_id);
+CREATE INDEX IF NOT EXISTS menus_salon ON menus (salon_id, run_id);
+CREATE INDEX IF NOT EXISTS menus_category ON menus (category);
+CREATE INDEX IF NOT EXISTS menus_price ON menus (price_value);
+
+CREATE TABLE IF NOT EXISTS coupons (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    salon_id TEXT NOT NULL,
+    salon_url TEXT NOT NULL,
+    salon_name TEXT,
+    eligibility TEXT,
+    icons TEXT,
+    name TEXT,
+    price TEXT,
+    price_value INTEGER,
+    conditions TEXT,
+    change TEXT
+);
+CREATE INDEX IF NOT EXISTS coupons_run ON coupons (run_id);
+CREATE INDEX IF NOT EXISTS coupons_salon ON coupons (salon_id, run_id);
+CREATE INDEX IF NOT EXISTS coupons_eligibility ON coupons (eligibility);
+CREATE INDEX IF NOT EXISTS coupons_price ON coupons (price_value);
+"""
+
+SALON_ID_RE = re.compile(r'sln[A-Z]\d+')
+
+
+def salon_id(url):
+    """HPB salon ID (e.g. slnH000306271) of a salon URL, or the URL itself if it has none."""
+    match = SALON_ID_RE.search(url)
+    return match.group(0) if match else url
+
+
+def price_value(price):
+    """
+    Integer (minimum) price of a price string, or None (e.g. "要問い合わせ").
+
+    "¥5,500" -> 5500, "¥11,000～" -> 11000; see hpb_price.parse_price.
+    """
+    return parse_price(price)[0]
+
+
+class ResultStore:
+    """
+    SQLite store for scraped menu and coupon rows, one run per scrape.
+
+    Each call opens its own connection, so one store can be shared by the
+    threads of a Streamlit server. Queries filter on indexed columns: salon
+    ID, category (menus), eligibility (coupons) and the integer price.
+
+    Args:
+        path (str): Database file; created with its schema on first use.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:  # one transaction, committed on success
+                yield conn
+        finally:
+            conn.close()
+
+    def save_run(self, kind, salon_rows, started_at=None, changes_only=False):
+        """
+        Stores all rows of one scrape run in a single transaction.
+
+        Args:
+            kind (str): "menu" or "coupon".
+            salon_rows (iterable): (salon_url, rows) pairs, rows as returned by the scrapers.
+            started_at (str): Run start time; defaults to now.
+            changes_only (bool): The rows are a hpb_changes delta (they carry "change").
+
+        Returns:
+            int: The run ID.
+        """
+        table, columns = TABLES[kind]
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        salon_rows = list(salon_rows)
+
+        def records():
+            for url, rows in salon_rows:
+                sid = salon_id(url)
+                for row in rows:
+                    yield ((run_id, sid, url) + tuple(row.get(c, "") for c in columns)
+                           + (price_value(row.get("price")), row.get("change")))
+
+        with self._connect() as conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (kind, started_at, finished_at, salons, rows, changes_only) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, started_at or now, now, len(salon_rows), sum(len(rows) for _, rows in salon_rows), int(changes_only)),
+            ).lastrowid
+            names = ["run_id", "salon_id", "salon_url"] + columns + ["price_value", "change"]
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                records(),
+            )
+        return run_id
+
+    def runs(self, kind):
+        """Runs of one kind, newest first, as dicts."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM runs WHERE kind = ? ORDER BY id DESC", (kind,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _where(self, run_id=None, salon_ids=None, categories=None, eligibilities=None,
+               min_price=None, max_price=None):
+        clauses, params = [], []
+        if run_id is not None:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        for column, values in (("salon_id", salon_ids), ("category", categories), ("eligibility", eligibilities)):
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if min_price is not None:
+            clauses.append("price_value >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append("price_value <= ?")
+            params.append(max_price)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def distinct(self, kind, column, run_id=None):
+        """Distinct values of column (e.g. "category", "salon_id") within a run, sorted."""
+        table, _ = TABLES[kind]
+        where, params = self._where(run_id)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT DISTINCT {column} FROM {table}{where} ORDER BY 1", params).fetchall()
+        return [row[0] for row in rows]
+
+    def salons(self, kind, run_id=None):
+        """{salon_id: salon_name} of the salons in a run."""
+        table, _ = TABLES[kind]
+        where, params = self._where(run_id)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT salon_id, MAX(salon_name) FROM {table}{where} GROUP BY salon_id ORDER BY MIN(rowid)",
+                                params).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def iter_rows(self, kind, columns=None, **filters):
+        """
+        Yields matching rows as dicts, in insertion order, without loading them all.
+
+        Args:
+            kind (str): "menu" or "coupon".
+            columns (list): Columns to return; defaults to the scraped fields.
+            **filters: run_id, salon_ids, categories, eligibilities, min_price, max_price.
+        """
+        table, default_columns = TABLES[kind]
+        where, params = self._where(**filters)
+        with self._connect() as conn:
+            cursor = conn.execute(f"SELECT {', '.join(columns or default_columns)} FROM {table}{where} ORDER BY rowid", params)
+            for row in cursor:
+                yield dict(row)
+
+    def frame(self, kind, columns=None, **filters):
+        """Same rows as iter_rows, as a DataFrame."""
+        table, default_columns = TABLES[kind]
+        where, params = self._where(**filters)
+        with self._connect() as conn:
+            return pd.read_sql_query(f"SELECT {', '.join(columns or default_columns)} FROM {table}{where} ORDER BY rowid",
+                                     conn, params=params)
+
+    def max_lengths(self, kind, columns, **filters):
+        """Longest value (in characters) per column over the matching rows, computed by SQLite."""
+        table, _ = TABLES[kind]
+        where, params = self._where(**filters)
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(f'MAX(LENGTH({c}))' for c in columns)} FROM {table}{where}", params).fetchone()
+        return {c: n or 0 for c, n in zip(columns, row)}
+
+
+def default_store():
+    """ResultStore at $HPB_STORE_PATH, or hpb_results.sqlite3 in the working directory."""
+    return ResultStore(os.environ.get(STORE_ENV_VAR, DEFAULT_STORE_PATH))
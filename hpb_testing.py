@@ -0,0 +1,133 @@
+"""
+Test support: the fixture pages of testdata/ and a local server for them.
+
+PageServer serves a dict of pages over HTTP, the way the site serves salon
+pages, for tests that scrape through a real HpbClient. Tests that need an
+error case edit its pages (an int value is served as that status) or set a
+hook. For recorded salons and load tests, see hpb_mock.
+
+    with PageServer(salon_pages()) as server:
+        rows = scrape_hpb_coupon(server.url("/slnH000000001/"), client=HpbClient())
+"""
+import collections
+import http.server
+import os
+import threading
+import time
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata")
+
+# One request seen by a PageServer; at is time.monotonic()
+Hit = collections.namedtuple("Hit", "path headers at")
+
+
+def read_testdata(name, binary=True):
+    """Contents of testdata/name, bytes or (binary=False) str."""
+    with open(os.path.join(TESTDATA, name), "rb" if binary else "r", encoding=None if binary else "utf-8") as f:
+        return f.read()
+
+
+def salon_pages():
+    """The two test coupon pages, served for every salon."""
+    return {"coupon/": read_testdata("coupon_page1.html"), "coupon/PN2.html": read_testdata("coupon_page2.html")}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        page_server = self.server.page_server
+        page_server.record(self.path, self.headers)
+        if page_server.latency:
+            time.sleep(page_server.latency)
+
+        status, body, headers = page_server.respond(self.path, self.headers)
+        self.send_response(status)
+        for name, value in {"Content-Type": "text/html; charset=UTF-8", **headers}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class PageServer:
+    """
+    HTTP server for a dict of pages, on a free local port.
+
+    Args:
+        pages (dict): Path -> body bytes, or an int status served with an
+            empty body. A key without the leading salon segment ("coupon/")
+            is served for every salon; full paths take precedence. Missing
+            paths are 404s. Tests may edit pages while the server runs.
+        latency (float): Seconds before each response.
+        hook: Optional hook(path, headers) -> (status, body, headers), or
+            None for the pages' answer. Runs in the request's
+            thread, so it may sleep; it must lock any state it changes.
+
+    Attributes:
+        hits (list): Hit of every request, in arrival order.
+    """
+
+    def __init__(self, pages=None, latency=0.0, hook=None):
+        self.pages = {} if pages is None else pages
+        self.latency = latency
+        self.hook = hook
+        self.hits = []
+        self._lock = threading.Lock()
+        self.httpd = _Server(("127.0.0.1", 0), _Handler)
+        self.httpd.page_server = self
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    @property
+    def host(self):
+        return f"127.0.0.1:{self.httpd.server_port}"
+
+    def url(self, path):
+        return self.base_url + path
+
+    def paths(self):
+        return [hit.path for hit in self.hits]
+
+    def reset(self):
+        self.hits.clear()
+
+    def record(self, path, headers):
+        with self._lock:
+            self.hits.append(Hit(path, headers, time.monotonic()))
+
+    def respond(self, path, headers):
+        if self.hook is not None:
+            answer = self.hook(path, headers)
+            if answer is not None:
+                return answer
+        body = self.pages.get(path)
+        if body is None:
+            body = self.pages.get(path.split("/", 2)[-1])
+        if body is None:
+            return 404, b"", {}
+        if isinstance(body, int):
+            return body, b"", {}
+        return 200, body, {}
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,7 +1,7 @@
-import requests
-url = 'https://beauty.hotpepper.jp/slnH000122973/coupon/'
-resp = requests.get(url)
-resp.encoding = resp.apparent_encoding
+from hpb_http import decode_response, fetch, site_url
+url = site_url('/slnH000122973/coupon/')
+resp = fetch(url)
+text = decode_response(resp)
 with open('debug_coupon.html', 'w', encoding='utf-8') as f:
-    f.write(resp.text)
+    f.write(text)
 print("Saved debug_coupon.html")
@@ -0,0 +1,60 @@
+from arrow_export import typed_frame, write_arrow, write_parquet
+from hpb_rows import RowTable
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MENUS = [
+    {"salon_name": "A", "category": "カット", "name": "カット", "price": "¥5,500", "description": "d1"},
+    {"salon_name": "A", "category": "カラー", "name": "カラー", "price": "¥11,000～", "description": "d2"},
+    {"salon_name": "B", "category": "カット", "name": "縮毛", "price": "¥5,500～¥8,800", "description": "d3"},
+    {"salon_name": "B", "category": "パーマ", "name": "相談", "price": "要問い合わせ", "description": ""},
+    {"salon_name": "B", "category": "パーマ", "name": "全角", "price": "￥１２，０００", "description": ""},
+    {"salon_name": "B", "category": "パーマ", "name": "空", "price": "", "description": ""},
+]
+
+
+class TestArrowExport(unittest.TestCase):
+
+    def test_typed_frame(self):
+        df = typed_frame(RowTable(rows=MENUS), "menu")
+        self.assertEqual(list(df.columns), ["salon_name", "category", "name", "price", "price_min", "price_max",
+                                            "price_fluctuates", "description"])
+        self.assertEqual(str(df["category"].dtype), "category")
+        self.assertEqual(str(df["price_min"].dtype), "Int64")
+        self.assertTrue(typed_frame(MENUS, "menu").equals(df))
+
+        coupons = typed_frame([{"salon_url": "u", "salon_name": "A", "eligibility": "新規", "name": "n",
+                                "price": "¥4,400", "change": "added"}], "coupon")
+        self.assertEqual(list(coupons.columns)[:2], ["salon_url", "salon_name"])
+        self.assertEqual(coupons["icons"].isna().tolist(), [True])
+        self.assertEqual(str(coupons["change"].dtype), "category")
+
+    def test_files(self):
+        table = pq.read_table(io.BytesIO(write_parquet(MENUS, "menu")))
+        self.assertEqual(table.num_rows, len(MENUS))
+        self.assertEqual(table.schema.field("price_min").type, pa.int64())
+        self.assertEqual(table.schema.field("price_fluctuates").type, pa.bool_())
+        self.assertTrue(pa.types.is_dictionary(table.schema.field("category").type))
+        self.assertEqual(table.column("price_max").to_pylist(), [None, None, 8800, None, None, None])
+
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "menus.arrow")
+            write_arrow(MENUS, "menu", path)
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            self.assertEqual(table.column("price_min").to_pylist(), [5500, 11000, 5500, None, 12000, None])
+            self.assertEqual(table.to_pandas()["name"].tolist(), [m["name"] for m in MENUS])
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
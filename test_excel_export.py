@@ -0,0 +1,45 @@
+from excel_export import ColumnWidthTracker, write_excel
+from openpyxl import load_workbook
+import io
+import unittest
+
+COLUMNS = ['salon_name', 'name', 'price']
+
+
+class TestExcelExport(unittest.TestCase):
+
+    def test_widths_track_longest_value(self):
+        widths = ColumnWidthTracker(COLUMNS)
+        widths.update([{"salon_name": "A", "name": "x" * 80, "price": "¥5,500"}])
+        widths.update([{"salon_name": "Salon B", "price": None}])
+        # Header length counts, +2 padding, capped at 50
+        self.assertEqual(widths.widths(), [12, 50, 8])
+
+    def test_write_excel(self):
+        rows = [
+            {"salon_name": "Salon A", "name": "Menu 1", "price": "¥10,000"},
+            {"salon_name": "Salon A", "name": "Menu 2"},
+        ]
+        widths = ColumnWidthTracker(COLUMNS)
+        widths.update(rows)
+
+        data = write_excel(iter(rows), COLUMNS, 'Menu List', widths=widths)
+        sheet = load_workbook(io.BytesIO(data))['Menu List']
+
+        self.assertEqual([list(r) for r in sheet.iter_rows(values_only=True)], [
+            ['salon_name', 'name', 'price'],
+            ['Salon A', 'Menu 1', '¥10,000'],
+            ['Salon A', 'Menu 2', None],
+        ])
+        self.assertEqual(sheet.column_dimensions['A'].width, 12)
+        self.assertEqual(sheet.column_dimensions['C'].width, 9)
+
+    def test_write_excel_measures_without_tracker(self):
+        rows = [{"salon_name": "Salon A", "name": "n" * 30, "price": ""}]
+        sheet = load_workbook(io.BytesIO(write_excel(rows, COLUMNS, 'Coupon List')))['Coupon List']
+        self.assertEqual(sheet.column_dimensions['B'].width, 32)
+        self.assertEqual(sheet.max_row, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
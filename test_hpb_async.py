@@ -0,0 +1,140 @@
+from hpb_async import AsyncHpbClient, iter_coupons_async, scrape_hpb_coupon_async, scrape_hpb_menu_async, scrape_many_async
+from hpb_coupon_scraper import scrape_hpb_coupon
+from hpb_http import HpbClient
+from hpb_menu_scraper import scrape_hpb_menu
+from hpb_ratelimit import AdaptiveRateLimiter, ThrottledError
+from hpb_testing import PageServer, salon_pages
+import asyncio
+import threading
+import time
+import unittest
+
+
+class _SlowAndFlaky:
+    # "slow" salons answer after a second; the first request of each "flaky" page is throttled
+    def __init__(self):
+        self.throttled = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, path, headers):
+        salon = path.split("/", 2)[1]
+        if salon.startswith("slow"):
+            time.sleep(1.0)
+        if salon.startswith("flaky"):
+            with self.lock:
+                first = path not in self.throttled
+                self.throttled.add(path)
+            if first:
+                return 503, b"", {}
+        return None
+
+
+class TestAsyncScrapers(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Every salon serves the two test pages
+        cls.server = PageServer(salon_pages(), hook=_SlowAndFlaky()).start()
+        cls.base = cls.server.base_url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+
+    def test_same_rows_as_sync_scrapers(self):
+        url = f"{self.base}/slnH000000001/"
+        coupons = asyncio.run(scrape_hpb_coupon_async(url, client=AsyncHpbClient()))
+        self.assertEqual(len(coupons), 8)
+        self.assertEqual(coupons, scrape_hpb_coupon(url, client=HpbClient(), page_workers=1))
+        self.assertEqual(asyncio.run(scrape_hpb_coupon_async(url, max_pages=1)), coupons[:len(coupons) - 3])
+
+        menus = asyncio.run(scrape_hpb_menu_async(url))
+        self.assertEqual(menus, scrape_hpb_menu(url, client=HpbClient()))
+
+    def test_many_salons_share_one_client(self):
+        urls = [f"{self.base}/slnH00000000{n}/" for n in range(1, 7)]
+
+        async def scrape():
+            async with AsyncHpbClient(max_connections=2, max_in_flight=4) as client:
+                return await scrape_many_async(urls, "coupon", client=client, concurrency=3)
+
+        results = asyncio.run(scrape())
+        self.assertEqual(len(results), 6)
+        for rows in results:
+            self.assertEqual(rows, results[0])
+        self.assertEqual(len(results[0]), 8)
+        self.assertEqual(len(self.server.hits), 12)
+
+    def test_batches_and_early_exit(self):
+        async def first_batch():
+            async for rows in iter_coupons_async(f"{self.base}/slnH000000001/", batches=True):
+                return rows
+
+        self.assertEqual(len(asyncio.run(first_batch())), 5)
+
+    def test_timeout_fails_the_salon(self):
+        async def scrape():
+            start = time.perf_counter()
+            rows = await scrape_many_async([f"{self.base}/slow1/", f"{self.base}/slnH000000001/"], timeout=0.2)
+            return rows, time.perf_counter() - start
+
+        (slow, fast), elapsed = asyncio.run(scrape())
+        self.assertEqual(slow, [])
+        self.assertEqual(len(fast), 8)
+        self.assertLess(elapsed, 1.0)
+
+    def test_cancellation(self):
+        async def scrape():
+            task = asyncio.ensure_future(scrape_hpb_coupon_async(f"{self.base}/slow2/"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            start = time.perf_counter()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return time.perf_counter() - start
+
+        self.assertLess(asyncio.run(scrape()), 0.5)
+
+    def test_throttled_pages_are_retried(self):
+        limiter = AdaptiveRateLimiter(rate=100, burst=10, base_delay=0.01)
+        rows = asyncio.run(scrape_hpb_coupon_async(f"{self.base}/flaky1/", client=AsyncHpbClient(rate_limiter=limiter)))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(self.server.paths().count("/flaky1/coupon/"), 2)
+        self.assertEqual(self.server.paths().count("/flaky1/coupon/PN2.html"), 2)
+
+        # Without retries the refused page fails the scrape instead of shortening it
+        with self.assertRaises(ThrottledError):
+            asyncio.run(scrape_hpb_coupon_async(f"{self.base}/flaky2/", client=AsyncHpbClient()))
+
+    def test_failed_salons_are_told_from_empty_ones(self):
+        urls = [f"{self.base}/flaky3/", f"{self.base}/slnH000000001/"]
+        throttled, rows = asyncio.run(scrape_many_async(urls, client=AsyncHpbClient()))
+        self.assertIsInstance(throttled, ThrottledError)
+        self.assertEqual(len(rows), 8)
+
+        self.server.reset()
+        with self.assertRaises(ValueError):
+            asyncio.run(scrape_many_async(urls, parser="nosuchparser"))
+        self.assertEqual(self.server.hits, [])
+
+    def test_errors_do_not_ramp_up(self):
+        limiter = AdaptiveRateLimiter(rate=100, burst=10, base_delay=0.01)
+        host = self.base.split("//", 1)[1]
+        limiter.throttled(host)
+        rate = limiter.current_rate(host)
+
+        async def get(path):
+            async with AsyncHpbClient(rate_limiter=limiter) as client:
+                return (await client.get(f"{self.base}{path}")).status_code
+
+        self.assertEqual(asyncio.run(get("/slnH000000001/nosuchpage")), 404)
+        self.assertEqual(limiter.current_rate(host), rate)
+        self.assertEqual(asyncio.run(get("/slnH000000001/coupon/")), 200)
+        self.assertGreater(limiter.current_rate(host), rate)
+
+
+if __name__ == "__main__":
+    unittest.main()
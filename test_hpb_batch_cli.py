@@ -0,0 +1,122 @@
+from hpb_batch_cli import CHECKPOINT_NAME, main, read_salons, run
+from hpb_http import get_client
+from hpb_testing import PageServer, salon_pages
+from unittest import mock
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestBatchCli(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = PageServer().start()
+        cls.base = cls.server.base_url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        # Every salon serves the two test pages
+        self.server.pages = salon_pages()
+        self.out = tempfile.mkdtemp()
+        self.urls = [f"{self.base}/slnH00000000{n}/" for n in range(1, 5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.out, ignore_errors=True)
+
+    def _ndjson(self, prefix):
+        rows = []
+        for name in sorted(os.listdir(self.out)):
+            if name.startswith(prefix):
+                with open(os.path.join(self.out, name), "r", encoding="utf-8") as f:
+                    rows.extend(json.loads(line) for line in f)
+        return rows
+
+    def test_read_salons(self):
+        path = os.path.join(self.out, "salons.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# salons\nslnH000306271\n\nhttps://beauty.hotpepper.jp/slnH000000002/\nslnH000306271\n")
+        self.assertEqual(read_salons(path), ["https://beauty.hotpepper.jp/slnH000306271/",
+                                             "https://beauty.hotpepper.jp/slnH000000002/"])
+
+    def test_resume_after_crash(self):
+        stats = run(self.urls[:3], self.out, shard_rows=10)
+        self.assertEqual(stats, {"done": 3, "skipped": 0, "empty": 0, "failed": 0})
+        self.assertEqual(len(self._ndjson("menus-")), 27)
+        self.assertEqual(len(self._ndjson("coupons-")), 24)
+        self.assertEqual(self._ndjson("coupons-")[0]["salon_url"][:len(self.base)], self.base)
+
+        # Crash after a salon's rows were written but before its checkpoint line
+        with open(os.path.join(self.out, "coupons-00003.ndjson"), "a", encoding="utf-8") as f:
+            f.write('{"salon_url": "half written"}\n{"salon_u')
+        with open(os.path.join(self.out, CHECKPOINT_NAME), "a", encoding="utf-8") as f:
+            f.write('{"salon": "torn')
+
+        stats = run(self.urls, self.out, shard_rows=10)
+        self.assertEqual(stats, {"done": 1, "skipped": 3, "empty": 0, "failed": 0})
+        coupons = self._ndjson("coupons-")
+        self.assertEqual(len(coupons), 32)
+        self.assertEqual(sorted({r["salon_url"] for r in coupons}), sorted(self.urls))
+
+        with open(os.path.join(self.out, CHECKPOINT_NAME), "r", encoding="utf-8") as f:
+            self.assertEqual([json.loads(line)["salon"] for line in f][-1], self.urls[3])
+
+    def test_failed_salon_is_retried(self):
+        # Page 2 of one salon refused: that salon is neither written nor checkpointed
+        refused = "/slnH000000002/coupon/PN2.html"
+        self.server.pages[refused] = 503
+        # No retries: the refused page fails at once
+        with mock.patch.object(get_client(), "rate_limiter", None):
+            for parse_processes in (0, 1):
+                with self.subTest(parse_processes=parse_processes):
+                    shutil.rmtree(self.out, ignore_errors=True)
+                    stats = run(self.urls[:3], self.out, kind="coupon", parse_processes=parse_processes)
+                    self.assertEqual(stats, {"done": 2, "skipped": 0, "empty": 0, "failed": 1})
+                    self.assertNotIn(self.urls[1], {r["salon_url"] for r in self._ndjson("coupons-")})
+        del self.server.pages[refused]
+
+        stats = run(self.urls[:3], self.out, kind="coupon")
+        self.assertEqual(stats, {"done": 1, "skipped": 2, "empty": 0, "failed": 0})
+        self.assertEqual(len(self._ndjson("coupons-")), 24)
+
+    def test_throttled_menu_page_fails_the_salon(self):
+        # A refused menu page is a failure, not a salon without menus
+        refused = "/slnH000000002/coupon/"
+        self.server.pages[refused] = 503
+        salons = os.path.join(self.out, "salons.txt")
+        with open(salons, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.urls[:3]) + "\n")
+        argv = ["hpb_batch_cli.py", salons, "--out", self.out, "--kind", "menu"]
+        with mock.patch.object(get_client(), "rate_limiter", None), mock.patch("sys.argv", argv):
+            self.assertEqual(main(), 1)
+        with open(os.path.join(self.out, CHECKPOINT_NAME), "r", encoding="utf-8") as f:
+            self.assertEqual(sorted(json.loads(line)["salon"] for line in f), [self.urls[0], self.urls[2]])
+        self.assertNotIn(self.urls[1], {r["salon_url"] for r in self._ndjson("menus-")})
+
+        del self.server.pages[refused]
+        with mock.patch("sys.argv", argv):
+            self.assertEqual(main(), 0)
+        self.assertEqual(len(self._ndjson("menus-")), 27)
+
+    def test_csv_coupons(self):
+        run(self.urls[:1], self.out, kind="coupon", fmt="csv", max_workers=1)
+        with open(os.path.join(self.out, "coupons-00001.csv"), "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(list(rows[0]), ["salon_url", "salon_name", "eligibility", "icons", "name", "price", "conditions"])
+        self.assertFalse(any(name.startswith("menus-") for name in os.listdir(self.out)))
+
+    def test_parse_processes(self):
+        stats = run(self.urls, self.out, kind="coupon", parse_processes=2)
+        self.assertEqual(stats, {"done": 4, "skipped": 0, "empty": 0, "failed": 0})
+        self.assertEqual(len(self._ndjson("coupons-")), 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
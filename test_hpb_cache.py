@@ -0,0 +1,103 @@
+from hpb_cache import HttpCache, canonical_url
+from hpb_http import HpbClient
+from hpb_testing import PageServer
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+PAGE = "<html><head><title>Salon｜クーポン</title></head><body>キャッシュ</body></html>".encode("utf-8")
+
+
+def _etag_page(path, headers):
+    if headers.get("If-None-Match") == '"v1"':
+        return 304, b"", {}
+    return 200, PAGE, {"ETag": '"v1"'}
+
+
+class TestHttpCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = PageServer(hook=_etag_page).start()
+        cls.base = cls.server.base_url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.server.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_canonical_url(self):
+        self.assertEqual(canonical_url("HTTPS://Beauty.HotPepper.jp:443/slnH1/coupon/?b=2&a=1#top"),
+                         "https://beauty.hotpepper.jp/slnH1/coupon/?a=1&b=2")
+
+    def test_fresh_hit_and_revalidation(self):
+        client = HpbClient(cache=HttpCache(self.cache_dir, ttl=3600))
+        url = f"{self.base}/slnH000000001/coupon/"
+
+        first = client.get(url)
+        self.assertFalse(first.from_cache)
+        self.assertEqual(first.content, PAGE)
+
+        # Fresh: served from disk without touching the server
+        second = client.get(url)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.content, PAGE)
+        self.assertEqual(len(self.server.hits), 1)
+
+        # Stale: revalidated with the stored ETag, 304 keeps the body and derived data
+        client.cache.put_derived(second, "rows", [{"name": "a"}])
+        client.cache.ttl = 0
+        third = client.get(url)
+        self.assertTrue(third.not_modified)
+        self.assertEqual(third.content, PAGE)
+        self.assertEqual(self.server.hits[-1].headers.get("If-None-Match"), '"v1"')
+        self.assertEqual(client.cache.get_derived(third, "rows"), [{"name": "a"}])
+
+    def test_offline_mode(self):
+        url = f"{self.base}/slnH000000002/coupon/"
+        HpbClient(cache=HttpCache(self.cache_dir)).get(url)
+
+        offline = HpbClient(cache=HttpCache(self.cache_dir, ttl=0, mode="offline"))
+        self.assertEqual(offline.get(url).content, PAGE)
+        self.assertEqual(offline.get(f"{self.base}/missing/").status_code, 504)
+        self.assertEqual(len(self.server.hits), 1)
+
+    def test_lru_size_cap(self):
+        # Room for exactly one compressed body
+        cache = HttpCache(self.cache_dir, max_bytes=len(zlib.compress(PAGE, 6)))
+        client = HpbClient(cache=cache)
+        client.get(f"{self.base}/a/")
+        client.get(f"{self.base}/b/")
+
+        offline = HpbClient(cache=HttpCache(self.cache_dir, mode="offline"))
+        self.assertEqual(offline.get(f"{self.base}/a/").status_code, 504)
+        self.assertEqual(offline.get(f"{self.base}/b/").content, PAGE)
+
+    def test_derived_data_counts_toward_the_cap(self):
+        cache = HttpCache(self.cache_dir)
+        client = HpbClient(cache=cache)
+        client.get(f"{self.base}/a/")
+        b = client.get(f"{self.base}/b/")
+        sizes = [os.path.getsize(os.path.join(self.cache_dir, name)) for name in os.listdir(self.cache_dir)]
+        self.assertEqual(cache._total_bytes, sum(sizes))
+
+        # Both entries fit until b's metadata grows
+        cache.max_bytes = sum(sizes) + 100
+        cache.put_derived(b, "rows", [{"name": "x" * 200}])
+        self.assertEqual(HttpCache(self.cache_dir)._total_bytes, cache._total_bytes)
+
+        offline = HpbClient(cache=HttpCache(self.cache_dir, mode="offline"))
+        self.assertEqual(offline.get(f"{self.base}/a/").status_code, 504)
+        self.assertEqual(cache.get_derived(offline.get(f"{self.base}/b/"), "rows"), [{"name": "x" * 200}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+from hpb_batch import iter_many
+from hpb_changes import COUPON_KEY, ChangeTracker, delta_rows, page_fingerprint
+from hpb_coupon_scraper import iter_coupons, scrape_hpb_coupon
+from hpb_http import HpbClient
+from hpb_testing import PageServer, read_testdata
+from unittest import mock
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestChangeTracker(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Pages are edited by the tests between runs
+        cls.server = PageServer().start()
+        cls.url = cls.server.url("/slnH000000001/")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.state_dir, "coupon.json")
+        self.server.pages = {
+            "/slnH000000001/coupon/": read_testdata("coupon_page1.html"),
+            "/slnH000000001/coupon/PN2.html": read_testdata("coupon_page2.html"),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir, ignore_errors=True)
+
+    def _run(self):
+        # One scheduled run: a fresh tracker loaded from the state file
+        tracker = ChangeTracker(self.state_path, COUPON_KEY)
+        rows = scrape_hpb_coupon(self.url, client=tracker.client(HpbClient()), page_workers=1)
+        delta = tracker.diff(self.url, rows)
+        tracker.save()
+        return delta
+
+    def test_page_fingerprint_ignores_volatile_markup(self):
+        page = read_testdata("coupon_page2.html")
+        noisy = page.replace(b"</head>", b'<script>var token = "abc";</script>\n<!-- 12:00 -->  </head>')
+        self.assertEqual(page_fingerprint(page), page_fingerprint(noisy))
+        self.assertNotEqual(page_fingerprint(page), page_fingerprint(page.replace("¥5,500".encode(), "¥6,000".encode())))
+
+    def test_delta_between_runs(self):
+        first = self._run()
+        self.assertEqual(len(first["added"]), 8)
+        self.assertEqual(first["unchanged"], 0)
+
+        # Only volatile markup changed: the stored rows are reused, nothing is parsed
+        path = "/slnH000000001/coupon/PN2.html"
+        self.server.pages[path] = self.server.pages[path].replace(b"</head>", b"<script>var t = 1;</script></head>")
+        with mock.patch("hpb_coupon_scraper.parse_coupon_page", side_effect=AssertionError("page was parsed")):
+            second = self._run()
+        self.assertEqual(second, {"added": [], "modified": [], "removed": [], "unchanged": 8})
+
+        # One price changed, one coupon renamed (removed + added)
+        self.server.pages[path] = (self.server.pages[path]
+                                .replace("¥5,500".encode(), "¥6,000".encode())
+                                .replace("トリートメント 7".encode(), "ヘッドスパ 7".encode()))
+        third = self._run()
+        self.assertEqual([r["price"] for r in third["modified"]], ["¥6,000"])
+        self.assertEqual([r["name"] for r in third["added"]], ["【人気No.7】カット+カラー & ヘッドスパ 7"])
+        self.assertEqual([r["name"] for r in third["removed"]], ["【人気No.7】カット+カラー & トリートメント 7"])
+        self.assertEqual(third["unchanged"], 6)
+        self.assertEqual([r["change"] for r in delta_rows(third)], ["added", "modified", "removed"])
+
+    def test_complete_empty_run_reports_removals(self):
+        self._run()
+        # A salon that lists nothing any more: everything it had is removed
+        self.server.pages = {}
+        self.assertEqual(len(self._run()["removed"]), 8)
+        self.server.pages = {
+            "/slnH000000001/coupon/": read_testdata("coupon_page1.html"),
+            "/slnH000000001/coupon/PN2.html": read_testdata("coupon_page2.html"),
+        }
+        self.assertEqual(len(self._run()["added"]), 8)
+
+    def test_save_drops_pages_no_longer_fetched(self):
+        self._run()
+        other = self.server.url("/slnH000000002/coupon/")
+        with open(self.state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        state["pages"][other] = {"fingerprint": "x", "derived": {}}
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+        # Page 2 gone: its coupons are removed, its stored rows dropped
+        del self.server.pages["/slnH000000001/coupon/PN2.html"]
+        self.assertEqual(len(self._run()["removed"]), 3)
+        with open(self.state_path, encoding="utf-8") as f:
+            pages = json.load(f)["pages"]
+        # Pages of salons this run did not scrape are kept
+        self.assertEqual(set(pages), {self.server.url("/slnH000000001/coupon/"), other})
+
+    def test_incomplete_run_keeps_state(self):
+        self._run()
+        # Page 2 refused: the salon fails part way and is not compared
+        self.server.pages["/slnH000000001/coupon/PN2.html"] = 503
+        tracker = ChangeTracker(self.state_path, COUPON_KEY)
+        client = tracker.client(HpbClient())
+        rows = []
+        for _, _, batch, finished in iter_many([self.url], lambda url: iter_coupons(url, client=client, batches=True)):
+            rows.extend(batch)
+        self.assertEqual(len(rows), 5)
+        self.assertIsNot(finished, True)
+        self.assertEqual(tracker.diff(self.url, rows, complete=finished is True),
+                         {"added": [], "modified": [], "removed": [], "unchanged": 0})
+        tracker.save()
+
+        # The next good run is compared with the last complete one
+        self.server.pages["/slnH000000001/coupon/PN2.html"] = read_testdata("coupon_page2.html")
+        self.assertEqual(self._run(), {"added": [], "modified": [], "removed": [], "unchanged": 8})
+
+
+if __name__ == '__main__':
+    unittest.main()
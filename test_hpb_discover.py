@@ -0,0 +1,132 @@
+from hpb_discover import SalonIdSet, discover, listing_url, parse_listing, shard_of, state_path
+from hpb_http import HpbClient
+from hpb_parser import available_backends
+from hpb_testing import PageServer
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+# Linked from every page, outside the results: never a discovered salon
+RANKING = '<div class="rankingSalon"><ul><li><a href="/slnH999000001/">1位</a></li></ul></div>'
+
+
+def _listing_page(salon_numbers, page_num, page_count):
+    links = "".join(f'<li class="searchListCassette"><h3 class="slnName"><a href="/slnH{n:09d}/">Salon {n}</a></h3>'
+                    f'<a href="https://beauty.hotpepper.jp/slnH{n:09d}/coupon/">coupons</a></li>'
+                    for n in salon_numbers)
+    return (f'<html><body><ul class="slnCassetteList">{links}</ul>{RANKING}'
+            f'<p class="pa bottom0 right0">{page_num}/{page_count}ページ</p></body></html>').encode("utf-8")
+
+
+class TestDiscover(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Area A: salons 1-30 over 3 pages; area B: 25-44 over 2 pages (25-30 listed in both)
+        pages = {}
+        for area, numbers, per_page in (("A", range(1, 31), 10), ("B", range(25, 45), 10)):
+            numbers = list(numbers)
+            count = len(numbers) // per_page
+            for p in range(1, count + 1):
+                path = f"/svcSA/mac{area}/salon/" + (f"PN{p}.html" if p > 1 else "")
+                pages[path] = _listing_page(numbers[(p - 1) * per_page:p * per_page], p, count)
+        cls.pages = pages
+        cls.server = PageServer().start()
+        cls.base = cls.server.base_url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.out = os.path.join(self.dir, "salons.txt")
+        self.seeds = [f"{self.base}/svcSA/macA/salon/", f"{self.base}/svcSA/macB/salon/PN2.html"]
+        self.server.pages = dict(self.pages)
+        self.server.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _output(self):
+        with open(self.out, "r", encoding="utf-8") as f:
+            return f.read().split()
+
+    def test_salon_id_set(self):
+        ids = SalonIdSet()
+        self.assertTrue(ids.add("slnH000306271"))
+        self.assertFalse(ids.add("slnH000306271"))
+        self.assertTrue(ids.add("slnH000000002"))
+        self.assertTrue(ids.add("slnX000000002"))
+        self.assertIn("slnH000000002", ids)
+        self.assertNotIn("slnH000000003", ids)
+        self.assertNotIn("not-a-salon", ids)
+        self.assertEqual(len(ids), 3)
+        self.assertRaises(ValueError, ids.add, "H000306271")
+        # One bit per ID: 306271 IDs fit in about 38 KB
+        self.assertLessEqual(ids.nbytes(), 2 * 40960)
+
+        copy = SalonIdSet.from_json(json.loads(json.dumps(ids.to_json())))
+        self.assertEqual(sorted(copy), ["slnH000000002", "slnH000306271", "slnX000000002"])
+        self.assertEqual(len(copy), 3)
+
+    def test_salon_id_set_huge_ids(self):
+        # Beyond BITMAP_LIMIT: a plain set, not a bitmap of gigabytes
+        ids = SalonIdSet()
+        self.assertTrue(ids.add("slnH9999999999"))
+        self.assertFalse(ids.add("slnH9999999999"))
+        self.assertTrue(ids.add("slnH000000001"))
+        self.assertIn("slnH9999999999", ids)
+        self.assertNotIn("slnH9999999998", ids)
+        self.assertEqual(len(ids), 2)
+        self.assertLessEqual(ids.nbytes(), 4096)
+
+        copy = SalonIdSet.from_json(json.loads(json.dumps(ids.to_json())))
+        self.assertEqual(sorted(copy), ["slnH000000001", "slnH9999999999"])
+
+    def test_parse_listing(self):
+        self.assertEqual(listing_url("https://beauty.hotpepper.jp/svcSA/macAA/salon/PN3.html"),
+                         "https://beauty.hotpepper.jp/svcSA/macAA/salon/")
+        salon_ids, has_next, page_count = parse_listing(_listing_page([1, 2], 1, 2).decode("utf-8"), 1)
+        self.assertEqual((salon_ids, has_next, page_count), (["slnH000000001", "slnH000000002"], True, 2))
+        cassette = '<ul><li class="searchListCassette"><a href="/slnH000000009">x</a></li></ul>'
+        html = cassette + '<li class="pa top0 right0 afterPage"><a href="PN2.html">次へ</a></li>'
+        self.assertEqual(parse_listing(html, 1), (["slnH000000009"], True, None))
+        self.assertEqual(parse_listing(cassette, 1)[1], False)
+        # Salon links outside the result cassettes are not results
+        self.assertEqual(parse_listing(f'<a href="/slnH000000008/">x</a>{RANKING}{cassette}', 1)[0], ["slnH000000009"])
+        for parser in available_backends():
+            self.assertEqual(parse_listing(_listing_page([1, 2], 1, 2).decode("utf-8"), 1, parser)[0],
+                             ["slnH000000001", "slnH000000002"])
+        self.assertEqual({shard_of(seed, 4) for seed in self.seeds * 2}, {shard_of(s, 4) for s in self.seeds})
+
+    def test_dedup_and_resume(self):
+        # First run: page 3 of area A fails, the rest is crawled
+        broken = "/svcSA/macA/salon/PN3.html"
+        self.server.pages[broken] = 404
+        stats = discover(self.seeds, self.out, client=HpbClient())
+        self.assertEqual((stats["pages"], stats["new"]), (4, 40))
+        self.assertEqual(len(set(self._output())), 40)
+
+        # A crash after the last save leaves lines the state does not know
+        with open(self.out, "a", encoding="utf-8") as f:
+            f.write("slnH000000099\nslnH0000")
+
+        self.server.pages[broken] = self.pages[broken]
+        self.server.reset()
+        stats = discover(self.seeds, self.out, client=HpbClient())
+        # Only the missing page is fetched again
+        self.assertEqual(self.server.paths(), [broken])
+        self.assertEqual((stats["pages"], stats["new"], stats["seen"]), (1, 4, 44))
+        self.assertEqual(sorted(self._output()), [f"slnH{n:09d}" for n in range(1, 45)])
+
+        with open(state_path(self.out), "r", encoding="utf-8") as f:
+            listings = json.load(f)["listings"]
+        self.assertTrue(all(listing["done"] for listing in listings.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
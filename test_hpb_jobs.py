@@ -0,0 +1,99 @@
+from hpb_http import get_client
+from hpb_jobs import JobManager, ResultCache
+from hpb_store import ResultStore
+from hpb_testing import PageServer, salon_pages
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+
+class TestJobs(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Every salon serves the two test pages, slowly enough for requests to overlap
+        cls.server = PageServer(salon_pages(), latency=0.05).start()
+        cls.base = cls.server.base_url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = ResultStore(os.path.join(self.dir, "store.sqlite3"))
+        self.server.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _wait(self, job):
+        for _ in range(200):
+            if not job.running:
+                return job
+            time.sleep(0.05)
+        self.fail("job did not finish")
+
+    def test_result_cache_ttl(self):
+        cache = ResultCache(ttl=0.2)
+        key = cache.key("coupon", "https://beauty.hotpepper.jp/slnH000000001")
+        self.assertEqual(key, cache.key("coupon", "https://BEAUTY.hotpepper.jp/slnH000000001/coupon/"))
+        cache.put(key, [{"name": "a"}])
+        rows = cache.get(key)
+        rows[0]["name"] = "changed"
+        self.assertEqual(cache.get(key).to_dicts(), [{"name": "a"}])
+        time.sleep(0.25)
+        self.assertIsNone(cache.get(key))
+
+    def test_concurrent_jobs_share_one_scrape(self):
+        jobs = JobManager(self.store)
+        urls = [f"{self.base}/slnH00000000{n}/" for n in range(1, 4)]
+        first = jobs.submit("coupon", urls)
+        second = jobs.submit("coupon", urls[::-1])
+        self._wait(first)
+        self._wait(second)
+
+        self.assertEqual((first.status, first.done, first.found), ("done", 3, 24))
+        self.assertEqual((second.status, second.found), ("done", 24))
+        # Each salon's two pages were fetched once for both jobs
+        self.assertEqual(len(self.server.hits), 6)
+        self.assertEqual(jobs.get(second.id), second)
+        self.assertEqual([run["rows"] for run in self.store.runs("coupon")], [24, 24])
+        self.assertEqual(len(self.store.frame("coupon", run_id=first.run_id)), 24)
+
+    def test_failed_salons_are_left_out_of_the_run(self):
+        jobs = JobManager(self.store)
+        urls = [f"{self.base}/slnH00000000{n}/" for n in range(1, 4)]
+        # The second salon's page 2 is refused after page 1 was parsed (no retries)
+        self.server.pages["/slnH000000002/coupon/PN2.html"] = 503
+        try:
+            with mock.patch.object(get_client(), "rate_limiter", None):
+                job = self._wait(jobs.submit("coupon", urls))
+        finally:
+            del self.server.pages["/slnH000000002/coupon/PN2.html"]
+
+        self.assertEqual((job.status, job.done, job.processed, job.found), ("done", 2, 3, 16))
+        self.assertEqual(list(job.failures), [urls[1]])
+        self.assertIn("503", job.failures[urls[1]])
+        self.assertEqual([(run["salons"], run["rows"]) for run in self.store.runs("coupon")], [(2, 16)])
+        frame = self.store.frame("coupon", columns=["salon_url"], run_id=job.run_id)
+        self.assertNotIn(urls[1], set(frame["salon_url"]))
+
+    def test_job_fails_when_every_salon_fails(self):
+        self.server.pages["/slnH000000001/coupon/PN2.html"] = 503
+        try:
+            with mock.patch.object(get_client(), "rate_limiter", None):
+                job = self._wait(JobManager(self.store).submit("coupon", [f"{self.base}/slnH000000001/"]))
+        finally:
+            del self.server.pages["/slnH000000001/coupon/PN2.html"]
+
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(len(job.failures), 1)
+        self.assertEqual(self.store.runs("coupon"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
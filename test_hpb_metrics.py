@@ -0,0 +1,61 @@
+from hpb_coupon_scraper import scrape_hpb_coupon
+from hpb_http import HpbClient
+from hpb_metrics import Metrics, get_metrics
+from hpb_testing import PageServer, read_testdata
+from wp_export import convert_to_wp_csv
+import json
+import unittest
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_registry_exports(self):
+        metrics = Metrics()
+        metrics.inc("hpb_requests_total", status=200)
+        metrics.inc("hpb_requests_total", 2, status=200)
+        metrics.observe("hpb_page_rows", 5, kind="coupon")
+        metrics.observe("hpb_page_rows", 3, kind="coupon")
+        with metrics.timer("parse"):
+            pass
+
+        snapshot = json.loads(metrics.to_json())
+        self.assertEqual(snapshot["counters"], [{"name": "hpb_requests_total", "labels": {"status": "200"}, "value": 3}])
+        rows = {s["name"]: s for s in snapshot["summaries"]}
+        self.assertEqual((rows["hpb_page_rows"]["count"], rows["hpb_page_rows"]["sum"], rows["hpb_page_rows"]["max"]),
+                         (2, 8, 5))
+
+        text = metrics.to_prometheus()
+        self.assertIn("# TYPE hpb_requests_total counter\n", text)
+        self.assertIn('hpb_requests_total{status="200"} 3\n', text)
+        self.assertIn('hpb_page_rows_count{kind="coupon"} 2\n', text)
+        self.assertIn('hpb_page_rows_sum{kind="coupon"} 8.000000\n', text)
+        self.assertIn('hpb_stage_seconds_count{stage="parse"} 1\n', text)
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()["summaries"], [])
+
+    def test_scrape_is_instrumented(self):
+        pages = {
+            "/slnH000000001/coupon/": read_testdata("coupon_page1.html"),
+            "/slnH000000001/coupon/PN2.html": read_testdata("coupon_page2.html"),
+        }
+        with PageServer(pages) as server:
+            metrics = get_metrics()
+            metrics.reset()
+            rows = scrape_hpb_coupon(server.url("/slnH000000001/"), client=HpbClient())
+            convert_to_wp_csv([{"salon_name": "A", "category": "カット", "name": "n", "price": "¥1,000"}], {"A": "a"})
+
+        summaries = {(s["name"], tuple(s["labels"].items())): s for s in metrics.snapshot()["summaries"]}
+        counters = {(c["name"], tuple(c["labels"].items())): c["value"] for c in metrics.snapshot()["counters"]}
+        for stage in ("fetch", "decode", "parse", "extract"):
+            self.assertEqual(summaries[("hpb_stage_seconds", (("stage", stage),))]["count"], 2)
+        for stage in ("scrape_coupon", "wp_convert"):
+            self.assertEqual(summaries[("hpb_stage_seconds", (("stage", stage),))]["count"], 1)
+        self.assertEqual(summaries[("hpb_page_rows", (("kind", "coupon"),))]["sum"], len(rows))
+        self.assertEqual(summaries[("hpb_request_seconds", (("source", "network"),))]["count"], 2)
+        self.assertEqual(counters[("hpb_requests_total", (("status", "200"),))], 2)
+        self.assertEqual(counters[("hpb_response_bytes_total", ())], sum(map(len, pages.values())))
+
+
+if __name__ == '__main__':
+    unittest.main()
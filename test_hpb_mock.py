@@ -0,0 +1,111 @@
+from hpb_coupon_scraper import scrape_hpb_coupon
+from hpb_http import HpbClient
+from hpb_menu_scraper import scrape_hpb_menu
+from hpb_mock import MockHpbServer, ReplayClient, load_manifest, record
+from hpb_ratelimit import AdaptiveRateLimiter
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "corpus")
+
+
+class TestReplayClient(unittest.TestCase):
+
+    def test_serves_the_corpus(self):
+        client = ReplayClient(CORPUS)
+        url = "https://beauty.hotpepper.jp/slnH000000102/"
+        self.assertEqual(len(scrape_hpb_coupon(url, max_pages=20, client=client, page_workers=1)), 88)
+        self.assertEqual(len(scrape_hpb_menu(url, client=client)), 40)
+        self.assertEqual(client.get(url + "coupon/PN5.html").status_code, 404)
+        self.assertEqual(client.get(url).status_code, 404)
+
+
+class TestMockServer(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(CORPUS, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+    def test_pagination_ends_with_404(self):
+        with MockHpbServer(CORPUS) as server:
+            rows = scrape_hpb_coupon(server.salon_url("slnH000000102"), max_pages=20, client=HpbClient(), page_workers=1)
+            self.assertEqual(len(rows), 88)
+            self.assertEqual(server.stats["statuses"], {200: 4})
+
+            client = HpbClient()
+            self.assertEqual(client.get(server.salon_url("slnH000000102") + "coupon/PN5.html").status_code, 404)
+            self.assertEqual(client.get(server.salon_url("slnH000000999") + "coupon/").status_code, 404)
+            self.assertEqual(client.get(server.base_url + "/other/").status_code, 404)
+
+    def test_alias_serves_recorded_salons(self):
+        with MockHpbServer(CORPUS, alias=True) as server:
+            client = HpbClient()
+            counts = {n: len(scrape_hpb_coupon(server.salon_url(f"slnH{n:09d}"), max_pages=20, client=client))
+                      for n in range(1000, 1010)}
+            # The same ID is always served the same salon
+            self.assertEqual(len(scrape_hpb_coupon(server.salon_url("slnH000001000"), max_pages=20, client=client)),
+                             counts[1000])
+        self.assertEqual(set(counts.values()), {info["coupons"] for info in self.manifest.values()})
+
+    def test_injected_failures_are_retried(self):
+        limiter = AdaptiveRateLimiter(rate=1000, burst=100, base_delay=0.001, max_retries=20)
+        with MockHpbServer(CORPUS, fail_rates={503: 0.3, 403: 0.1}, retry_after=0, seed=1) as server:
+            client = HpbClient(rate_limiter=limiter)
+            rows = scrape_hpb_coupon(server.salon_url("slnH000000102"), max_pages=20, client=client)
+            statuses = server.stats["statuses"]
+        self.assertEqual(len(rows), 88)
+        self.assertEqual(statuses[200], 4)
+        self.assertGreater(statuses.get(503, 0) + statuses.get(403, 0), 0)
+
+        with MockHpbServer(CORPUS, fail_rates={403: 1.0}) as server:
+            self.assertEqual(HpbClient().get(server.salon_url("slnH000000101") + "coupon/").status_code, 403)
+
+    def test_latency_bandwidth_and_gzip(self):
+        path = os.path.join(CORPUS, "slnH000000101", "coupon", "index.html")
+        with open(path, "rb") as f:
+            body = f.read()
+        url_path = "/slnH000000101/coupon/"
+
+        with MockHpbServer(CORPUS, latency=0.2) as server:
+            start = time.perf_counter()
+            response = HpbClient().get(server.base_url + url_path)
+            self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+            self.assertEqual(response.content, body)
+
+        # 40 KB page at 200 KB/s
+        with MockHpbServer(CORPUS, bandwidth=200 * 1024) as server:
+            start = time.perf_counter()
+            HpbClient().get(server.base_url + url_path)
+            self.assertGreaterEqual(time.perf_counter() - start, len(body) / (200 * 1024) * 0.9)
+
+        with MockHpbServer(CORPUS, gzip=True) as server:
+            status, sent, headers = server.respond(url_path, "gzip, deflate")
+            self.assertEqual(headers["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(sent), body)
+            response = HpbClient().get(server.base_url + url_path)
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(response.content, body)
+
+
+class TestRecord(unittest.TestCase):
+
+    def test_record_then_replay(self):
+        with MockHpbServer(CORPUS) as server, tempfile.TemporaryDirectory() as root:
+            recorded = record([server.salon_url("slnH000000102"), server.salon_url("slnH000000101")], root,
+                              client=HpbClient())
+            self.assertEqual(recorded, {k: v for k, v in load_manifest(CORPUS).items() if k in recorded})
+            self.assertEqual(sorted(load_manifest(root)), ["slnH000000101", "slnH000000102"])
+            self.assertEqual(sorted(os.listdir(os.path.join(root, "slnH000000102", "coupon"))),
+                             ["PN2.html", "PN3.html", "PN4.html", "index.html"])
+
+            with MockHpbServer(root) as replay:
+                rows = scrape_hpb_coupon(replay.salon_url("slnH000000102"), max_pages=20, client=HpbClient())
+            self.assertEqual(rows, scrape_hpb_coupon(server.salon_url("slnH000000102"), max_pages=20, client=HpbClient()))
+
+
+if __name__ == "__main__":
+    unittest.main()
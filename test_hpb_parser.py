@@ -0,0 +1,84 @@
+from hpb_coupon_scraper import parse_coupon_page, is_coupon_region, is_salon_region, scrape_hpb_coupon
+from hpb_menu_scraper import parse_menu_page, extract_salon_name, is_menu_region, mark_menu_region, scrape_hpb_menu
+from hpb_parser import PARSER_ENV_VAR, available_backends, make_soup, region_filter, resolve_backend
+from hpb_salon_scraper import scrape_hpb_salon
+from hpb_testing import read_testdata
+from unittest import mock
+import os
+import unittest
+
+
+def _read(name):
+    return read_testdata(name, binary=False)
+
+
+class TestParserBackends(unittest.TestCase):
+
+    def test_reference_output(self):
+        soup = make_soup(_read("coupon_page1.html"), "html.parser")
+
+        page = parse_coupon_page(soup)
+        self.assertEqual(page["salon_name"], "サロン slnH000000001")
+        self.assertEqual(len(page["rows"]), 5)
+        self.assertTrue(page["has_next"])
+        self.assertEqual(page["page_count"], 2)
+        self.assertEqual(page["rows"][0]["eligibility"], "新規")
+        self.assertEqual(page["rows"][0]["icons"], "カット, カラー")
+        self.assertEqual(page["rows"][0]["conditions"], "提示条件： 予約時\n利用条件： 平日限定 0")
+
+        menus = parse_menu_page(soup)
+        self.assertEqual(len(menus), 9)
+        self.assertEqual(menus[0]["category"], "カット")
+        self.assertEqual(menus[0]["name"], "メニュー 0")
+
+    def test_backend_parity(self):
+        # Every installed backend must produce exactly the html.parser rows
+        for name in ("coupon_page1.html", "coupon_page2.html"):
+            html = _read(name)
+            reference = make_soup(html, "html.parser")
+            expected_page = parse_coupon_page(reference)
+            expected_menus = parse_menu_page(reference)
+
+            for backend in available_backends():
+                with self.subTest(page=name, backend=backend):
+                    soup = make_soup(html, backend)
+                    self.assertEqual(extract_salon_name(soup), expected_page["salon_name"])
+                    self.assertEqual(parse_coupon_page(soup), expected_page)
+                    self.assertEqual(parse_menu_page(soup), expected_menus)
+
+                    # Targeted parsing builds only the needed regions, same rows
+                    coupon_soup = make_soup(html, backend, parse_only=region_filter(is_coupon_region))
+                    self.assertEqual(parse_coupon_page(coupon_soup), expected_page)
+                    menu_soup = make_soup(mark_menu_region(html), backend, parse_only=region_filter(is_menu_region))
+                    self.assertEqual(parse_menu_page(menu_soup), expected_menus)
+
+    def test_targeted_menus_stay_in_menu_list(self):
+        # A category header and menu table outside #menuList's container are not menus
+        html = _read("menu_offregion.html")
+        expected = [("カット", "A")]
+        for backend in available_backends():
+            for region in (is_menu_region, is_salon_region):
+                with self.subTest(backend=backend, region=region.__name__):
+                    for soup in (make_soup(html, backend),
+                                 make_soup(mark_menu_region(html), backend, parse_only=region_filter(region))):
+                        self.assertEqual([(m["category"], m["name"]) for m in parse_menu_page(soup)], expected)
+
+    def test_resolve_backend(self):
+        self.assertEqual(resolve_backend("html.parser"), "html.parser")
+        self.assertIn(resolve_backend("auto"), available_backends())
+        with self.assertRaises(ValueError):
+            resolve_backend("no-such-parser")
+
+    def test_bad_backend_fails_before_fetching(self):
+        # Not a failed page: the scrapers raise instead of returning no rows
+        client = mock.Mock(cache=None)
+        url = "https://beauty.hotpepper.jp/slnH000000001/"
+        with mock.patch.dict(os.environ, {PARSER_ENV_VAR: "no-such-parser"}):
+            for scrape in (scrape_hpb_coupon, scrape_hpb_menu, scrape_hpb_salon):
+                with self.subTest(scrape=scrape.__name__), self.assertRaises(ValueError):
+                    scrape(url, client=client)
+        client.get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
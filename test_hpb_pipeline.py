@@ -0,0 +1,76 @@
+from hpb_coupon_scraper import scrape_hpb_coupon
+from hpb_http import HpbClient
+from hpb_menu_scraper import scrape_hpb_menu
+from hpb_pipeline import PipelineStats, iter_pipeline
+from hpb_ratelimit import ThrottledError
+from hpb_testing import PageServer, salon_pages
+import unittest
+
+
+class TestPipeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Every salon serves the two test pages; "blocked1" refuses page 2
+        cls.server = PageServer({**salon_pages(), "/blocked1/coupon/PN2.html": 503}).start()
+        cls.base = cls.server.base_url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.urls = [f"{self.base}/slnH00000000{n}/" for n in range(1, 7)]
+
+    def _collect(self, kind, **kwargs):
+        rows = {i: [] for i in range(len(self.urls))}
+        finished = []
+        for i, url, batch, done in iter_pipeline(self.urls, kind, client=HpbClient(), **kwargs):
+            self.assertEqual(url, self.urls[i])
+            self.assertNotIn(i, finished)
+            if done:
+                finished.append(i)
+            rows[i].extend(batch)
+        self.assertEqual(sorted(finished), list(range(len(self.urls))))
+        return rows
+
+    def test_same_rows_as_sequential_scrape(self):
+        stats = PipelineStats()
+        # A one-page queue forces the fetch stage to wait on the parse stage
+        rows = self._collect("coupon", fetch_workers=4, parse_workers=2, queue_size=1, stats=stats)
+        expected = scrape_hpb_coupon(self.urls[0], client=HpbClient(), page_workers=1)
+        self.assertEqual(len(expected), 8)
+        for salon_rows in rows.values():
+            self.assertEqual(salon_rows, expected)
+
+        self.assertEqual(stats.fetch["items"], 12)
+        self.assertEqual(stats.parse["items"], 12)
+        self.assertLessEqual(stats.max_queue, 1)
+        use = stats.utilization()
+        self.assertGreater(use["parse"], 0)
+        self.assertLessEqual(use["fetch"], 1)
+
+    def test_max_pages_and_menus(self):
+        rows = self._collect("coupon", max_pages=1, parse_workers=1)
+        self.assertEqual([len(r) for r in rows.values()], [5] * len(self.urls))
+
+        rows = self._collect("menu", parse_workers=1)
+        expected = scrape_hpb_menu(self.urls[0], client=HpbClient())
+        for salon_rows in rows.values():
+            self.assertEqual(salon_rows, expected)
+
+    def test_missing_salon(self):
+        # Served as a 404
+        self.urls = [f"{self.base}/area/nosuchsalon"]
+        self.assertEqual(list(iter_pipeline(self.urls, client=HpbClient(), parse_workers=1)),
+                         [(0, self.urls[0], [], True)])
+
+    def test_throttled_page_fails_the_salon(self):
+        self.urls = [f"{self.base}/blocked1/"]
+        events = list(iter_pipeline(self.urls, client=HpbClient(), parse_workers=1))
+        self.assertEqual([len(rows) for _, _, rows, _ in events], [5, 0])
+        self.assertIsInstance(events[-1][3], ThrottledError)
+
+
+if __name__ == '__main__':
+    unittest.main()
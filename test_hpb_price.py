@@ -0,0 +1,52 @@
+from arrow_export import typed_frame
+from hpb_price import parse_price, parse_prices
+from hpb_store import price_value
+from wp_export import convert_to_wp_csv
+import pandas as pd
+import unittest
+
+PRICES = ["¥5,500", "¥11,000～", "¥5,500~¥8,800", "¥8,800～要問い合わせ", "￥１２，０００", "￥５，５００～￥８，８００",
+          "要問い合わせ", "", None]
+
+
+def _value(amount):
+    return None if amount is pd.NA else amount
+
+
+class TestPrice(unittest.TestCase):
+
+    def test_parse_price(self):
+        self.assertEqual(parse_price("¥5,500"), (5500, None, False))
+        self.assertEqual(parse_price("¥11,000～"), (11000, None, True))
+        self.assertEqual(parse_price("¥5,500~¥8,800"), (5500, 8800, True))
+        self.assertEqual(parse_price("¥8,800～要問い合わせ"), (None, None, True))
+        self.assertEqual(parse_price("￥１２，０００"), (12000, None, False))
+        self.assertEqual(parse_price(None), (None, None, False))
+
+        parsed = parse_prices(pd.Series(PRICES))
+        self.assertEqual(parsed["price_min"].tolist(), [5500, 11000, 5500, pd.NA, 12000, 5500, pd.NA, pd.NA, pd.NA])
+        self.assertEqual(parsed["price_max"].tolist(), [pd.NA, pd.NA, 8800, pd.NA, pd.NA, 8800, pd.NA, pd.NA, pd.NA])
+        self.assertEqual(parsed["price_fluctuates"].tolist(), [False, True, True, True, False, True, False, False, False])
+        self.assertEqual(len(parse_prices(pd.Series([], dtype=object))), 0)
+
+    def test_outputs_agree(self):
+        # The store, the Arrow export and the WP CSV read every price the same way
+        rows = [{"salon_name": "S", "category": "カット", "name": f"メニュー {i}", "price": price, "description": ""}
+                for i, price in enumerate(PRICES)]
+        frame = typed_frame(rows, "menu")
+        wp = convert_to_wp_csv(rows, {"S": "salon_s"})
+
+        for i, price in enumerate(PRICES):
+            with self.subTest(price=price):
+                minimum, maximum, fluctuates = parse_price(price)
+                self.assertEqual(price_value(price), minimum)
+                self.assertEqual(_value(frame["price_min"][i]), minimum)
+                self.assertEqual(_value(frame["price_max"][i]), maximum)
+                self.assertEqual(bool(frame["price_fluctuates"][i]), fluctuates)
+                self.assertEqual(wp["menu_price"][i], "" if minimum is None else str(minimum))
+                self.assertEqual(wp["menu_price_max"][i], "" if maximum is None else str(maximum))
+                self.assertEqual(wp["menu_fluctuation"][i], "yes" if fluctuates else "no")
+
+
+if __name__ == '__main__':
+    unittest.main()
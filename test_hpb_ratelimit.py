@@ -0,0 +1,143 @@
+from hpb_batch import iter_many
+from hpb_coupon_scraper import iter_coupons, scrape_hpb_coupon
+from hpb_http import HpbClient
+from hpb_ratelimit import AdaptiveRateLimiter, ThrottledError, retry_after_seconds
+from hpb_testing import PageServer, read_testdata
+import email.utils
+import threading
+import time
+import unittest
+
+
+class _Throttle:
+    # Throttling script: statuses (with optional Retry-After) served before the
+    # real page, per path. "every" throttles every nth request instead.
+
+    def __init__(self, server):
+        self.server = server
+        self.script = {}
+        self.every = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, path, headers):
+        with self.lock:
+            script = self.script.get(path)
+            injected = script.pop(0) if script else None
+            if injected is None and self.every and len(self.server.hits) % self.every == 0:
+                injected = (503, None)
+        if not injected:
+            return None
+        status, retry_after = injected
+        return status, b"", {} if retry_after is None else {"Retry-After": retry_after}
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = PageServer().start()
+        cls.base = cls.server.base_url
+        cls.host = cls.server.host
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.pages = {
+            "/slnH000000001/coupon/": read_testdata("coupon_page1.html"),
+            "/slnH000000001/coupon/PN2.html": read_testdata("coupon_page2.html"),
+        }
+        self.throttle = self.server.hook = _Throttle(self.server)
+        self.server.reset()
+
+    def _client(self, **kwargs):
+        kwargs = {"rate": 50, "burst": 5, "base_delay": 0.05, **kwargs}
+        return HpbClient(rate_limiter=AdaptiveRateLimiter(**kwargs))
+
+    def test_retry_after_header(self):
+        response = type("R", (), {})()
+        response.headers = {"Retry-After": "3"}
+        self.assertEqual(retry_after_seconds(response), 3.0)
+        response.headers = {"Retry-After": email.utils.formatdate(time.time() + 30, usegmt=True)}
+        self.assertAlmostEqual(retry_after_seconds(response), 30, delta=2)
+        response.headers = {}
+        self.assertIsNone(retry_after_seconds(response))
+
+    def test_backoff_then_recovery(self):
+        url = f"{self.base}/slnH000000001/coupon/"
+        self.throttle.script = {"/slnH000000001/coupon/": [(503, None), (429, None), (403, None)]}
+        client = self._client()
+
+        start = time.monotonic()
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.retries, 3)
+        # Exponential pauses: 0.05 + 0.1 + 0.2
+        self.assertGreaterEqual(time.monotonic() - start, 0.35)
+        # Rate halved three times, then one success gives back 10%
+        self.assertAlmostEqual(client.rate_limiter.current_rate(self.host), 50 / 8 + 5)
+
+        for _ in range(10):
+            client.get(url)
+        self.assertEqual(client.rate_limiter.current_rate(self.host), 50)
+
+    def test_errors_do_not_ramp_up(self):
+        self.throttle.script = {"/slnH000000001/coupon/": [(503, None)], "/slnH000000001/missing": [(500, None)]}
+        client = self._client()
+        client.get(f"{self.base}/slnH000000001/coupon/")
+        rate = client.rate_limiter.current_rate(self.host)
+        self.assertLess(rate, 50)
+
+        # A 404 or a 500 is not a success: the backed-off rate stays put
+        self.assertEqual(client.get(f"{self.base}/slnH000000001/nosuchpage").status_code, 404)
+        self.assertEqual(client.get(f"{self.base}/slnH000000001/missing").status_code, 500)
+        self.assertEqual(client.rate_limiter.current_rate(self.host), rate)
+
+        client.get(f"{self.base}/slnH000000001/coupon/")
+        self.assertGreater(client.rate_limiter.current_rate(self.host), rate)
+
+    def test_honours_retry_after(self):
+        self.throttle.script = {"/slnH000000001/coupon/": [(429, "1")]}
+        start = time.monotonic()
+        self.assertEqual(self._client().get(f"{self.base}/slnH000000001/coupon/").status_code, 200)
+        self.assertGreaterEqual(self.server.hits[1].at - self.server.hits[0].at, 0.95)
+        self.assertGreaterEqual(time.monotonic() - start, 0.95)
+
+    def test_token_bucket_rate(self):
+        client = self._client(rate=20, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            client.get(f"{self.base}/slnH000000001/coupon/")
+        self.assertGreaterEqual(time.monotonic() - start, 5 / 20 * 0.9)
+
+    def test_gives_up_after_max_retries(self):
+        self.throttle.script = {"/slnH000000001/coupon/": [(503, "0")] * 5}
+        response = self._client(max_retries=2).get(f"{self.base}/slnH000000001/coupon/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.hits), 3)
+
+    def test_no_pages_lost_under_throttling(self):
+        # Every third request is refused: the scrape still returns every coupon
+        self.throttle.every = 3
+        rows = scrape_hpb_coupon(f"{self.base}/slnH000000001/", client=self._client(), page_workers=1)
+        self.assertEqual(len(rows), 8)
+
+        # Without retries the refused page fails the scrape instead of shortening it
+        self.server.reset()
+        self.throttle.script = {"/slnH000000001/coupon/PN2.html": [(503, None)]}
+        with self.assertRaises(ThrottledError) as raised:
+            scrape_hpb_coupon(f"{self.base}/slnH000000001/", client=HpbClient(), page_workers=1)
+        self.assertEqual(raised.exception.status, 503)
+
+        # In a batch, the salon's last event carries the error
+        self.server.reset()
+        self.throttle.script = {"/slnH000000001/coupon/PN2.html": [(503, None)]}
+        events = list(iter_many([f"{self.base}/slnH000000001/"],
+                                lambda url: iter_coupons(url, client=HpbClient(), page_workers=1, batches=True)))
+        self.assertEqual([len(rows) for _, _, rows, _ in events], [5, 0])
+        self.assertIsInstance(events[-1][3], ThrottledError)
+
+
+if __name__ == '__main__':
+    unittest.main()
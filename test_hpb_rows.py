@@ -0,0 +1,59 @@
+from hpb_rows import Row, RowTable
+import json
+import sys
+import unittest
+
+import pandas as pd
+
+from hpb_coupon_scraper import parse_coupon_page
+from hpb_parser import make_soup
+from hpb_testing import read_testdata
+
+
+def _coupon_rows():
+    return parse_coupon_page(make_soup(read_testdata("coupon_page1.html")))["rows"]
+
+
+class TestRowTable(unittest.TestCase):
+
+    def test_dict_compatible_view(self):
+        rows = _coupon_rows()
+        table = RowTable(rows=rows)
+        self.assertEqual(len(table), len(rows))
+        self.assertEqual(list(table), rows)
+        self.assertEqual(table.to_dicts(), rows)
+        self.assertEqual(table[-1], rows[-1])
+
+        row = table[0]
+        self.assertIsInstance(row, Row)
+        self.assertFalse(hasattr(row, "__dict__"))
+        self.assertEqual(list(row), list(rows[0]))
+        self.assertEqual(row.get("missing", "x"), "x")
+        self.assertEqual(json.loads(json.dumps({"salon_url": "u", **row}))["name"], rows[0]["name"])
+
+        row["change"] = "added"
+        self.assertEqual(row["change"], "added")
+        self.assertNotIn("change", table[1])
+        del row["change"]
+        self.assertEqual(row, rows[0])
+
+    def test_interned_columns(self):
+        # Built from fresh strings, as after a JSON round trip
+        rows = json.loads(json.dumps(_coupon_rows()))
+        table = RowTable(rows=rows)
+        names = table.column("salon_name")
+        self.assertTrue(all(name is names[0] for name in names))
+        self.assertIs(names[0], sys.intern(rows[0]["salon_name"]))
+
+    def test_frame_and_arrow(self):
+        rows = _coupon_rows() + [{"salon_name": "x", "name": "only name"}]
+        table = RowTable(["salon_name", "eligibility"], rows)
+        expected = pd.DataFrame(rows)
+        frame = table.to_frame(list(expected.columns))
+        self.assertTrue(frame.equals(expected))
+        self.assertEqual(table.to_arrow().num_rows, len(rows))
+        self.assertEqual(table.to_arrow(["name"]).column("name").to_pylist(), [r["name"] for r in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+from hpb_coupon_scraper import scrape_hpb_coupon
+from hpb_menu_scraper import scrape_hpb_menu
+from hpb_mock import ReplayClient, load_manifest
+from hpb_parser import available_backends
+from hpb_salon_scraper import scrape_hpb_salon
+import os
+import unittest
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "corpus")
+
+
+class TestSalonScraper(unittest.TestCase):
+
+    def test_same_rows_as_separate_scrapes(self):
+        # One parse of page 1 for both kinds must not change either kind's rows
+        client = ReplayClient(CORPUS)
+        manifest = load_manifest(CORPUS)
+        self.assertTrue(manifest)
+        for salon_id, info in manifest.items():
+            url = f"https://beauty.hotpepper.jp/{salon_id}/"
+            for parser in available_backends():
+                for targeted in (True, False):
+                    with self.subTest(salon=salon_id, parser=parser, targeted=targeted):
+                        salon = scrape_hpb_salon(url, max_pages=20, client=client, parser=parser, targeted=targeted)
+                        menus = scrape_hpb_menu(url, client=client, parser=parser, targeted=targeted)
+                        coupons = scrape_hpb_coupon(url, max_pages=20, client=client, parser=parser, targeted=targeted)
+                        self.assertEqual(salon["menus"], menus)
+                        self.assertEqual(salon["coupons"], coupons)
+                        self.assertEqual((len(menus), len(coupons)), (info["menus"], info["coupons"]))
+                        self.assertEqual(salon["salon_name"], coupons[0]["salon_name"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+from hpb_store import ResultStore, price_value, salon_id
+import os
+import shutil
+import tempfile
+import unittest
+
+MENUS_A = [
+    {"salon_name": "Salon A", "category": "カット", "name": "Cut", "price": "¥5,500", "description": "d1"},
+    {"salon_name": "Salon A", "category": "カラー", "name": "Color", "price": "¥11,000～", "description": "d2"},
+]
+MENUS_B = [
+    {"salon_name": "Salon B", "category": "カット", "name": "Cut B", "price": "要問い合わせ", "description": "長い説明文です"},
+]
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ResultStore(os.path.join(self.tmp, "results.sqlite3"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_parsing_helpers(self):
+        self.assertEqual(salon_id("https://beauty.hotpepper.jp/slnH000306271/coupon/"), "slnH000306271")
+        self.assertEqual(price_value("¥11,000～"), 11000)
+        self.assertEqual(price_value("¥3,000～¥5,000"), 3000)
+        self.assertEqual(price_value("￥１２，０００～"), 12000)
+        self.assertIsNone(price_value("要問い合わせ"))
+        self.assertIsNone(price_value(""))
+
+    def test_runs_and_filters(self):
+        urls = ["https://beauty.hotpepper.jp/slnH000000001/", "https://beauty.hotpepper.jp/slnH000000002/"]
+        first = self.store.save_run("menu", zip(urls, [MENUS_A, MENUS_B]), started_at="2026-01-01T09:00:00")
+        second = self.store.save_run("menu", [(urls[0], MENUS_A[:1])])
+
+        runs = self.store.runs("menu")
+        self.assertEqual([r["id"] for r in runs], [second, first])
+        self.assertEqual((runs[1]["started_at"], runs[1]["salons"], runs[1]["rows"]), ("2026-01-01T09:00:00", 2, 3))
+        self.assertEqual(self.store.runs("coupon"), [])
+
+        # Rows come back in scrape order with the scraped fields only
+        self.assertEqual(list(self.store.iter_rows("menu", run_id=first)), MENUS_A + MENUS_B)
+        self.assertEqual(self.store.salons("menu", first), {"slnH000000001": "Salon A", "slnH000000002": "Salon B"})
+        self.assertEqual(self.store.distinct("menu", "category", first), ["カット", "カラー"])
+
+        names = lambda **f: [r["name"] for r in self.store.iter_rows("menu", run_id=first, **f)]
+        self.assertEqual(names(categories=["カット"]), ["Cut", "Cut B"])
+        self.assertEqual(names(salon_ids=["slnH000000002"]), ["Cut B"])
+        self.assertEqual(names(min_price=6000), ["Color"])
+        self.assertEqual(names(max_price=6000), ["Cut"])
+
+        # History of one salon across runs
+        self.assertEqual(len(self.store.frame("menu", salon_ids=["slnH000000001"])), 3)
+
+        self.assertEqual(self.store.max_lengths("menu", ["name", "description"], run_id=first), {"name": 5, "description": 7})
+
+    def test_change_rows(self):
+        rows = [dict(MENUS_A[0], change="modified")]
+        run = self.store.save_run("coupon", [("https://beauty.hotpepper.jp/slnH000000001/", rows)], changes_only=True)
+        self.assertEqual(self.store.runs("coupon")[0]["changes_only"], 1)
+        self.assertEqual(self.store.frame("coupon", columns=["name", "change"], run_id=run).to_dict("records"),
+                         [{"name": "Cut", "change": "modified"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,4 @@
 from wp_export import clean_price_and_get_metadata, convert_to_wp_csv
-import pandas as pd
 import unittest
 
 class TestWPExport(unittest.TestCase):
@@ -19,6 +18,10 @@ class TestWPExport(unittest.TestCase):
         p, f = clean_price_and_get_metadata("要問い合わせ")
         self.assertEqual(p, "")
         self.assertEqual(f, "no") # Should be whatever default, user said empty value
+        
+        # Case 4: Full-width digits and commas, range
+        self.assertEqual(clean_price_and_get_metadata("￥１２，０００"), ("12000", "no"))
+        self.assertEqual(clean_price_and_get_metadata("¥5,500～¥8,800"), ("5500", "yes"))
 
     def test_csv_conversion(self):
         data = [
@@ -61,6 +64,13 @@ class TestWPExport(unittest.TestCase):
         self.assertEqual(row2['tax_menu_cat'], "") # Not in map
         self.assertEqual(row2['menu_price'], "")
         
+    def test_columnar_prices_match_per_item(self):
+        prices = ["¥5,500", "¥11,000～", "~3,000", "要問い合わせ", "¥8,800～要問い合わせ", "", None, "¥５,５００", "¥5,500"]
+        df = convert_to_wp_csv([{"salon_name": "A", "name": "n", "price": p} for p in prices], {"A": "cpt_a"})
+        
+        expected = [clean_price_and_get_metadata(p) for p in prices]
+        self.assertEqual(list(zip(df['menu_price'], df['menu_fluctuation'])), expected)
+        
         
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,8 @@
 from hpb_coupon_scraper import scrape_hpb_coupon
+from hpb_http import site_url
 import json
 
-url = "https://beauty.hotpepper.jp/slnH000122973/coupon/"
+url = site_url("/slnH000122973/coupon/")
 print(f"Scraping {url}...")
 data = scrape_hpb_coupon(url)
 print(f"Total coupons found: {len(data)}")
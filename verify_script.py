@@ -1,9 +1,10 @@
+from hpb_http import site_url
 from hpb_menu_scraper import scrape_hpb_menu
 import json
 
 def verify():
     # Test 1: Full URL
-    url_full = "https://beauty.hotpepper.jp/slnH000306271/coupon/"
+    url_full = site_url("/slnH000306271/coupon/")
     print(f"Testing {url_full}...")
     data = scrape_hpb_menu(url_full)
     print(f"Items found: {len(data)}")
@@ -29,7 +30,7 @@ def verify():
                 print(f"WARNING: Bracket found in description (Item {i}): {repr(item['description'])}")
 
     # Test 2: Base URL logic
-    url_base = "https://beauty.hotpepper.jp/slnH000306271/"
+    url_base = site_url("/slnH000306271/")
     print(f"\nTesting {url_base} (should auto-append coupon/)...")
     data_base = scrape_hpb_menu(url_base)
     print(f"Items found: {len(data_base)}")
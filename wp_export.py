@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
-import re
+
+from hpb_metrics import get_metrics
+from hpb_price import parse_price, parse_prices
 
 def clean_price_and_get_metadata(price_str):
     """
@@ -13,29 +16,49 @@ def clean_price_and_get_metadata(price_str):
             - cleaned_price (str): Numeric string or empty.
             - menu_fluctuation (str): 'yes' or 'no'.
     """
-    if not price_str:
-        return "", "no"
-    
-    fluctuation = "no"
-    
-    # Check for fluctuation indicator
-    if "～" in price_str or "~" in price_str:
-        fluctuation = "yes"
+    # Same parsing as the store and the Arrow export (see hpb_price): the
+    # first amount, empty if inquiry required
+    amount, _, fluctuates = parse_price(price_str)
     
-    # Check for "inquiry required"
-    if "要問い合わせ" in price_str:
-        return "", fluctuation # Requirements say empty if inquiry required
-    
-    # Remove non-numeric characters except for digits
-    # Using regex to remove everything that is NOT a digit
-    cleaned_price = re.sub(r'[^\d]', '', price_str)
+    cleaned_price = "" if amount is None else str(amount)
+    fluctuation = "yes" if fluctuates else "no"
     
     return cleaned_price, fluctuation
 
+# Category Slug Mapping
+CATEGORY_MAP = {
+  'セットメニュー': 'setmenu',
+  'カット': 'cut',
+  'カラー': 'color',
+  'パーマ': 'perm',
+  '縮毛矯正': 'straight',
+  '髪質改善': 'improvement',
+  'トリートメント': 'treatment',
+  'ヘッドスパ': 'spa',
+  'その他メニュー': 'other',
+  '着付け': 'kitsuke',
+}
+
+WP_COLUMNS = [
+    'post_type', 'post_title', 'post_content', 'post_status', 'tax_menu_cat',
+    'menu_name', 'menu_info', 'menu_price', 'menu_fluctuation', 'menu_price_max', 'menu_plus', 'menu_remarks',
+    'salon_name_ref'
+]
+
+def _amount_text(amounts):
+    # Int64 amounts as CSV text, empty when missing
+    return amounts.astype("string").fillna('').astype(str)
+
+def _yes_no(flags):
+    return pd.Series(np.where(flags, 'yes', 'no').astype(object), index=flags.index)
+
 def convert_to_wp_csv(scraped_data, cpt_mapping):
     """
     Converts scraped list of dicts to a pandas DataFrame suitable for WP CSV import.
     
+    The conversion is columnar: price cleaning and the slug lookups run as
+    pandas operations over the whole batch instead of once per item.
+    
     Args:
         scraped_data (list): List of dicts with keys 'salon_name', 'category', 'name', 'price', 'description'.
         cpt_mapping (dict): Mapping of salon_name -> post_type_slug.
@@ -47,64 +70,35 @@ def convert_to_wp_csv(scraped_data, cpt_mapping):
     if not scraped_data:
         return pd.DataFrame()
 
-    # Category Slug Mapping
-    category_map = {
-      'セットメニュー': 'setmenu',
-      'カット': 'cut',
-      'カラー': 'color',
-      'パーマ': 'perm',
-      '縮毛矯正': 'straight',
-      '髪質改善': 'improvement',
-      'トリートメント': 'treatment',
-      'ヘッドスパ': 'spa',
-      'その他メニュー': 'other',
-      '着付け': 'kitsuke',
-    }
-    
-    rows = []
+    with get_metrics().timer("wp_convert"):
+        return _convert(scraped_data, cpt_mapping)
+
+
+def _convert(scraped_data, cpt_mapping):
+    # Missing keys come out as NaN; they are exported as empty strings.
+    items = pd.DataFrame(scraped_data, columns=['salon_name', 'category', 'name', 'price', 'description']).fillna('')
     
-    for item in scraped_data:
-        salon_name = item.get('salon_name', '')
-        
-        # Get CPT from mapping, default to empty if not found (though UI should enforce)
-        post_type = cpt_mapping.get(salon_name, '')
-        
-        # Clean Price
-        raw_price = item.get('price', '')
-        menu_price, menu_fluctuation = clean_price_and_get_metadata(raw_price)
-        
-        # Map Category
-        cat_name = item.get('category', '')
-        cat_slug = category_map.get(cat_name, '')
-        
-        row = {
-            'post_type': post_type,
-            'post_title': item.get('name', ''),
-            'post_content': '', # Description goes to menu_remarks
-            'post_status': 'publish',
-            'tax_menu_cat': cat_slug, # Using slug for import
-            'menu_name': item.get('name', ''), # Custom field 'menu_name'
-            'menu_info': '', # Not scraped, empty
-            'menu_price': menu_price,
-            'menu_fluctuation': menu_fluctuation,
-            'menu_price_max': '', # Not scraped
-            'menu_plus': 'no', # Default
-            'menu_remarks': item.get('description', ''),
-            'salon_name_ref': salon_name # Helper column for user reference
-        }
-        rows.append(row)
-        
-    df = pd.DataFrame(rows)
+    # Get CPT from mapping, default to empty if not found (though UI should enforce)
+    post_type = items['salon_name'].map(cpt_mapping).fillna('')
     
-    # Reorder columns to be nice
-    desired_order = [
-        'post_type', 'post_title', 'post_content', 'post_status', 'tax_menu_cat',
-        'menu_name', 'menu_info', 'menu_price', 'menu_fluctuation', 'menu_price_max', 'menu_plus', 'menu_remarks',
-        'salon_name_ref'
-    ]
+    # Clean Price: same parsing as the store and the Arrow export (see hpb_price)
+    prices = parse_prices(items['price'])
     
-    # Filter only columns that exist
-    final_cols = [c for c in desired_order if c in df.columns]
-    df = df[final_cols]
+    df = pd.DataFrame({
+        'post_type': post_type,
+        'post_title': items['name'],
+        'post_content': '', # Description goes to menu_remarks
+        'post_status': 'publish',
+        'tax_menu_cat': items['category'].map(CATEGORY_MAP).fillna(''), # Using slug for import
+        'menu_name': items['name'], # Custom field 'menu_name'
+        'menu_info': '', # Not scraped, empty
+        'menu_price': _amount_text(prices['price_min']),
+        'menu_fluctuation': _yes_no(prices['price_fluctuates']),
+        'menu_price_max': _amount_text(prices['price_max']), # Only for ranges ("¥5,500～¥8,800")
+        'menu_plus': 'no', # Default
+        'menu_remarks': items['description'],
+        'salon_name_ref': items['salon_name'] # Helper column for user reference
+    }, columns=WP_COLUMNS)
     
-    return df
+    # Same column dtypes as a frame built from per-row dicts
+    return df.infer_objects()